@@ -1,128 +1,189 @@
 from flask import request, jsonify
-from app.services.biometric import enroll_user
-from app.db.database import get_db_connection
-from app.services.biometric import IndexSearch, enroll_user, identify_user
+from app.db.database import db_connection
+from app.services.leitor import DeviceUnavailableError
+from app.services.matcher import fir_valida
+from app.services.biometric import biometric_index, identify_user, VINCULO_OFFSET
+from app.services.perfis import perfil_funcionario, perfil_vinculo
 
 
+# Limite de digitais por chamada do /identify/batch
+IDENTIFY_BATCH_MAX = 500
 
 
 # identificar o usuário
 def identify_user_route():
-    # Limpa o banco de dados de indexação
-    IndexSearch.ClearDB()
-
-    # Conectar ao banco de dados
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Buscar todos os usuários no banco de dados e adicionar FIR à indexação
-    cursor.execute("SELECT id_biometrico, id FROM funcionarios")
-    for row in cursor.fetchall():
-        # A adição de FIR para indexação
-        IndexSearch.AddFIR(row[0], int(row[1]))
-    
-    # Buscar também os vínculos adicionais e adicionar à indexação
-    # Usar offset de 1000000 para diferenciar vínculos de funcionários principais
-    VINCULO_OFFSET = 1000000
-    cursor.execute("SELECT id_biometrico, id FROM funcionarios_unidades_adicionais WHERE status = 1")
-    vinculos = cursor.fetchall()
-    print(f"DEBUG: Encontrados {len(vinculos)} vínculos adicionais ativos")
-    for row in vinculos:
-        vinculo_user_id = VINCULO_OFFSET + int(row[1])
-        print(f"DEBUG: Adicionando vínculo - id original: {row[1]}, id indexado: {vinculo_user_id}")
-        # id_biometrico é a string FIR
-        IndexSearch.AddFIR(row[0], vinculo_user_id)
-
-    conn.close()
-
     # Captura os dados de biometria para identificação
-    fir_data = identify_user()
+    try:
+        fir_data = identify_user()
+    except DeviceUnavailableError as e:
+        print(f"Leitor indisponível: {e}")
+        return jsonify({"message": "Leitor biométrico indisponível. Por favor, tente novamente."}), 503
+
+    return _identificar(fir_data)
+
+
+# Identificação com a digital já capturada pelo terminal (FIR em texto no campo
+# "fir", e opcionalmente unidade_id para buscar primeiro na unidade): não usa o
+# leitor do servidor, então pode rodar em qualquer instância atrás do balanceador
+def identify_template_route():
+    data = request.json or {}
+    fir_data = data.get('fir')
+    if not isinstance(fir_data, str) or not fir_data.strip():
+        return jsonify({"message": "Campo 'fir' com a digital capturada é obrigatório."}), 400
+    if not fir_valida(fir_data):
+        return jsonify({"message": "Digital inválida: a FIR enviada não pôde ser decodificada."}), 400
+    return _identificar(fir_data, data.get('unidade_id'))
+
 
-    # Identificação do usuário
-    IndexSearch.IdentifyUser(fir_data, 5)
+def _identificar(fir_data, unidade_id=None):
+    # Identificação do usuário no índice mantido em memória
+    id_identificado = biometric_index.identify(fir_data, unidade_id)
 
-    if IndexSearch.UserID != 0:
-        id_identificado = IndexSearch.UserID
+    if id_identificado != 0:
         print(f"DEBUG: ID identificado: {id_identificado}")
 
-        # Conectar ao banco de dados
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Verifica se é um vínculo adicional (ID >= VINCULO_OFFSET)
-        if id_identificado >= VINCULO_OFFSET:
-            # É um vínculo adicional - remove o offset para obter o ID real
-            vinculo_id = id_identificado - VINCULO_OFFSET
-            print(f"DEBUG: É um vínculo! ID real: {vinculo_id}")
-            cursor.execute("""
-                SELECT fua.matricula, fua.cargo, fua.unidade_id, 
-                       f.nome, f.cpf, f.data_admissao, fua.funcionario_id
-                FROM funcionarios_unidades_adicionais fua
-                INNER JOIN funcionarios f ON fua.funcionario_id = f.id
-                WHERE fua.id = %s AND fua.status = 1
-            """, (vinculo_id,))
-            vinculo_data = cursor.fetchone()
+        # Conexão emprestada do pool, devolvida em qualquer retorno
+        with db_connection() as conn:
+            if conn is None:
+                return jsonify({"message": "Erro ao conectar ao banco de dados"}), 500
+            cursor = conn.cursor()
+
+            # Verifica se é um vínculo adicional (ID >= VINCULO_OFFSET)
+            if id_identificado >= VINCULO_OFFSET:
+                # É um vínculo adicional - remove o offset para obter o ID real
+                vinculo_id = id_identificado - VINCULO_OFFSET
+                print(f"DEBUG: É um vínculo! ID real: {vinculo_id}")
+                # Perfil do vínculo do cache, ou do banco na falta dele
+                vinculo_data = perfil_vinculo(cursor, vinculo_id)
             
-            if vinculo_data:
-                matricula = str(vinculo_data[0])  # matricula é bigint
-                cargo = vinculo_data[1]
-                unidade_id = vinculo_data[2]
-                user_name = vinculo_data[3]
-                cpf = vinculo_data[4]
-                data_admissao = vinculo_data[5]
-                funcionario_id = vinculo_data[6]
-                
-                conn.close()
+                if vinculo_data:
+                    matricula = str(vinculo_data.matricula)  # matricula é bigint
+                    cargo = vinculo_data.cargo
+                    unidade_id = vinculo_data.unidade_id
+                    user_name = vinculo_data.nome
+                    cpf = vinculo_data.cpf
+                    data_admissao = vinculo_data.data_admissao
+                    funcionario_id = vinculo_data.funcionario_id
                 
-                data_admissao_formatada = data_admissao.strftime("%d/%m/%Y")
+                    data_admissao_formatada = data_admissao.strftime("%d/%m/%Y")
                 
-                return jsonify({
-                    "message": f"User identified: {user_name} (Vínculo Adicional)",
-                    "cpf": cpf,
-                    "cargo": cargo,
-                    "data_admissao": data_admissao_formatada,
-                    "unidade_id": unidade_id,
-                    "matricula": matricula,
-                    "funcionario_id": funcionario_id,
-                    "tipo": "vinculo_adicional"
-                }), 200
+                    return jsonify({
+                        "message": f"User identified: {user_name} (Vínculo Adicional)",
+                        "cpf": cpf,
+                        "cargo": cargo,
+                        "data_admissao": data_admissao_formatada,
+                        "unidade_id": unidade_id,
+                        "matricula": matricula,
+                        "funcionario_id": funcionario_id,
+                        "tipo": "vinculo_adicional"
+                    }), 200
+                else:
+                    return jsonify({"message": "Vínculo adicional não encontrado"}), 404
             else:
-                conn.close()
-                return jsonify({"message": "Vínculo adicional não encontrado"}), 404
-        else:
-            # É um funcionário principal
-            cursor.execute("""
-                SELECT nome, cpf, data_admissao, unidade_id, matricula, cargo, id 
-                FROM funcionarios 
-                WHERE id = %s
-            """, (id_identificado,))
-            user_data = cursor.fetchone()
+                # É um funcionário principal (perfil do cache, ou do banco na falta dele)
+                user_data = perfil_funcionario(cursor, id_identificado)
             
-            if user_data:
-                user_name = user_data[0]
-                cpf = user_data[1]
-                data_admissao = user_data[2]
-                unidade_id = user_data[3]
-                matricula = user_data[4]
-                cargo = user_data[5]
-                funcionario_id = user_data[6]
+                if user_data:
+                    user_name = user_data.nome
+                    cpf = user_data.cpf
+                    data_admissao = user_data.data_admissao
+                    unidade_id = user_data.unidade_id
+                    matricula = user_data.matricula
+                    cargo = user_data.cargo
+                    funcionario_id = user_data.funcionario_id
                 
-                conn.close()
+                    data_admissao_formatada = data_admissao.strftime("%d/%m/%Y")
                 
-                data_admissao_formatada = data_admissao.strftime("%d/%m/%Y")
-                
-                return jsonify({
-                    "message": f"User identified: {user_name} (ID: {id_identificado})",
-                    "cpf": cpf,
-                    "cargo": cargo,
-                    "data_admissao": data_admissao_formatada,
-                    "unidade_id": unidade_id,
-                    "matricula": matricula,
-                    "funcionario_id": funcionario_id,
-                    "tipo": "funcionario_principal"
-                }), 200
-            else:
-                conn.close()
-                return jsonify({"message": "Funcionário principal não encontrado"}), 404
+                    return jsonify({
+                        "message": f"User identified: {user_name} (ID: {id_identificado})",
+                        "cpf": cpf,
+                        "cargo": cargo,
+                        "data_admissao": data_admissao_formatada,
+                        "unidade_id": unidade_id,
+                        "matricula": matricula,
+                        "funcionario_id": funcionario_id,
+                        "tipo": "funcionario_principal"
+                    }), 200
+                else:
+                    return jsonify({"message": "Funcionário principal não encontrado"}), 404
     else:
-        return jsonify({"message": "User not identified"}), 404
\ No newline at end of file
+        return jsonify({"message": "User not identified"}), 404
+
+
+# Identificação em lote: várias digitais já capturadas (lista "firs", e
+# opcionalmente unidade_id) em uma única chamada, distribuídas entre as réplicas
+# do índice. Retorna um resultado por digital, na ordem recebida
+def identify_batch_route():
+    data = request.json or {}
+    firs = data.get('firs')
+    if not isinstance(firs, list) or not firs:
+        return jsonify({"message": "Campo 'firs' com a lista de digitais é obrigatório."}), 400
+    if len(firs) > IDENTIFY_BATCH_MAX:
+        return jsonify({"message": f"No máximo {IDENTIFY_BATCH_MAX} digitais por chamada."}), 400
+
+    # Digitais inválidas não derrubam o lote: recebem erro no próprio resultado
+    validas = [i for i, fir in enumerate(firs) if isinstance(fir, str) and fir.strip() and fir_valida(fir)]
+    ids = biometric_index.identify_many([firs[i] for i in validas], data.get('unidade_id'))
+    identificados = dict(zip(validas, ids))
+
+    # Dados de todos os funcionários e vínculos identificados, uma consulta para cada tipo
+    encontrados = {user_id for user_id in ids if user_id != 0}
+    funcionarios_ids = [user_id for user_id in encontrados if user_id < VINCULO_OFFSET]
+    vinculos_ids = [user_id - VINCULO_OFFSET for user_id in encontrados if user_id >= VINCULO_OFFSET]
+    registros = {}
+    if encontrados:
+        with db_connection() as conn:
+            if conn is None:
+                return jsonify({"message": "Erro ao conectar ao banco de dados"}), 500
+            cursor = conn.cursor()
+            if funcionarios_ids:
+                cursor.execute("""
+                    SELECT id, nome, matricula, unidade_id FROM funcionarios WHERE id = ANY(%s)
+                """, (funcionarios_ids,))
+                for funcionario_id, nome, matricula, unidade_id in cursor.fetchall():
+                    registros[funcionario_id] = {
+                        "tipo": "funcionario_principal",
+                        "funcionario_id": funcionario_id,
+                        "nome": nome,
+                        "matricula": matricula,
+                        "unidade_id": unidade_id
+                    }
+            if vinculos_ids:
+                cursor.execute("""
+                    SELECT fua.id, fua.funcionario_id, f.nome, fua.matricula, fua.unidade_id
+                    FROM funcionarios_unidades_adicionais fua
+                    INNER JOIN funcionarios f ON fua.funcionario_id = f.id
+                    WHERE fua.id = ANY(%s) AND fua.status = 1
+                """, (vinculos_ids,))
+                for vinculo_id, funcionario_id, nome, matricula, unidade_id in cursor.fetchall():
+                    registros[VINCULO_OFFSET + vinculo_id] = {
+                        "tipo": "vinculo_adicional",
+                        "vinculo_id": vinculo_id,
+                        "funcionario_id": funcionario_id,
+                        "nome": nome,
+                        "matricula": str(matricula),  # matricula é bigint
+                        "unidade_id": unidade_id
+                    }
+            cursor.close()
+
+    resultados = []
+    for indice in range(len(firs)):
+        if indice not in identificados:
+            resultados.append({"indice": indice, "identificado": False, "erro": "Digital inválida"})
+            continue
+        registro = registros.get(identificados[indice])
+        if registro is None:
+            resultados.append({"indice": indice, "identificado": False})
+            continue
+        resultados.append({"indice": indice, "identificado": True, **registro})
+
+    return jsonify({
+        "total": len(firs),
+        "identificados": sum(1 for resultado in resultados if resultado["identificado"]),
+        "resultados": resultados
+    }), 200
+
+
+# Situação do índice biométrico em memória (tamanho e tempo de carga)
+def index_status_route():
+    return jsonify(biometric_index.stats()), 200
@@ -1,183 +1,381 @@
 # Importações de bibliotecas necessárias
-from datetime import datetime, timedelta  # Manipulação de datas e horários
+from datetime import datetime, time, timedelta  # Manipulação de datas e horários
 from flask import jsonify, request        # Utilidades Flask para requisição e resposta
-from app.db.database import get_db_connection  # Função de conexão com o banco de dados
-from app.services.biometric import IndexSearch, identify_user  # Lógica biométrica
-import requests  # Para fazer chamadas HTTP ao backend em Node.js
+from app.db.database import db_connection  # Conexões emprestadas do pool
+from app.services.horas import registrar_entrada, registrar_saida  # Cálculo e gravação das horas
+from app.services.notificacoes import enfileirar_email, notification_worker  # Fila de e-mails de comprovante
+from app.services.idempotencia import idempotency_store, IDEMPOTENCY_KEY_MAX_LENGTH  # Repetições do terminal
+from app.services.leitor import DeviceUnavailableError  # Leitor ocupado ou sem resposta
+from app.services.ponto_lote import registrar_lote, PONTO_LOTE_MAX  # Batidas enviadas em lote pelo terminal
+from app.services.turnos import open_shift_state  # Entradas sem saída e registros do dia em memória
+from app.services.perfis import perfil_funcionario, nome_unidade  # Perfis e unidades em cache
+from app.services.ferias import vacation_index  # Períodos de férias em memória
+from app.services.matcher import fir_valida  # Validação da digital enviada pelo terminal
+from app.services.biometric import biometric_index, identify_user, VINCULO_OFFSET  # Lógica biométrica
+import psycopg2  # Erros ao gravar o registro de ponto
 
 
 # http://biometrico.itaguai.rj.gov.br:3001
 
-# ===========================
-# Função auxiliar para envio de e-mail
-# ===========================
-def send_email(subject, recipient, body):
-    try:
-        # Envia um POST com os dados do e-mail para o backend Node.js
-        response = requests.post("http://biometrico.itaguai.rj.gov.br:3001/api/enviar-email", json={
-            "subject": subject,
-            "recipient": recipient,
-            "body": body
-        })
-        response.raise_for_status()  # Lança exceção se o status não for 2xx
-        print(f"E-mail enviado para {recipient}")
-    except requests.RequestException as e:
-        print(f"Erro ao enviar e-mail: {e}")
+# Consulta única da batida de ponto quando os turnos em memória não podem
+# responder (sempre, para vínculos): dados do funcionário ou do vínculo
+# (com escala e status do funcionário), nomes das unidades (para a mensagem
+# de unidade errada), férias no dia, registro completo no dia na unidade do terminal, último ponto
+# sem saída e último ponto sem saída nessa unidade
+DECISAO_PONTO_SQL = """
+    WITH pessoa AS (
+        {pessoa}
+    )
+    SELECT p.funcionario_id, p.nome, p.cpf, p.unidade_id, p.matricula, p.cargo, p.id_biometrico, p.email,
+           p.tipo_escala, p.status,
+           uf.nome, ut.nome,
+           EXISTS (
+               SELECT 1 FROM ferias
+               WHERE funcionario_id = p.funcionario_id AND data_inicio <= %(data)s AND data_fim >= %(data)s
+           ){registros_colunas}
+    FROM pessoa p
+    LEFT JOIN unidades uf ON uf.id = p.unidade_id
+    LEFT JOIN unidades ut ON ut.id = %(unidade_terminal)s{registros}
+"""
+
+REGISTROS_COLUNAS = """,
+           EXISTS (
+               SELECT 1 FROM registros_ponto
+               WHERE funcionario_id = p.funcionario_id AND unidade_id = %(unidade_terminal)s
+               AND data_hora >= %(data)s AND data_hora < %(data)s + INTERVAL '1 day'
+               AND hora_entrada IS NOT NULL AND hora_saida IS NOT NULL
+           ),
+           aberto.id, aberto.hora_entrada, aberto.hora_saida, aberto.data_hora,
+           aberto_unidade.id, aberto_unidade.hora_entrada, aberto_unidade.data_hora"""
+
+REGISTROS = """
+    LEFT JOIN LATERAL (
+        SELECT id, hora_entrada, hora_saida, data_hora FROM registros_ponto
+        WHERE funcionario_id = p.funcionario_id AND hora_saida IS NULL
+        ORDER BY data_hora DESC LIMIT 1
+    ) aberto ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT id, hora_entrada, data_hora FROM registros_ponto
+        WHERE funcionario_id = p.funcionario_id AND unidade_id = %(unidade_terminal)s AND hora_saida IS NULL
+        ORDER BY data_hora DESC LIMIT 1
+    ) aberto_unidade ON TRUE"""
+
+PESSOA_FUNCIONARIO = """
+        SELECT id AS funcionario_id, nome, cpf, unidade_id, matricula, cargo, id_biometrico, email,
+               tipo_escala, status
+        FROM funcionarios WHERE id = %(registro_id)s
+""".strip()
+
+PESSOA_VINCULO = """
+        SELECT fua.funcionario_id, f.nome, f.cpf, fua.unidade_id, fua.matricula,
+               fua.cargo, fua.id_biometrico, f.email, f.tipo_escala, f.status
+        FROM funcionarios_unidades_adicionais fua
+        INNER JOIN funcionarios f ON fua.funcionario_id = f.id
+        WHERE fua.id = %(registro_id)s AND fua.status = 1
+""".strip()
+
+DECISAO_PONTO_FUNCIONARIO_SQL = DECISAO_PONTO_SQL.format(pessoa=PESSOA_FUNCIONARIO, registros_colunas=REGISTROS_COLUNAS,
+                                                         registros=REGISTROS)
+DECISAO_PONTO_VINCULO_SQL = DECISAO_PONTO_SQL.format(pessoa=PESSOA_VINCULO, registros_colunas=REGISTROS_COLUNAS,
+                                                     registros=REGISTROS)
+
+# Férias no dia, quando o índice de férias em memória não está carregado
+FERIAS_SQL = """
+    SELECT EXISTS (
+        SELECT 1 FROM ferias
+        WHERE funcionario_id = %(funcionario_id)s AND data_inicio <= %(data)s AND data_fim >= %(data)s
+    )
+"""
+
+
+def _hora(texto):
+    # "HH:MM:SS" (ou "HH:MM") enviado pelo terminal -> time
+    texto = str(texto)
+    return datetime.strptime(texto, "%H:%M:%S" if texto.count(":") == 2 else "%H:%M").time()
+
+
+def _aguarde_saida(tempo_decorrido_minutos):
+    tempo_restante = int(1 - tempo_decorrido_minutos) + 1
+    return jsonify({
+        "message": f"Você deve aguardar pelo menos 5 minutos após a entrada para registrar a saída. Tempo restante: {tempo_restante} minuto(s)."
+    }), 400
+
+
+def _batida_repetida(funcionario_id, unidade_id_terminal, data_registro):
+    # Batida repetida na unidade do terminal, respondida pelos turnos em memória
+    # sem acesso ao banco: entrada de menos de 1 minuto ou entrada e saída já
+    # registradas no dia. Retorna None quando a decisão precisa do banco.
+    data_atual = datetime.strptime(data_registro, "%Y-%m-%d").date()
+    turno = open_shift_state.consultar(funcionario_id, data_atual)
+    if turno is None:
+        return None
+    ultimo = turno.ultimo_aberto()
+    if ultimo is None:
+        if turno.completo_no_dia(unidade_id_terminal):
+            return jsonify({
+                "error": "Você já registrou entrada e saída neste dia. Não é possível registrar nova entrada."
+            }), 400
+        return None
+
+    if ultimo.unidade_id == unidade_id_terminal and ultimo.hora_entrada is not None and ultimo.data_hora.date() == data_atual:
+        tempo_decorrido_minutos = (datetime.now() - datetime.combine(data_atual, ultimo.hora_entrada)).total_seconds() / 60
+        if tempo_decorrido_minutos < 1:
+            print(f"[TENTATIVA BLOQUEADA] Funcionário ID: {funcionario_id} | Tempo decorrido: {tempo_decorrido_minutos:.2f} minutos")
+            return _aguarde_saida(tempo_decorrido_minutos)
+    return None
+
+
+def _funcionario_inativo():
+    return jsonify({"error": "Funcionário inativo não pode bater ponto."}), 403
+
+
+def _erro_ao_gravar(conn, e):
+    conn.rollback()
+    print(f"[ERRO] Falha ao gravar registro de ponto: {e}")
+    return jsonify({"message": "Erro ao registrar ponto no sistema"}), 500
+
+
+def _assinatura_ponto(data):
+    # Dados que precisam ser iguais para que a repetição receba a mesma resposta
+    return (data.get('unidade_id'), data.get('data'), data.get('hora_entrada'), data.get('fir'))
+
 
 # ===========================
 # Função principal: Registrar ponto via biometria
 # ===========================
 def register_ponto():
     data = request.json or {}  # Lê os dados enviados no corpo da requisição
+    return _com_idempotencia(data, lambda: _register_ponto(data))
+
+
+# Registro de ponto com a digital já capturada pelo terminal (FIR em texto no
+# campo "fir"): não usa o leitor do servidor, então pode rodar em qualquer
+# instância do backend atrás do balanceador
+def register_ponto_template():
+    data = request.json or {}
+    fir_data = data.get('fir')
+    if not isinstance(fir_data, str) or not fir_data.strip():
+        return jsonify({"message": "Campo 'fir' com a digital capturada é obrigatório."}), 400
+    if not fir_valida(fir_data):
+        return jsonify({"message": "Digital inválida: a FIR enviada não pôde ser decodificada."}), 400
+    return _com_idempotencia(data, lambda: _register_ponto(data, fir_data))
+
+
+# ===========================
+# Registro de ponto em lote: batidas guardadas por um terminal que ficou sem
+# conexão (lista "registros" com funcionario_id, unidade_id, data_hora e tipo),
+# validadas e gravadas juntas, com um resultado por batida
+# ===========================
+def register_ponto_bulk():
+    data = request.json or {}
+    itens = data.get('registros')
+    if not isinstance(itens, list) or not itens:
+        return jsonify({"message": "Campo 'registros' com a lista de batidas é obrigatório."}), 400
+    if len(itens) > PONTO_LOTE_MAX:
+        return jsonify({"message": f"No máximo {PONTO_LOTE_MAX} batidas por chamada."}), 400
+
+    with db_connection() as conn:
+        if conn is None:
+            return jsonify({"message": "Erro ao conectar ao banco de dados"}), 500
+        try:
+            resultados = registrar_lote(conn, itens)
+            conn.commit()
+        except psycopg2.Error as e:
+            return _erro_ao_gravar(conn, e)
+        if any(resultado["situacao"] == "aceito" for resultado in resultados):
+            # O lote grava direto no banco, sem passar pelos turnos em memória; as
+            # batidas de vínculo só informam vinculo_id, então o estado é relido inteiro
+            open_shift_state.recarregar(conn)
+
+    return jsonify({
+        "total": len(itens),
+        "aceitos": sum(1 for resultado in resultados if resultado["situacao"] == "aceito"),
+        "rejeitados": sum(1 for resultado in resultados if resultado["situacao"] == "rejeitado"),
+        "duplicados": sum(1 for resultado in resultados if resultado["situacao"] == "duplicado"),
+        "resultados": resultados
+    }), 200
+
+
+def _com_idempotencia(data, registrar):
+    # Chave opcional enviada pelo terminal (cabeçalho ou campo do corpo): uma
+    # repetição após timeout recebe a resposta original, sem nova captura,
+    # identificação ou acesso ao banco
+    chave = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if not chave:
+        return registrar()
+    chave = str(chave)
+    if len(chave) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return jsonify({"message": f"Idempotency-Key deve ter no máximo {IDEMPOTENCY_KEY_MAX_LENGTH} caracteres."}), 400
+
+    situacao, anterior = idempotency_store.reservar(chave, _assinatura_ponto(data))
+    if situacao == "repetida":
+        corpo, status = anterior
+        resposta = jsonify(corpo)
+        resposta.headers['Idempotent-Replayed'] = 'true'
+        return resposta, status
+    if situacao == "conflito":
+        return jsonify({"message": "Idempotency-Key já utilizada com outros dados de registro de ponto."}), 422
+    if situacao == "em_andamento":
+        return jsonify({"message": "Registro de ponto com esta Idempotency-Key ainda em processamento. Tente novamente."}), 409
+
+    try:
+        resposta, status = registrar()
+    except Exception:
+        idempotency_store.liberar(chave)
+        raise
+    idempotency_store.concluir(chave, resposta.get_json(), status)
+    return resposta, status
+
 
+def _register_ponto(data, fir_data=None):
     # Captura os parâmetros principais enviados pelo terminal
     unidade_id_terminal = data.get('unidade_id')
     data_registro = data.get('data') or datetime.now().date().strftime("%Y-%m-%d")
     hora_entrada = data.get('hora_entrada') or datetime.now().strftime("%H:%M:%S")
 
     # ===========================
-    # 1. Preparação para identificação biométrica
+    # 1. Captura da digital no leitor e identificação no índice em memória
+    #    (primeiro entre os funcionários da unidade do terminal); a captura
+    #    é pulada quando o terminal já enviou a digital
     # ===========================
-    IndexSearch.ClearDB()  # Limpa base de digitais temporária
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Adiciona funcionários principais
-    cursor.execute("SELECT id_biometrico, id FROM funcionarios")
-    for row in cursor.fetchall():
-        IndexSearch.AddFIR(row[0], int(row[1]))  # Adiciona cada funcionário à base de identificação
-    
-    # Adiciona vínculos adicionais com offset de 1000000
-    VINCULO_OFFSET = 1000000
-    cursor.execute("SELECT id_biometrico, id FROM funcionarios_unidades_adicionais WHERE status = 1")
-    vinculos = cursor.fetchall()
-    for row in vinculos:
-        vinculo_user_id = VINCULO_OFFSET + int(row[1])
-        IndexSearch.AddFIR(row[0], vinculo_user_id)
-    
-    conn.close()
-
-    # ===========================
-    # 2. Captura da digital no leitor e identificação
-    # ===========================
-    fir_data = identify_user()
+    if fir_data is None:
+        try:
+            fir_data = identify_user()
+        except DeviceUnavailableError as e:
+            print(f"Leitor indisponível: {e}")
+            return jsonify({"message": "Leitor biométrico indisponível. Por favor, tente novamente."}), 503
     if not fir_data:
         return jsonify({"message": "Nenhuma impressão digital capturada. Por favor, tente novamente."}), 400
 
-    IndexSearch.IdentifyUser(fir_data, 5)  # Tenta identificar com tolerância 5
-    if IndexSearch.UserID == 0:
+    id_identificado = biometric_index.identify(fir_data, unidade_id_terminal)  # Tenta identificar com tolerância 5
+    if id_identificado == 0:
         return jsonify({"message": "Usuário não identificado. Digital não cadastrada no sistema."}), 401
 
-    id_identificado = IndexSearch.UserID  # ID identificado (pode ser funcionário ou vínculo)
+    if id_identificado < VINCULO_OFFSET:
+        # Vínculos adicionais dependem do banco para chegar ao funcionário
+        repetida = _batida_repetida(id_identificado, unidade_id_terminal, data_registro)
+        if repetida:
+            return repetida
+
+    # A conexão volta ao pool em qualquer retorno do registro, inclusive nos erros 4xx
+    with db_connection() as conn:
+        if conn is None:
+            return jsonify({"message": "Erro ao conectar ao banco de dados"}), 500
+        return _registrar_ponto_identificado(conn, id_identificado, unidade_id_terminal, data_registro, hora_entrada)
 
+
+def _registrar_ponto_identificado(conn, id_identificado, unidade_id_terminal, data_registro, hora_entrada):
     # ===========================
-    # 3. Buscar dados do funcionário no banco (Principal ou Vínculo)
+    # 2. Funcionário principal (perfil em cache), férias (índice em memória) e
+    #    registros de ponto usados na decisão (turnos em memória); vínculos, ou
+    #    se os turnos não puderem responder, tudo vem de uma única consulta
     # ===========================
-    conn = get_db_connection()
+    data_atual = datetime.strptime(data_registro, "%Y-%m-%d").date()
     cursor = conn.cursor()
-    
-    # Verifica se é um vínculo adicional
+
+    # Verifica se é um vínculo adicional; o funcionário do vínculo só é
+    # conhecido pela consulta, que então traz também os registros de ponto
     if id_identificado >= VINCULO_OFFSET:
-        # É um vínculo adicional
-        vinculo_id = id_identificado - VINCULO_OFFSET
-        cursor.execute("""
-            SELECT fua.funcionario_id, f.nome, f.cpf, fua.unidade_id, fua.matricula, 
-                   fua.cargo, fua.id_biometrico, f.email
-            FROM funcionarios_unidades_adicionais fua
-            INNER JOIN funcionarios f ON fua.funcionario_id = f.id
-            WHERE fua.id = %s AND fua.status = 1
-        """, (vinculo_id,))
-        user_data = cursor.fetchone()
+        turno = None
+        consulta = DECISAO_PONTO_VINCULO_SQL
+        registro_id = id_identificado - VINCULO_OFFSET
         tipo_registro = "vinculo_adicional"
     else:
-        # É um funcionário principal
-        cursor.execute("""
-            SELECT id, nome, cpf, unidade_id, matricula, cargo, id_biometrico, email
-            FROM funcionarios WHERE id = %s
-        """, (id_identificado,))
-        user_data = cursor.fetchone()
+        turno = open_shift_state.consultar(id_identificado, data_atual)
+        consulta = DECISAO_PONTO_FUNCIONARIO_SQL
+        registro_id = id_identificado
         tipo_registro = "funcionario_principal"
-    
-    if not user_data:
+
+    if turno:
+        decisao = perfil_funcionario(cursor, id_identificado)
+        if decisao:
+            de_ferias = vacation_index.de_ferias(id_identificado, data_atual)
+            if de_ferias is None:
+                cursor.execute(FERIAS_SQL, {"funcionario_id": id_identificado, "data": data_atual})
+                de_ferias = cursor.fetchone()[0]
+            # Nomes das unidades só são buscados (e guardados em cache) na mensagem de unidade errada
+            decisao = tuple(decisao[:10]) + (None, None, de_ferias)
+    else:
+        cursor.execute(consulta, {
+            "registro_id": registro_id,
+            "unidade_terminal": unidade_id_terminal,
+            "data": data_atual
+        })
+        decisao = cursor.fetchone()
+    if not decisao:
         return jsonify({"message": "Funcionário não encontrado no banco de dados."}), 404
 
     # Atribui as informações do funcionário a variáveis
-    funcionario_id, user_name, cpf, unidade_id_funcionario, matricula, cargo, id_biometrico, email = user_data
+    (funcionario_id, user_name, cpf, unidade_id_funcionario, matricula, cargo, id_biometrico, email,
+     escala, status, unidade_funcionario_nome, unidade_terminal_nome, de_ferias) = decisao[:13]
 
     # ===========================
-    # 4. Validação de unidade (terminal vs funcionário)
+    # 3. Validação de unidade (terminal vs funcionário)
     # ===========================
     if not unidade_id_terminal:
         return jsonify({"message": "unidade_id é obrigatório"}), 400
 
     if unidade_id_funcionario != unidade_id_terminal:
-        # Busca nomes das unidades para detalhar o erro
-        cursor.execute("SELECT nome FROM unidades WHERE id = %s", (unidade_id_funcionario,))
-        unidade_funcionario_nome = cursor.fetchone()
-        cursor.execute("SELECT nome FROM unidades WHERE id = %s", (unidade_id_terminal,))
-        unidade_terminal_nome = cursor.fetchone()
+        # Nomes das unidades para detalhar o erro (retornados pela consulta única ou do cache)
+        if turno:
+            unidade_funcionario_nome = nome_unidade(cursor, unidade_id_funcionario)
+            unidade_terminal_nome = nome_unidade(cursor, unidade_id_terminal)
+        unidade_funcionario = unidade_funcionario_nome or unidade_id_funcionario
+        unidade_terminal = unidade_terminal_nome or unidade_id_terminal
 
-        print(f"[ACESSO NEGADO] Funcionário: {user_name} (ID: {funcionario_id}) | Unidade do funcionário: {unidade_funcionario_nome[0] if unidade_funcionario_nome else unidade_id_funcionario} | Unidade do terminal: {unidade_terminal_nome[0] if unidade_terminal_nome else unidade_id_terminal} | Data/Hora: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
+        print(f"[ACESSO NEGADO] Funcionário: {user_name} (ID: {funcionario_id}) | Unidade do funcionário: {unidade_funcionario} | Unidade do terminal: {unidade_terminal} | Data/Hora: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
 
         return jsonify({
             "message": "Funcionário não pertence a esta unidade.",
             "funcionario": user_name,
-            "unidade_funcionario": unidade_funcionario_nome[0] if unidade_funcionario_nome else unidade_id_funcionario,
-            "unidade_terminal": unidade_terminal_nome[0] if unidade_terminal_nome else unidade_id_terminal
+            "unidade_funcionario": unidade_funcionario,
+            "unidade_terminal": unidade_terminal
         }), 403
 
     # ===========================
-    # 5. Verifica se o funcionário está de férias
+    # 4. Verifica se o funcionário está de férias
     # ===========================
-    data_atual = datetime.strptime(data_registro, "%Y-%m-%d").date()
-    cursor.execute("""
-        SELECT data_inicio, data_fim FROM ferias 
-        WHERE funcionario_id = %s AND data_inicio <= %s AND data_fim >= %s
-    """, (funcionario_id, data_atual, data_atual))
-    ferias_data = cursor.fetchone()
-    if ferias_data:
+    if de_ferias:
         return jsonify({"message": "Funcionário de férias, você não pode registrar o ponto!"}), 400
 
     # ===========================
-    # 6. Verifica se já existe ponto de entrada sem saída
+    # 5. Último ponto de entrada sem saída e, entre eles, o da unidade do
+    #    terminal (retornados pela mesma consulta)
     # ===========================
-    cursor.execute("""
-        SELECT id, hora_entrada, hora_saida, data_hora FROM registros_ponto 
-        WHERE funcionario_id = %s AND hora_saida IS NULL
-        ORDER BY data_hora DESC LIMIT 1
-    """, (funcionario_id,))
-    ultimo_ponto = cursor.fetchone()
+    if turno:
+        completo_hoje = turno.completo_no_dia(unidade_id_terminal)
+        aberto = turno.ultimo_aberto()
+        ultimo_ponto = (aberto.id, aberto.hora_entrada, aberto.hora_saida, aberto.data_hora) if aberto else None
+        aberto = turno.ultimo_aberto(unidade_id_terminal)
+        # (id, hora_entrada, data_hora)
+        entrada_aberta = (aberto.id, aberto.hora_entrada, aberto.data_hora) if aberto else None
+    else:
+        completo_hoje = decisao[13]
+        ultimo_ponto = tuple(decisao[14:18]) if decisao[14] is not None else None
+        # (id, hora_entrada, data_hora)
+        entrada_aberta = tuple(decisao[18:21]) if decisao[18] is not None else None
 
     mensagem = ""
 
     # ===========================
-    # 7. REGISTRO DE ENTRADA
+    # 6. REGISTRO DE ENTRADA
     # ===========================
     if not ultimo_ponto:
-        payload = {
-            "funcionario_id": funcionario_id,
-            "unidade_id": unidade_id_terminal,
-            "data": data_registro,
-            "hora_entrada": hora_entrada,
-            "hora_saida": None,
-            "id_biometrico": id_biometrico
-        }
+        if status != 1:
+            return _funcionario_inativo()
+        if completo_hoje:
+            return jsonify({
+                "error": "Você já registrou entrada e saída neste dia. Não é possível registrar nova entrada."
+            }), 400
         try:
-            response = requests.post(
-                "http://biometrico.itaguai.rj.gov.br:3001/reg/calcular-registro-ponto-assistencia",
-                json=payload,
-                timeout=10
-            )
-            response.raise_for_status()
-        except requests.RequestException as e:
-            # Repasse a mensagem do Node.js se houver
-            if e.response is not None and e.response.content:
-                try:
-                    error_json = e.response.json()
-                    return jsonify(error_json), e.response.status_code
-                except Exception:
-                    return jsonify({"message": e.response.text}), e.response.status_code
-            return jsonify({"message": "Erro ao registrar ponto no sistema"}), 500
+            registro_entrada_id = registrar_entrada(cursor, funcionario_id, unidade_id_terminal, data_registro, hora_entrada, id_biometrico)
+        except psycopg2.Error as e:
+            return _erro_ao_gravar(conn, e)
+        if registro_entrada_id is None:
+            # Entrada ou registro do dia gravado por outro terminal ou instância depois da leitura
+            conn.rollback()
+            open_shift_state.recarregar(conn, [funcionario_id])
+            return jsonify({"message": "Registro de ponto alterado por outro terminal. Por favor, tente novamente."}), 409
 
         # Envia e-mail de comprovante de entrada
         data_hora = datetime.now()
@@ -185,7 +383,8 @@ def register_ponto():
             f"Registro de entrada realizado com sucesso para funcionario: {user_name}\n"
             f"Comprovante enviado para o e-mail {email}"
         )
-        send_email(
+        enfileirar_email(
+            cursor,
             subject="Registro de Entrada - Ponto Registrado",
             recipient=email,
             body=f"""
@@ -207,7 +406,7 @@ def register_ponto():
         print(f"[ENTRADA REGISTRADA] Funcionário: {user_name} (ID: {funcionario_id}) | Unidade: {unidade_id_terminal} | Data/Hora: {data_registro} {hora_entrada}")
 
     # ===========================
-    # 8. REGISTRO DE SAÍDA (com bloqueio de 5 minutos)
+    # 7. REGISTRO DE SAÍDA (com bloqueio de 5 minutos)
     # ===========================
     elif ultimo_ponto[1] is not None and ultimo_ponto[2] is None:
         hora_entrada_time = ultimo_ponto[1]
@@ -218,43 +417,44 @@ def register_ponto():
         if tempo_decorrido_minutos < 1:
             tempo_restante = int(1 - tempo_decorrido_minutos) + 1
             print(f"[TENTATIVA BLOQUEADA] Funcionário: {user_name} (ID: {funcionario_id}) | Tempo decorrido: {tempo_decorrido_minutos:.2f} minutos | Tempo restante: {tempo_restante} minuto(s)")
+            return _aguarde_saida(tempo_decorrido_minutos)
+
+        # Se passou mais de 5 minutos, registra a saída
+        data_pendente = ultimo_ponto[3].date()
+        if data_pendente != data_atual:
+            # Entrada de outro dia sem saída: a correção fica com o RH
             return jsonify({
-                "message": f"Você deve aguardar pelo menos 5 minutos após a entrada para registrar a saída. Tempo restante: {tempo_restante} minuto(s)."
+                "error": f"Você tem saída em aberto no dia {data_pendente.strftime('%d/%m/%Y')}. Favor procurar o RH!"
             }), 400
+        if status != 1:
+            return _funcionario_inativo()
+        if not entrada_aberta:
+            return jsonify({"error": "Registro de entrada não encontrado para o dia."}), 404
 
-        # Se passou mais de 5 minutos, registra a saída
-        hora_saida = datetime.now().strftime("%H:%M:%S")
-        payload = {
-            "funcionario_id": funcionario_id,
-            "unidade_id": unidade_id_terminal,
-            "data": data_registro,
-            "hora_entrada": hora_entrada_time.strftime("%H:%M:%S"),
-            "hora_saida": hora_saida,
-            "id_biometrico": id_biometrico
-        }
+        hora_saida = datetime.now().replace(microsecond=0).time()
         try:
-            response = requests.post(
-                "http://biometrico.itaguai.rj.gov.br:3001/reg/calcular-registro-ponto-assistencia",
-                json=payload,
-                timeout=10
+            registrar_saida(
+                cursor,
+                entrada_aberta[0],
+                escala,
+                datetime.combine(entrada_aberta[2].date(), entrada_aberta[1]),
+                datetime.combine(data_atual, hora_saida)
             )
-            response.raise_for_status()
-        except requests.RequestException as e:
-            # Repasse a mensagem do Node.js se houver
-            if e.response is not None and e.response.content:
-                try:
-                    error_json = e.response.json()
-                    return jsonify(error_json), e.response.status_code
-                except Exception:
-                    return jsonify({"message": e.response.text}), e.response.status_code
-            return jsonify({"message": "Erro ao registrar ponto no sistema"}), 500
+        except psycopg2.Error as e:
+            return _erro_ao_gravar(conn, e)
+        if cursor.rowcount == 0:
+            # A entrada já tinha saída, gravada por outro terminal ou instância
+            conn.rollback()
+            open_shift_state.recarregar(conn, [funcionario_id])
+            return jsonify({"message": "Registro de ponto alterado por outro terminal. Por favor, tente novamente."}), 409
 
         # Envia e-mail de comprovante de saída
         mensagem = (
             f"Registro de saida realizado com sucesso para funcionario: {user_name}\n"
             f"Comprovante enviado para o e-mail {email}"
         )
-        send_email(
+        enfileirar_email(
+            cursor,
             subject="Registro de Saída - Ponto Registrado",
             recipient=email,
             body=f"""
@@ -276,14 +476,23 @@ def register_ponto():
         print(f"[SAÍDA REGISTRADA] Funcionário: {user_name} (ID: {funcionario_id}) | Unidade: {unidade_id_terminal} | Tempo trabalhado: {tempo_decorrido_minutos:.2f} minutos")
 
     # ===========================
-    # 9. Caso já tenha registro de saída
+    # 8. Caso já tenha registro de saída
     # ===========================
     else:
         return jsonify({"message": f"Você já bateu seu ponto de saída hoje ({data_atual.strftime('%d/%m/%Y')})."}), 400
 
-    # Finaliza conexões com banco
+    # Confirma o registro de ponto e o comprovante na mesma transação; o envio do
+    # e-mail fica com o worker em segundo plano
+    conn.commit()
     cursor.close()
-    conn.close()
+    notification_worker.notificar()
+
+    # Write-through nos turnos em memória, depois do commit
+    if not ultimo_ponto:
+        open_shift_state.abrir(funcionario_id, registro_entrada_id, unidade_id_terminal,
+                               datetime.combine(data_atual, time()), _hora(hora_entrada))
+    else:
+        open_shift_state.fechar(funcionario_id, entrada_aberta[0], hora_saida)
 
     # Resposta de sucesso com detalhes do registro
     return jsonify({
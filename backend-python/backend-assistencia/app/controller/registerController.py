@@ -1,10 +1,35 @@
 from flask import request, jsonify
-from app.services.biometric import enroll_user
-from app.db.database import get_db_connection
+from app.services.biometric import enroll_user, biometric_index
+from app.services.perfis import invalidar_funcionario
+from app.db.database import db_connection
+from app.services.importacao import importar_funcionarios, ler_csv, TIPO_ESCALA_VALIDOS
+from app.services.respostas import json_condicional, json_streaming, FORMATOS_STREAMING
 from datetime import datetime
+import base64
+import json
+import psycopg2
 
 
-TIPO_ESCALA_VALIDOS = ['8h', '12h', '16h', '24h', '12x36', '24x72', '32h', '20h']
+# Tamanho padrão e máximo da página da listagem de funcionários
+LISTAGEM_LIMITE_PADRAO = 100
+LISTAGEM_LIMITE_MAX = 1000
+
+# Campos que podem ser pedidos na listagem (parâmetro campos) e suas colunas
+LISTAGEM_CAMPOS = {
+    "id": "f.id",
+    "nome": "f.nome",
+    "matricula": "f.matricula",
+    "cargo": "f.cargo",
+    "unidade": "u.nome",
+    "id_biometrico": "f.id_biometrico"
+}
+
+# Sem a digital, de longe o maior campo de cada funcionário
+LISTAGEM_CAMPOS_PADRAO = ["id", "nome", "matricula", "cargo", "unidade"]
+
+# Maior matrícula (coluna integer) comparada na busca
+MATRICULA_MAX = 2147483647
+
 
 # Função para registrar o usuário
 def register_user():
@@ -34,38 +59,43 @@ def register_user():
     except Exception as e:
         return jsonify({"message": f"Erro durante o registro biométrico: {str(e)}"}), 500
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        if conn is None:
+            return jsonify({"message": "Erro ao conectar ao banco de dados"}), 500
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT * FROM funcionarios WHERE id_biometrico = %s OR cpf = %s OR email = %s OR matricula = %s OR nome = %s", (id_biometrico, cpf, email, matricula, user_name))
 
-    cursor.execute("SELECT * FROM funcionarios WHERE id_biometrico = %s OR cpf = %s OR email = %s OR matricula = %s OR nome = %s", (id_biometrico, cpf, email, matricula, user_name))
+        existing_user = cursor.fetchone()
 
-    existing_user = cursor.fetchone()
+        if existing_user:
+            return jsonify({"message": "User ID, CPF, Email, Matrícula ou Nome já existe"}), 400
 
-    if existing_user:
-        return jsonify({"message": "User ID, CPF, Email, Matrícula ou Nome já existe"}), 400
+        cursor.execute("SELECT * FROM funcionarios WHERE matricula = %s", (matricula,))
+        existing_matricula = cursor.fetchone()
 
-    cursor.execute("SELECT * FROM funcionarios WHERE matricula = %s", (matricula,))
-    existing_matricula = cursor.fetchone()
+        if existing_matricula:
+            return jsonify({"message": "Matrícula already exists"}), 400
 
-    if existing_matricula:
-        return jsonify({"message": "Matrícula already exists"}), 400
+        # current_time = datetime.now()
 
-    # current_time = datetime.now()
+        # Verificação do valor de tipo_escala antes de inserir
+        print(f"tipo_escala: {tipo_escala}")  # Log para depuração
 
-    # Verificação do valor de tipo_escala antes de inserir
-    print(f"tipo_escala: {tipo_escala}")  # Log para depuração
+        cursor.execute(""" 
+            INSERT INTO funcionarios (nome, cpf, cargo, id_biometrico, unidade_id, matricula, tipo_escala, telefone, email, data_admissao, created_at, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        """, (user_name, cpf, cargo, id_biometrico, unidade_id, matricula, tipo_escala, telefone, email, data_admissao))
+        conn.commit()
 
-    cursor.execute(""" 
-        INSERT INTO funcionarios (nome, cpf, cargo, id_biometrico, unidade_id, matricula, tipo_escala, telefone, email, data_admissao, created_at, updated_at)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_DATE, CURRENT_DATE)
-    """, (user_name, cpf, cargo, id_biometrico, unidade_id, matricula, tipo_escala, telefone, email, data_admissao))
-    conn.commit()
+        cursor.execute("SELECT * FROM funcionarios WHERE matricula = %s", (matricula,))
+        registered_user = cursor.fetchone()
 
-    cursor.execute("SELECT * FROM funcionarios WHERE matricula = %s", (matricula,))
-    registered_user = cursor.fetchone()
+        cursor.close()
 
-    cursor.close()
-    conn.close()
+    # Disponibiliza a nova digital para identificação imediatamente
+    biometric_index.upsert(registered_user[0], id_biometrico, unidade_id)
+    invalidar_funcionario(registered_user[0])
 
     return jsonify({
         "message": "User registered successfully",
@@ -86,6 +116,46 @@ def register_user():
         }
     }), 200
 
+# Importação em lote de funcionários com digital (CSV no formato do fir.csv mais
+# as colunas de RH), enviado como arquivo "arquivo" ou no corpo da requisição.
+# Com ?simular=1 apenas valida, sem gravar
+def import_funcionarios():
+    arquivo = request.files.get('arquivo')
+    texto = arquivo.read().decode('utf-8') if arquivo else request.get_data(as_text=True)
+    if not texto.strip():
+        return jsonify({"message": "Envie o CSV no campo 'arquivo' ou no corpo da requisição."}), 400
+    linhas = ler_csv(texto, request.args.get('unidade_id'))
+    simular = request.args.get('simular') in ('1', 'true')
+
+    with db_connection() as conn:
+        if conn is None:
+            return jsonify({"message": "Erro ao conectar ao banco de dados"}), 500
+        try:
+            resultados, importados = importar_funcionarios(conn, linhas)
+            if simular:
+                conn.rollback()
+            else:
+                conn.commit()
+        except psycopg2.Error as e:
+            # Conflito gravado por outra requisição entre a verificação e o COPY: nada foi importado
+            conn.rollback()
+            print(f"[ERRO] Falha ao importar funcionários: {e}")
+            return jsonify({"message": f"Erro ao importar funcionários, nenhum registro gravado: {e}"}), 409
+
+    # Novas digitais disponíveis para identificação de uma só vez
+    if importados and not simular:
+        biometric_index.upsert_many(importados)
+        invalidar_funcionario(*(funcionario_id for funcionario_id, _, _ in importados))
+
+    print(f"[IMPORTACAO] {len(importados)} de {len(linhas)} funcionários {'validados' if simular else 'importados'}")
+    return jsonify({
+        "total": len(linhas),
+        "importados": len(importados),
+        "rejeitados": len(linhas) - len(importados),
+        "simulacao": simular,
+        "resultados": resultados
+    }), 200
+
 # NOVA FUNÇÃO: Atualizar biometria do funcionário
 def update_biometric():
     data = request.json
@@ -96,104 +166,162 @@ def update_biometric():
     if not funcionario_id and not matricula:
         return jsonify({"message": "É necessário fornecer funcionario_id ou matricula"}), 400
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        if conn is None:
+            return jsonify({"message": "Erro ao conectar ao banco de dados"}), 500
+        cursor = conn.cursor()
     
-    # Buscar funcionário existente
-    if funcionario_id:
-        cursor.execute("SELECT id, nome, matricula, id_biometrico FROM funcionarios WHERE id = %s", (funcionario_id,))
-    else:
-        cursor.execute("SELECT id, nome, matricula, id_biometrico FROM funcionarios WHERE matricula = %s", (matricula,))
+        # Buscar funcionário existente
+        if funcionario_id:
+            cursor.execute("SELECT id, nome, matricula, id_biometrico FROM funcionarios WHERE id = %s", (funcionario_id,))
+        else:
+            cursor.execute("SELECT id, nome, matricula, id_biometrico FROM funcionarios WHERE matricula = %s", (matricula,))
     
-    funcionario = cursor.fetchone()
+        funcionario = cursor.fetchone()
     
-    if not funcionario:
-        cursor.close()
-        conn.close()
-        return jsonify({"message": "Funcionário não encontrado"}), 404
+        if not funcionario:
+            cursor.close()
+            return jsonify({"message": "Funcionário não encontrado"}), 404
     
-    func_id, nome, matricula_func, id_biometrico_antigo = funcionario
+        func_id, nome, matricula_func, id_biometrico_antigo = funcionario
     
-    try:
-        # Registrar nova biometria usando a matrícula
-        novo_id_biometrico = enroll_user(matricula_func)
+        try:
+            # Registrar nova biometria usando a matrícula
+            novo_id_biometrico = enroll_user(matricula_func)
         
-        # Verificar se o novo ID biométrico já existe em outro funcionário
-        cursor.execute("SELECT id, nome FROM funcionarios WHERE id_biometrico = %s AND id != %s", (novo_id_biometrico, func_id))
-        conflito = cursor.fetchone()
+            # Verificar se o novo ID biométrico já existe em outro funcionário
+            cursor.execute("SELECT id, nome FROM funcionarios WHERE id_biometrico = %s AND id != %s", (novo_id_biometrico, func_id))
+            conflito = cursor.fetchone()
         
-        if conflito:
-            cursor.close()
-            conn.close()
-            return jsonify({"message": f"Este ID biométrico já está sendo usado por outro funcionário: {conflito[1]}"}), 400
+            if conflito:
+                cursor.close()
+                return jsonify({"message": f"Este ID biométrico já está sendo usado por outro funcionário: {conflito[1]}"}), 400
         
-        # Atualizar o id_biometrico no banco
-        cursor.execute("""
-            UPDATE funcionarios 
-            SET id_biometrico = %s, updated_at = CURRENT_DATE 
-            WHERE id = %s
-        """, (novo_id_biometrico, func_id))
+            # Atualizar o id_biometrico no banco
+            cursor.execute("""
+                UPDATE funcionarios 
+                SET id_biometrico = %s, updated_at = CURRENT_TIMESTAMP 
+                WHERE id = %s
+            """, (novo_id_biometrico, func_id))
         
-        conn.commit()
+            conn.commit()
         
-        # Buscar dados atualizados
-        cursor.execute("SELECT * FROM funcionarios WHERE id = %s", (func_id,))
-        funcionario_atualizado = cursor.fetchone()
+            # Buscar dados atualizados
+            cursor.execute("SELECT * FROM funcionarios WHERE id = %s", (func_id,))
+            funcionario_atualizado = cursor.fetchone()
         
-        cursor.close()
-        conn.close()
+            cursor.close()
         
-        print(f"[BIOMETRIA ATUALIZADA] Funcionário: {nome} | ID: {func_id} | Matrícula: {matricula_func} | ID Biométrico Antigo: {id_biometrico_antigo} | Novo ID Biométrico: {novo_id_biometrico}")
+            # Substitui a digital antiga no índice em memória
+            biometric_index.upsert(func_id, novo_id_biometrico, funcionario_atualizado[6])
+            invalidar_funcionario(func_id)
         
-        return jsonify({
-            "message": f"Biometria atualizada com sucesso para {nome}",
-            "funcionario": {
-                "id": funcionario_atualizado[0],
-                "nome": funcionario_atualizado[1],
-                "cpf": funcionario_atualizado[2],
-                "cargo": funcionario_atualizado[3],
-                "data_admissao": funcionario_atualizado[4],
-                "id_biometrico_antigo": id_biometrico_antigo,
-                "id_biometrico_novo": funcionario_atualizado[5],
-                "unidade_id": funcionario_atualizado[6],
-                "matricula": funcionario_atualizado[7],
-                "tipo_escala": funcionario_atualizado[8],
-                "telefone": funcionario_atualizado[9],
-                "email": funcionario_atualizado[12],
-                "updated_at": funcionario_atualizado[11]
-            }
-        }), 200
+            print(f"[BIOMETRIA ATUALIZADA] Funcionário: {nome} | ID: {func_id} | Matrícula: {matricula_func} | ID Biométrico Antigo: {id_biometrico_antigo} | Novo ID Biométrico: {novo_id_biometrico}")
         
-    except Exception as e:
-        cursor.close()
-        conn.close()
-        return jsonify({"message": f"Erro ao atualizar biometria: {str(e)}"}), 500
+            return jsonify({
+                "message": f"Biometria atualizada com sucesso para {nome}",
+                "funcionario": {
+                    "id": funcionario_atualizado[0],
+                    "nome": funcionario_atualizado[1],
+                    "cpf": funcionario_atualizado[2],
+                    "cargo": funcionario_atualizado[3],
+                    "data_admissao": funcionario_atualizado[4],
+                    "id_biometrico_antigo": id_biometrico_antigo,
+                    "id_biometrico_novo": funcionario_atualizado[5],
+                    "unidade_id": funcionario_atualizado[6],
+                    "matricula": funcionario_atualizado[7],
+                    "tipo_escala": funcionario_atualizado[8],
+                    "telefone": funcionario_atualizado[9],
+                    "email": funcionario_atualizado[12],
+                    "updated_at": funcionario_atualizado[11]
+                }
+            }), 200
+        
+        except Exception as e:
+            cursor.close()
+            return jsonify({"message": f"Erro ao atualizar biometria: {str(e)}"}), 500
 
-# NOVA FUNÇÃO: Listar funcionários para seleção
+# Listagem dos funcionários para seleção, em páginas ordenadas por nome e id.
+# Parâmetros: limite (padrão 100), apos (cursor "proximo" da página anterior),
+# busca (parte do nome ou matrícula exata) e campos (lista separada por vírgulas;
+# a digital, id_biometrico, só vem quando pedida). Responde 304 quando a página
+# não mudou desde o ETag enviado em If-None-Match. Com exportar=json ou ndjson
+# envia todos os funcionários em streaming, sem paginação
 def list_funcionarios_for_biometric():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT f.id, f.nome, f.matricula, f.cargo, u.nome as unidade_nome, f.id_biometrico
+    try:
+        limite = int(request.args.get('limite', LISTAGEM_LIMITE_PADRAO))
+    except ValueError:
+        return jsonify({"message": "limite deve ser um número inteiro."}), 400
+    if not 1 <= limite <= LISTAGEM_LIMITE_MAX:
+        return jsonify({"message": f"limite deve estar entre 1 e {LISTAGEM_LIMITE_MAX}."}), 400
+
+    campos = request.args.get('campos')
+    campos = [campo.strip() for campo in campos.split(',') if campo.strip()] if campos else LISTAGEM_CAMPOS_PADRAO
+    invalidos = [campo for campo in campos if campo not in LISTAGEM_CAMPOS]
+    if invalidos:
+        return jsonify({"message": f"Campos inválidos: {', '.join(invalidos)}. Válidos: {', '.join(LISTAGEM_CAMPOS)}"}), 400
+
+    condicoes, parametros = [], []
+    apos = request.args.get('apos')
+    if apos:
+        try:
+            nome_apos, id_apos = _ler_cursor(apos)
+        except ValueError:
+            return jsonify({"message": "Cursor 'apos' inválido."}), 400
+        condicoes.append("(f.nome, f.id) > (%s, %s)")
+        parametros += [nome_apos, id_apos]
+
+    busca = (request.args.get('busca') or '').strip()
+    if busca:
+        padrao = '%' + busca.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        if busca.isascii() and busca.isdigit() and int(busca) <= MATRICULA_MAX:
+            condicoes.append("(f.nome ILIKE %s OR f.matricula = %s)")
+            parametros += [padrao, int(busca)]
+        else:
+            condicoes.append("f.nome ILIKE %s")
+            parametros.append(padrao)
+
+    sql = f"""
+        SELECT f.nome, f.id, {', '.join(LISTAGEM_CAMPOS[campo] for campo in campos)}
         FROM funcionarios f
         LEFT JOIN unidades u ON f.unidade_id = u.id
-        ORDER BY f.nome
-    """)
-    
-    funcionarios = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
-    funcionarios_list = []
-    for func in funcionarios:
-        funcionarios_list.append({
-            "id": func[0],
-            "nome": func[1],
-            "matricula": func[2],
-            "cargo": func[3],
-            "unidade": func[4],
-            "id_biometrico": func[5]
-        })
-    
-    return jsonify({"funcionarios": funcionarios_list}), 200
\ No newline at end of file
+        {'WHERE ' + ' AND '.join(condicoes) if condicoes else ''}
+        ORDER BY f.nome, f.id
+    """
+
+    # Exportação: todos os funcionários (após apos, se informado) em streaming, sem paginação
+    exportar = request.args.get('exportar')
+    if exportar:
+        if exportar not in FORMATOS_STREAMING:
+            return jsonify({"message": f"exportar deve ser um de: {', '.join(FORMATOS_STREAMING)}."}), 400
+        return json_streaming(sql, parametros, lambda func: dict(zip(campos, func[2:])), "funcionarios", exportar)
+
+    with db_connection() as conn:
+        if conn is None:
+            return jsonify({"message": "Erro ao conectar ao banco de dados"}), 500
+        cursor = conn.cursor()
+
+        # Uma linha a mais indica que há próxima página
+        cursor.execute(sql + " LIMIT %s", parametros + [limite + 1])
+
+        funcionarios = cursor.fetchall()
+        cursor.close()
+
+    proximo = _gerar_cursor(*funcionarios[limite - 1][:2]) if len(funcionarios) > limite else None
+    return json_condicional({
+        "funcionarios": [dict(zip(campos, func[2:])) for func in funcionarios[:limite]],
+        "proximo": proximo
+    })
+
+
+def _gerar_cursor(nome, funcionario_id):
+    # Posição (nome, id) do último item da página, opaca para o cliente
+    return base64.urlsafe_b64encode(json.dumps([nome, funcionario_id]).encode('utf-8')).decode('ascii')
+
+
+def _ler_cursor(cursor):
+    try:
+        nome, funcionario_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(nome), int(funcionario_id)
+    except Exception as e:
+        raise ValueError("cursor inválido") from e
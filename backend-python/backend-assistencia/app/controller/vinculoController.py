@@ -1,8 +1,9 @@
 # app/controller/vinculoController.py
 
 from flask import request, jsonify
-from app.services.biometric import enroll_user
-from app.db.database import get_db_connection
+from app.services.biometric import enroll_user, biometric_index, VINCULO_OFFSET
+from app.services.perfis import invalidar_vinculo
+from app.db.database import db_connection
 
 # Tipos de escala válidos
 TIPO_ESCALA_VALIDOS = ['8h', '12h', '16h', '24h', '12x36', '24x72', '32h', '20h']
@@ -48,73 +49,81 @@ def criar_vinculo_adicional():
             "message": f"Tipo de escala inválido. Valores válidos: {', '.join(TIPO_ESCALA_VALIDOS)}"
         }), 400
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        if conn is None:
+            return jsonify({"message": "Erro ao conectar ao banco de dados"}), 500
+        cursor = conn.cursor()
     
-    try:
-        # 1. Verifica se o funcionário existe
-        cursor.execute("SELECT id, nome, cargo FROM funcionarios WHERE id = %s", (funcionario_id,))
-        funcionario = cursor.fetchone()
+        try:
+            # 1. Verifica se o funcionário existe
+            cursor.execute("SELECT id, nome, cargo FROM funcionarios WHERE id = %s", (funcionario_id,))
+            funcionario = cursor.fetchone()
         
-        if not funcionario:
-            return jsonify({"message": "Funcionário não encontrado"}), 404
+            if not funcionario:
+                return jsonify({"message": "Funcionário não encontrado"}), 404
         
-        # Não é necessário validar se é médico - qualquer funcionário pode ter vínculos adicionais
+            # Não é necessário validar se é médico - qualquer funcionário pode ter vínculos adicionais
         
-        # 2. Verifica se a matrícula já existe na tabela funcionarios
-        cursor.execute("SELECT id FROM funcionarios WHERE matricula = %s", (matricula,))
-        matricula_existente = cursor.fetchone()
+            # 2. Verifica se a matrícula já existe na tabela funcionarios
+            cursor.execute("SELECT id FROM funcionarios WHERE matricula = %s", (matricula,))
+            matricula_existente = cursor.fetchone()
         
-        if matricula_existente:
-            return jsonify({"message": "Matrícula já existe"}), 400
+            if matricula_existente:
+                return jsonify({"message": "Matrícula já existe"}), 400
         
-        # 3. Verifica se a matrícula já existe em vínculos adicionais
-        cursor.execute(
-            "SELECT id FROM funcionarios_unidades_adicionais WHERE matricula = %s", 
-            (matricula,)
-        )
-        matricula_vinculo_existente = cursor.fetchone()
+            # 3. Verifica se a matrícula já existe em vínculos adicionais
+            cursor.execute(
+                "SELECT id FROM funcionarios_unidades_adicionais WHERE matricula = %s", 
+                (matricula,)
+            )
+            matricula_vinculo_existente = cursor.fetchone()
         
-        if matricula_vinculo_existente:
-            return jsonify({"message": "Matrícula já existe nos vínculos adicionais"}), 400
+            if matricula_vinculo_existente:
+                return jsonify({"message": "Matrícula já existe nos vínculos adicionais"}), 400
         
-        # 4. Registra a biometria usando o leitor biométrico
-        try:
-            id_biometrico = enroll_user(matricula)
-        except Exception as e:
-            return jsonify({
-                "message": f"Erro durante o registro biométrico: {str(e)}"
-            }), 500
+            # 4. Registra a biometria usando o leitor biométrico
+            try:
+                id_biometrico = enroll_user(matricula)
+            except Exception as e:
+                return jsonify({
+                    "message": f"Erro durante o registro biométrico: {str(e)}"
+                }), 500
         
-        # 5. Insere o vínculo adicional no banco de dados
-        cursor.execute("""
-            INSERT INTO funcionarios_unidades_adicionais 
-            (funcionario_id, unidade_id, matricula, id_biometrico, tipo_escala, cargo, status)
-            VALUES (%s, %s, %s, %s, %s, %s, 1)
-        """, (funcionario_id, unidade_id, matricula, id_biometrico, tipo_escala, cargo))
+            # 5. Insere o vínculo adicional no banco de dados
+            cursor.execute("""
+                INSERT INTO funcionarios_unidades_adicionais 
+                (funcionario_id, unidade_id, matricula, id_biometrico, tipo_escala, cargo, status)
+                VALUES (%s, %s, %s, %s, %s, %s, 1)
+                RETURNING id
+            """, (funcionario_id, unidade_id, matricula, id_biometrico, tipo_escala, cargo))
+            vinculo_id = cursor.fetchone()[0]
         
-        conn.commit()
+            conn.commit()
         
-        return jsonify({
-            "message": "Vínculo adicional criado com sucesso",
-            "vinculo": {
-                "funcionario_id": funcionario_id,
-                "funcionario_nome": funcionario[1],
-                "unidade_id": unidade_id,
-                "matricula": matricula,
-                "id_biometrico": id_biometrico,
-                "tipo_escala": tipo_escala,
-                "cargo": cargo,
-                "status": 1
-            }
-        }), 201
+            # Disponibiliza a digital do vínculo para identificação imediatamente
+            biometric_index.upsert(VINCULO_OFFSET + vinculo_id, id_biometrico, unidade_id)
+            invalidar_vinculo(vinculo_id)
         
-    except Exception as e:
-        conn.rollback()
-        return jsonify({
-            "message": f"Erro ao criar vínculo adicional: {str(e)}"
-        }), 500
+            return jsonify({
+                "message": "Vínculo adicional criado com sucesso",
+                "vinculo": {
+                    "id": vinculo_id,
+                    "funcionario_id": funcionario_id,
+                    "funcionario_nome": funcionario[1],
+                    "unidade_id": unidade_id,
+                    "matricula": matricula,
+                    "id_biometrico": id_biometrico,
+                    "tipo_escala": tipo_escala,
+                    "cargo": cargo,
+                    "status": 1
+                }
+            }), 201
+        
+        except Exception as e:
+            conn.rollback()
+            return jsonify({
+                "message": f"Erro ao criar vínculo adicional: {str(e)}"
+            }), 500
         
-    finally:
-        cursor.close()
-        conn.close()
+        finally:
+            cursor.close()
@@ -1,7 +1,11 @@
 # app/routes/identifyRoutes.py
 
 from flask import request, jsonify
-from app.controller.identifyController import identify_user_route
+from app.controller.identifyController import identify_user_route, identify_template_route, identify_batch_route, \
+    index_status_route
 
 def identify_routes(app):
     app.add_url_rule('/identify', 'identify', identify_user_route, methods=['GET'])
+    app.add_url_rule('/identify/template', 'identify_template', identify_template_route, methods=['POST'])
+    app.add_url_rule('/identify/batch', 'identify_batch', identify_batch_route, methods=['POST'])
+    app.add_url_rule('/identify/index', 'identify_index_status', index_status_route, methods=['GET'])
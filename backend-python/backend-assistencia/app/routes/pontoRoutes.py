@@ -1,7 +1,9 @@
 # app/routes/pontoRoutes.py
 
 from flask import request, jsonify
-from app.controller.pontoController import register_ponto
+from app.controller.pontoController import register_ponto, register_ponto_template, register_ponto_bulk
 
 def ponto_routes(app):
     app.add_url_rule('/register_ponto', 'register_ponto', register_ponto, methods=['POST'])
+    app.add_url_rule('/register_ponto/template', 'register_ponto_template', register_ponto_template, methods=['POST'])
+    app.add_url_rule('/register_ponto/bulk', 'register_ponto_bulk', register_ponto_bulk, methods=['POST'])
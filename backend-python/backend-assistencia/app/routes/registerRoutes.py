@@ -1,7 +1,8 @@
 # app/routes/registerRoutes.py
 
 from flask import request, jsonify
-from app.controller.registerController import register_user
+from app.controller.registerController import register_user, import_funcionarios
 
 def register_routes(app):
     app.add_url_rule('/register', 'register', register_user, methods=['POST'])
+    app.add_url_rule('/funcionarios/importar', 'import_funcionarios', import_funcionarios, methods=['POST'])
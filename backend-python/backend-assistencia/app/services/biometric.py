@@ -1,21 +1,545 @@
-import comtypes.client
+import os
+import threading
+import time
+from datetime import datetime, timedelta
 
+from dotenv import load_dotenv
 
-# Inicializando a biometria
-NBioBSP = comtypes.client.CreateObject("NBioBSPCOM.NBioBSP")
-Device = NBioBSP.Device
-Extraction = NBioBSP.Extraction
-IndexSearch = NBioBSP.IndexSearch 
+from app.db.database import db_connection
+from app.services.leitor import device_worker
+from app.services.matcher import create_matcher, decode_fir, max_replicas
+from app.services.matcher_pool import MatcherPool
+from app.services.perfis import invalidar_funcionario, invalidar_vinculo
+from app.services.snapshot import read_snapshot, write_snapshot, TIPO_FUNCIONARIO, TIPO_VINCULO
 
+load_dotenv()
+
+# Referência para medir o tempo entre o início do processo e a primeira identificação
+PROCESS_START = time.perf_counter()
+
+# Offset usado para diferenciar vínculos adicionais de funcionários principais no índice
+VINCULO_OFFSET = 1000000
+
+# Nível de segurança padrão usado na identificação (1 a 9)
+SECURITY_LEVEL = 5
+
+# Intervalo (segundos) da sincronização incremental do índice com o banco
+REFRESH_INTERVAL_SECONDS = int(os.getenv("BIOMETRIC_INDEX_REFRESH_SECONDS", 5))
+
+# Margem aplicada à marca d'água para não perder linhas gravadas por
+# transações que começaram antes da última sincronização
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+# Colunas da digital usadas na carga do índice: o binário (bytea) já decodificado,
+# e a FIR em texto somente para linhas ainda sem binário
+TEMPLATE_COLUMNS = "id_biometrico_bin, CASE WHEN id_biometrico_bin IS NULL THEN id_biometrico::text END"
+
+# Linhas trazidas do banco por vez pelo cursor do servidor na carga completa:
+# as digitais entram no índice enquanto o próximo lote ainda está sendo lido
+LOAD_ITERSIZE = int(os.getenv("BIOMETRIC_LOAD_ITERSIZE", 2000))
+
+# Snapshot em disco usado para reiniciar o processo sem recarregar todas as digitais do banco
+SNAPSHOT_PATH = os.getenv("BIOMETRIC_SNAPSHOT_PATH", "indice_biometrico.snap")
+
+
+# Cadastro e captura passam pela thread dona do leitor, que o mantém aberto
+# entre as operações e atende identificações antes de cadastros
 def enroll_user(id_biometrico):
-    Device.Open(255)
-    Extraction.Enroll(id_biometrico, 0)
-    Device.Close(255)
-    return Extraction.TextEncodeFIR
+    return device_worker.enroll(id_biometrico)
 
 def identify_user():
-    Extraction.WindowStyle = 1
-    Device.Open(255)
-    Extraction.Capture(1)
-    Device.Close(255)
-    return Extraction.TextEncodeFIR
\ No newline at end of file
+    return device_worker.capture()
+
+
+class BiometricIndex:
+    """
+    Índice de digitais mantido em memória durante toda a vida do processo.
+    É carregado uma única vez (na inicialização do servidor ou na primeira
+    identificação) e depois atualizado de forma incremental: cadastros,
+    recadastros e vínculos ativados/desativados entram ou saem do índice
+    individualmente, sem recarregar todos os funcionários.
+
+    As digitais ficam particionadas por unidade_id (vínculos na unidade do
+    próprio vínculo), de modo que a batida de ponto busca primeiro apenas
+    entre os funcionários da unidade do terminal.
+
+    As buscas rodam em um pool de réplicas isoladas da base (MatcherPool),
+    de modo que identificações simultâneas não disputam o mesmo matcher.
+    A carga completa monta um pool novo e só o troca pelo atual no final.
+    """
+
+    def __init__(self, matcher_factory, tamanho_pool=None, max_replicas=None):
+        self._lock = threading.RLock()
+        self._carga_lock = threading.RLock()  # uma carga completa por vez
+        self._matcher_factory = matcher_factory
+        self._pool = MatcherPool(matcher_factory, tamanho_pool, max_replicas)
+        self._durante_carga = None  # alterações feitas enquanto uma carga lê o banco, reaplicadas no fim
+        self._unidades = set()
+        self._membros = {}  # user_id -> (unidade_id, digital carregada em bytes)
+        self._watermark = None
+        self._ultima_remocao = 0
+        self._remocoes_habilitadas = False
+        self._refresher = None
+        self.carregado = False
+        self.tempo_carga_ms = None
+        self.carregado_em = None
+        self.atualizado_em = None
+        self.total_atualizacoes = 0
+        self.buscas_unidade = 0
+        self.buscas_globais = 0
+        self.origem_carga = None
+        self.primeira_identificacao_ms = None
+
+    # ---------------------------
+    # Operações individuais
+    # ---------------------------
+    def upsert(self, user_id, fir, unidade_id):
+        """
+        Adiciona ou substitui a digital de um usuário no índice da sua unidade.
+        Retorna False quando a mesma digital já estava carregada na mesma unidade.
+        Sem digital (None) ou com uma FIR inválida o usuário sai do índice.
+        """
+        unidade_id = _chave_unidade(unidade_id)
+        if fir is not None:
+            fir = _decodificar(fir, user_id)
+        with self._lock:
+            if fir is None:
+                return self.remove(user_id)
+            if self._membros.get(user_id) == (unidade_id, fir):
+                return False
+            self.remove(user_id)
+            self._adicionar(user_id, fir, unidade_id)
+            return True
+
+    def upsert_many(self, registros):
+        """
+        Adiciona ou substitui várias digitais de uma vez, com uma única
+        aquisição do lock. registros: (user_id, fir, unidade_id).
+        Retorna quantas digitais mudaram.
+        """
+        with self._lock:
+            alteracoes = sum(self.upsert(user_id, fir, unidade_id) for user_id, fir, unidade_id in registros)
+            self.total_atualizacoes += alteracoes
+            return alteracoes
+
+    def remove(self, user_id):
+        """Remove a digital de um usuário do índice (se estiver carregada)."""
+        with self._lock:
+            if user_id not in self._membros:
+                return False
+            unidade_id, _ = self._membros.pop(user_id)
+            self._pool.remove_template(unidade_id, user_id)
+            if self._durante_carga is not None:
+                self._durante_carga.append((user_id, None, None))
+            return True
+
+    # ---------------------------
+    # Carga completa e sincronização incremental
+    # ---------------------------
+    def load(self):
+        """
+        Recarrega todas as digitais (funcionários e vínculos ativos) do banco.
+
+        As digitais são carregadas em um pool novo, sem o lock do índice: as
+        identificações continuam no pool atual até a troca, e os cadastros e
+        remoções feitos durante a carga são reaplicados sobre o índice novo.
+        """
+        with self._carga_lock:
+            inicio = time.perf_counter()
+            with self._lock:
+                self._durante_carga = []
+            pool = MatcherPool(self._matcher_factory, self._pool.tamanho)
+            destino = (pool, {}, set())
+
+            try:
+                with db_connection() as conn:
+                    if conn is None:
+                        raise RuntimeError("Não foi possível conectar ao banco para carregar o índice biométrico")
+
+                    cursor = conn.cursor()
+
+                    # Marca d'água lida antes da carga: o que mudar durante a carga
+                    # será reaplicado no próximo refresh
+                    watermark = self._db_watermark(cursor)
+                    remocoes_habilitadas = self._tabela_remocoes_existe(cursor)
+                    ultima_remocao = self._ultima_remocao
+                    if remocoes_habilitadas:
+                        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM biometria_remocoes")
+                        ultima_remocao = cursor.fetchone()[0]
+                    cursor.close()
+
+                    # Funcionários principais, na unidade de lotação
+                    for row in _stream(conn, "carga_funcionarios", f"SELECT {TEMPLATE_COLUMNS}, id, unidade_id FROM funcionarios"):
+                        fir = _template(row[0], row[1], int(row[2]))
+                        if fir is not None:
+                            self._adicionar(int(row[2]), fir, row[3], destino)
+
+                    # Vínculos adicionais ativos com digital, com offset para não colidir com
+                    # os funcionários, na unidade do vínculo
+                    for row in _stream(conn, "carga_vinculos", f"""
+                        SELECT {TEMPLATE_COLUMNS}, id, unidade_id FROM funcionarios_unidades_adicionais
+                        WHERE status = 1 AND (id_biometrico_bin IS NOT NULL OR id_biometrico IS NOT NULL)
+                    """):
+                        fir = _template(row[0], row[1], VINCULO_OFFSET + int(row[2]))
+                        if fir is not None:
+                            self._adicionar(VINCULO_OFFSET + int(row[2]), fir, row[3], destino)
+
+                # As digitais são enviadas às réplicas pela fila de cada uma: o tempo
+                # de carga conta até todas terem sido aplicadas
+                pool.aguardar()
+            except Exception:
+                with self._lock:
+                    self._durante_carga = None
+                pool.encerrar()
+                raise
+
+            with self._lock:
+                pool_anterior = self._pool
+                self._pool, self._membros, self._unidades = destino
+                self._watermark = watermark
+                self._remocoes_habilitadas = remocoes_habilitadas
+                self._ultima_remocao = ultima_remocao
+                # Alterações feitas enquanto a carga lia o banco podem não estar no resultado
+                durante_carga, self._durante_carga = self._durante_carga, None
+                for user_id, fir, unidade_id in durante_carga:
+                    self.upsert(user_id, fir, unidade_id)
+                self.tempo_carga_ms = (time.perf_counter() - inicio) * 1000
+                self.carregado_em = datetime.now()
+                self.atualizado_em = self.carregado_em
+                self.origem_carga = "banco"
+                self.carregado = True
+
+            # Identificações já enviadas ao pool anterior são atendidas antes de ele encerrar
+            pool_anterior.encerrar()
+
+        self.save_snapshot()
+        stats = self.stats()
+        print(f"[INDICE BIOMETRICO] {stats['total_funcionarios']} funcionários e {stats['total_vinculos']} vínculos carregados em {stats['total_unidades']} unidades em {self.tempo_carga_ms:.0f} ms")
+
+    def refresh(self):
+        """
+        Aplica somente as mudanças ocorridas desde a última sincronização,
+        usando updated_at como marca d'água e a tabela biometria_remocoes
+        para exclusões. O custo é proporcional ao número de alterações.
+        """
+        if not self.carregado:
+            self.load()
+            return 0
+
+        alteracoes = 0
+        with db_connection() as conn:
+            if conn is None:
+                return 0
+            cursor = conn.cursor()
+            watermark = self._db_watermark(cursor)
+            desde = self._watermark - REFRESH_OVERLAP
+
+            cursor.execute(f"""
+                SELECT id, {TEMPLATE_COLUMNS}, unidade_id FROM funcionarios
+                WHERE updated_at >= %s
+            """, (desde,))
+            funcionarios = cursor.fetchall()
+
+            cursor.execute(f"""
+                SELECT id, {TEMPLATE_COLUMNS}, unidade_id, status FROM funcionarios_unidades_adicionais
+                WHERE updated_at >= %s
+            """, (desde,))
+            vinculos = cursor.fetchall()
+
+            remocoes = []
+            if self._remocoes_habilitadas:
+                cursor.execute("""
+                    SELECT id, origem, registro_id FROM biometria_remocoes
+                    WHERE id > %s ORDER BY id
+                """, (self._ultima_remocao,))
+                remocoes = cursor.fetchall()
+            cursor.close()
+
+        with self._lock:
+            # Linhas dentro da margem de sobreposição que não mudaram são ignoradas pelo upsert
+            for funcionario_id, fir_bin, fir_texto, unidade_id in funcionarios:
+                alteracoes += self.upsert(int(funcionario_id), _template(fir_bin, fir_texto, int(funcionario_id)), unidade_id)
+
+            # Vínculo desativado ou sem digital sai do índice
+            for vinculo_id, fir_bin, fir_texto, unidade_id, status in vinculos:
+                fir = _template(fir_bin, fir_texto, VINCULO_OFFSET + int(vinculo_id))
+                if status == 1 and fir is not None:
+                    alteracoes += self.upsert(VINCULO_OFFSET + int(vinculo_id), fir, unidade_id)
+                else:
+                    alteracoes += self.remove(VINCULO_OFFSET + int(vinculo_id))
+
+            for remocao_id, origem, registro_id in remocoes:
+                if origem == 'vinculo':
+                    alteracoes += self.remove(VINCULO_OFFSET + int(registro_id))
+                else:
+                    alteracoes += self.remove(int(registro_id))
+                self._ultima_remocao = remocao_id
+
+            self._watermark = watermark
+            self.atualizado_em = datetime.now()
+            self.total_atualizacoes += alteracoes
+
+        # Cadastros alterados (inclusive pelo Node.js) deixam de valer no cache de perfis
+        if funcionarios:
+            invalidar_funcionario(*(row[0] for row in funcionarios))
+        if vinculos:
+            invalidar_vinculo(*(row[0] for row in vinculos))
+
+        if alteracoes:
+            print(f"[INDICE BIOMETRICO] {alteracoes} alteração(ões) aplicadas ao índice")
+        return alteracoes
+
+    def start_refresher(self, interval=None):
+        """Inicia a thread que sincroniza o índice periodicamente com o banco."""
+        interval = interval or REFRESH_INTERVAL_SECONDS
+        if self._refresher is not None:
+            return
+
+        def _loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.refresh():
+                        self.save_snapshot()
+                except Exception as e:
+                    print(f"[INDICE BIOMETRICO] Erro ao sincronizar índice: {e}")
+
+        self._refresher = threading.Thread(target=_loop, name="biometric-index-refresher", daemon=True)
+        self._refresher.start()
+
+    # ---------------------------
+    # Snapshot em disco (partida a frio)
+    # ---------------------------
+    def save_snapshot(self, path=None):
+        """Grava todas as digitais carregadas, com a marca d'água atual, em disco."""
+        path = path or SNAPSHOT_PATH
+        with self._lock:
+            if not self.carregado:
+                return
+            entries = [
+                (user_id, unidade_id, _tipo_usuario(user_id), template)
+                for user_id, (unidade_id, template) in self._membros.items()
+            ]
+            watermark = self._watermark
+            ultima_remocao = self._ultima_remocao
+        try:
+            tamanho = write_snapshot(path, entries, watermark, ultima_remocao)
+            print(f"[INDICE BIOMETRICO] Snapshot gravado em {path} ({len(entries)} digitais, {tamanho / 1024:.0f} KB)")
+        except OSError as e:
+            print(f"[INDICE BIOMETRICO] Erro ao gravar snapshot {path}: {e}")
+
+    def load_snapshot(self, path=None):
+        """
+        Carrega as digitais do snapshot (via mmap), valida contra o banco e
+        aplica apenas as alterações posteriores à marca d'água do snapshot.
+        Retorna False quando o snapshot não existe ou não é válido.
+        """
+        path = path or SNAPSHOT_PATH
+        inicio = time.perf_counter()
+        snapshot = read_snapshot(path)
+        if snapshot is None:
+            return False
+        watermark, ultima_remocao, entries = snapshot
+
+        with self._lock:
+            self._pool.clear()
+            self._membros.clear()
+            for user_id, unidade_id, _tipo, template in entries:
+                self._adicionar(user_id, template, unidade_id)
+            self._watermark = watermark
+            self._ultima_remocao = ultima_remocao
+            self.carregado = True
+
+            # Aplica as alterações feitas no banco depois do snapshot e confere o total
+            if not self._snapshot_valido(watermark, ultima_remocao):
+                print(f"[INDICE BIOMETRICO] Snapshot {path} descartado: não confere com o banco")
+                self.carregado = False
+                return False
+            self.refresh()
+            if len(self._membros) != self._total_no_banco():
+                print(f"[INDICE BIOMETRICO] Snapshot {path} descartado: total de digitais diverge do banco")
+                self.carregado = False
+                return False
+
+            self._pool.aguardar()
+            self.tempo_carga_ms = (time.perf_counter() - inicio) * 1000
+            self.carregado_em = datetime.now()
+            self.origem_carga = "snapshot"
+
+        print(f"[INDICE BIOMETRICO] {len(entries)} digitais carregadas do snapshot {path} em {self.tempo_carga_ms:.0f} ms")
+        return True
+
+    def warm_start(self):
+        """Carrega o índice na inicialização: snapshot + deltas, ou carga completa do banco."""
+        if not self.load_snapshot():
+            self.load()
+        elif self.total_atualizacoes:
+            self.save_snapshot()
+        print(f"[INDICE BIOMETRICO] Índice pronto ({self.origem_carga}) {(time.perf_counter() - PROCESS_START) * 1000:.0f} ms após o início do processo")
+
+    def _snapshot_valido(self, watermark, ultima_remocao):
+        with db_connection() as conn:
+            if conn is None:
+                return False
+            cursor = conn.cursor()
+            agora = self._db_watermark(cursor)
+            self._remocoes_habilitadas = self._tabela_remocoes_existe(cursor)
+            maior_remocao = 0
+            if self._remocoes_habilitadas:
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM biometria_remocoes")
+                maior_remocao = cursor.fetchone()[0]
+            cursor.close()
+        # Marca d'água no futuro ou log de remoções menor que o do snapshot: banco foi restaurado
+        return watermark <= agora and maior_remocao >= ultima_remocao
+
+    def _total_no_banco(self):
+        with db_connection() as conn:
+            if conn is None:
+                return -1
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT (SELECT COUNT(*) FROM funcionarios)
+                     + (SELECT COUNT(*) FROM funcionarios_unidades_adicionais
+                        WHERE status = 1 AND (id_biometrico_bin IS NOT NULL OR id_biometrico IS NOT NULL))
+            """)
+            total = cursor.fetchone()[0]
+            cursor.close()
+        return total
+
+    @staticmethod
+    def _db_watermark(cursor):
+        # Usa o relógio do banco (mesma referência do updated_at)
+        cursor.execute("SELECT LOCALTIMESTAMP")
+        return cursor.fetchone()[0]
+
+    @staticmethod
+    def _tabela_remocoes_existe(cursor):
+        cursor.execute("SELECT to_regclass('public.biometria_remocoes') IS NOT NULL")
+        existe = cursor.fetchone()[0]
+        if not existe:
+            print("[INDICE BIOMETRICO] Tabela biometria_remocoes não encontrada: exclusões só serão refletidas na próxima carga completa")
+        return existe
+
+    # ---------------------------
+    # Identificação
+    # ---------------------------
+    def ensure_loaded(self):
+        if not self.carregado:
+            with self._carga_lock:
+                if not self.carregado:
+                    self.load()
+
+    def identify(self, fir_data, unidade_id=None, security_level=SECURITY_LEVEL):
+        """
+        Identifica a digital capturada. Retorna o UserID encontrado ou 0.
+
+        Com unidade_id informado, busca primeiro apenas na unidade do terminal.
+        As demais unidades só são consultadas se a digital não for encontrada
+        ali, para que o controller possa informar que o funcionário não
+        pertence à unidade.
+        """
+        user_id = self.identify_many([fir_data], unidade_id, security_level)[0]
+
+        if user_id != 0 and self.primeira_identificacao_ms is None:
+            self.primeira_identificacao_ms = (time.perf_counter() - PROCESS_START) * 1000
+            print(f"[INDICE BIOMETRICO] Primeira identificação {self.primeira_identificacao_ms:.0f} ms após o início do processo")
+        return user_id
+
+    def identify_many(self, firs, unidade_id=None, security_level=SECURITY_LEVEL):
+        """
+        Identifica várias digitais de uma vez, distribuídas entre as réplicas
+        do pool. Retorna os UserIDs encontrados (ou 0) na ordem recebida.
+        """
+        self.ensure_loaded()
+        unidade_id = _chave_unidade(unidade_id)
+        with self._lock:
+            # Enviadas com o lock para ficar na fila de cada réplica depois das alterações já feitas
+            futuros = [self._pool.submit(fir, unidade_id, security_level) for fir in firs]
+        resultados = [futuro.result() for futuro in futuros]
+        with self._lock:
+            self.buscas_unidade += sum(buscou_unidade for _, buscou_unidade, _ in resultados)
+            self.buscas_globais += sum(buscou_global for _, _, buscou_global in resultados)
+        return [user_id for user_id, _, _ in resultados]
+
+    def _adicionar(self, user_id, fir, unidade_id, destino=None):
+        # destino: (pool, membros, unidades) de uma carga completa; sem ele, o índice atual
+        unidade_id = _chave_unidade(unidade_id)
+        if destino is None:
+            destino = (self._pool, self._membros, self._unidades)
+            if self._durante_carga is not None:
+                self._durante_carga.append((user_id, fir, unidade_id))
+        pool, membros, unidades = destino
+        pool.add_template(unidade_id, fir, user_id)
+        unidades.add(unidade_id)
+        membros[user_id] = (unidade_id, fir)
+
+    def stats(self):
+        with self._lock:
+            total_vinculos = sum(1 for user_id in self._membros if user_id >= VINCULO_OFFSET)
+            total = len(self._membros)
+        return {
+            "carregado": self.carregado,
+            "total_funcionarios": total - total_vinculos,
+            "total_vinculos": total_vinculos,
+            "total_templates": total,
+            "total_unidades": len(self._unidades),
+            "buscas_unidade": self.buscas_unidade,
+            "buscas_globais": self.buscas_globais,
+            "origem_carga": self.origem_carga,
+            "tempo_carga_ms": round(self.tempo_carga_ms, 1) if self.tempo_carga_ms is not None else None,
+            "primeira_identificacao_ms": round(self.primeira_identificacao_ms, 1) if self.primeira_identificacao_ms is not None else None,
+            "carregado_em": self.carregado_em.strftime("%d/%m/%Y %H:%M:%S") if self.carregado_em else None,
+            "atualizado_em": self.atualizado_em.strftime("%d/%m/%Y %H:%M:%S") if self.atualizado_em else None,
+            "total_atualizacoes": self.total_atualizacoes,
+            "pool": self._pool.stats()
+        }
+
+
+def _stream(conn, nome, sql, itersize=None):
+    """
+    Executa a consulta em um cursor nomeado (do lado do servidor) e entrega
+    as linhas em lotes de itersize, sem materializar a tabela inteira.
+    """
+    cursor = conn.cursor(name=nome)
+    cursor.itersize = itersize or LOAD_ITERSIZE
+    try:
+        cursor.execute(sql)
+        for row in cursor:
+            yield row
+    finally:
+        cursor.close()
+
+
+def _tipo_usuario(user_id):
+    return TIPO_VINCULO if user_id >= VINCULO_OFFSET else TIPO_FUNCIONARIO
+
+
+def _template(fir_bin, fir_texto, user_id):
+    # Digital em bytes: direto da coluna bytea ou, na falta dela, decodificada do
+    # texto; None quando o cadastro não tem digital (ou ela é inválida)
+    if fir_bin is not None:
+        return bytes(fir_bin)
+    if fir_texto is None:
+        return None
+    return _decodificar(fir_texto, user_id)
+
+
+def _decodificar(fir, user_id):
+    # FIR corrompida não derruba a carga nem a sincronização: fica fora do índice
+    try:
+        return decode_fir(fir)
+    except ValueError as e:
+        print(f"[INDICE BIOMETRICO] Digital inválida do usuário {user_id} ignorada: {e}")
+        return None
+
+
+def _chave_unidade(unidade_id):
+    # O terminal pode enviar unidade_id como texto no JSON
+    try:
+        return int(unidade_id) if unidade_id is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# Índice compartilhado por todos os controllers
+biometric_index = BiometricIndex(create_matcher, max_replicas=max_replicas())
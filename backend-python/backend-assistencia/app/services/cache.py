@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Cache read-through em memória, com TTL por entrada e limite de tamanho.
+
+    obter(chave, carregar) devolve o valor guardado enquanto ele não venceu;
+    na falta (ou depois do TTL) chama carregar() fora do lock e guarda o
+    resultado. Resultados None não são guardados, para que um cadastro novo
+    apareça na próxima consulta. Acima de max_entradas as entradas usadas há
+    mais tempo são descartadas (LRU).
+    """
+
+    def __init__(self, nome, ttl, max_entradas):
+        self.nome = nome
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # chave -> (valor, expira_em), a usada há mais tempo primeiro
+        self._geracao = 0
+        self.hits = 0
+        self.misses = 0
+        self.total_invalidacoes = 0
+        self.total_descartes = 0
+
+    def obter(self, chave, carregar):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[1] > time.monotonic():
+                self._entradas.move_to_end(chave)
+                self.hits += 1
+                return entrada[0]
+            self.misses += 1
+            geracao = self._geracao
+
+        valor = carregar()
+        if valor is not None:
+            with self._lock:
+                # Uma invalidação durante a carga pode ter tornado o valor lido antigo
+                if geracao == self._geracao:
+                    self._entradas[chave] = (valor, time.monotonic() + self.ttl)
+                    self._entradas.move_to_end(chave)
+                    while len(self._entradas) > self.max_entradas:
+                        self._entradas.popitem(last=False)
+                        self.total_descartes += 1
+        return valor
+
+    def invalidar(self, *chaves):
+        # Sem chaves não há o que descartar: as cargas em andamento continuam valendo
+        if not chaves:
+            return
+        with self._lock:
+            self._geracao += 1
+            for chave in chaves:
+                if self._entradas.pop(chave, None) is not None:
+                    self.total_invalidacoes += 1
+
+    def invalidar_se(self, condicao):
+        """Remove as entradas cujo valor satisfaz condicao(valor)."""
+        with self._lock:
+            self._geracao += 1
+            chaves = [chave for chave, (valor, _) in self._entradas.items() if condicao(valor)]
+            for chave in chaves:
+                del self._entradas[chave]
+            self.total_invalidacoes += len(chaves)
+
+    def limpar(self):
+        with self._lock:
+            self._geracao += 1
+            self.total_invalidacoes += len(self._entradas)
+            self._entradas.clear()
+
+    def stats(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "taxa_acerto": round(self.hits / consultas, 3) if consultas else None,
+                "total_invalidacoes": self.total_invalidacoes,
+                "total_descartes": self.total_descartes
+            }
@@ -0,0 +1,248 @@
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+from app.db.database import db_connection
+
+load_dotenv()
+
+# Intervalo (segundos) da sincronização incremental do índice de férias com o
+# banco. 0 desativa o índice: a verificação de férias volta a consultar o banco.
+FERIAS_REFRESH_SECONDS = int(os.getenv("FERIAS_REFRESH_SECONDS", 30))
+
+# Margem aplicada à marca d'água para não perder linhas gravadas por
+# transações que começaram antes da última sincronização
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+FERIAS_SQL = "SELECT funcionario_id, data_inicio, data_fim FROM ferias"
+
+
+class VacationIndex:
+    """
+    Períodos de férias de todos os funcionários, em memória.
+
+    Para cada funcionário os períodos ficam ordenados e sem sobreposição
+    (períodos que se sobrepõem ou se encostam são unidos), em duas listas
+    paralelas de início e fim; "está de férias no dia D" é uma busca binária,
+    O(log n) no número de períodos do funcionário, sem ida ao banco.
+
+    A sincronização periódica relê somente os funcionários com férias
+    alteradas desde a última (updated_at como marca d'água e a tabela
+    ferias_remocoes para exclusões, migração 006). Sem essa tabela cada
+    sincronização é uma carga completa.
+    """
+
+    def __init__(self, intervalo=FERIAS_REFRESH_SECONDS):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._periodos = {}  # funcionario_id -> ([data_inicio], [data_fim])
+        self._watermark = None
+        self._ultima_remocao = 0
+        self._remocoes_habilitadas = False
+        self._refresher = None
+        self.carregado = False
+        self.carregado_em = None
+        self.atualizado_em = None
+        self.tempo_carga_ms = 0
+        self.total_consultas = 0
+        self.total_sem_indice = 0
+        self.total_atualizacoes = 0
+
+    @property
+    def habilitado(self):
+        return self.intervalo > 0
+
+    # ---------------------------
+    # Carga e sincronização com o banco
+    # ---------------------------
+    def load(self):
+        """Recarrega as férias de todos os funcionários com uma única consulta."""
+        if not self.habilitado:
+            return
+        inicio = time.perf_counter()
+        with db_connection() as conn:
+            if conn is None:
+                raise RuntimeError("Não foi possível conectar ao banco para carregar as férias")
+            cursor = conn.cursor()
+            watermark = _db_watermark(cursor)
+            remocoes_habilitadas = _tabela_remocoes_existe(cursor)
+            ultima_remocao = 0
+            if remocoes_habilitadas:
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM ferias_remocoes")
+                ultima_remocao = cursor.fetchone()[0]
+            cursor.execute(FERIAS_SQL)
+            periodos = _agrupar(cursor.fetchall())
+            cursor.close()
+
+        with self._lock:
+            primeira_carga = not self.carregado
+            self._periodos = periodos
+            self._watermark = watermark
+            self._ultima_remocao = ultima_remocao
+            self._remocoes_habilitadas = remocoes_habilitadas
+            self.carregado = True
+            self.carregado_em = self.atualizado_em = datetime.now()
+            self.tempo_carga_ms = (time.perf_counter() - inicio) * 1000
+
+        if primeira_carga:
+            total = sum(len(inicios) for inicios, _ in periodos.values())
+            print(f"[FERIAS] {total} período(s) de férias de {len(periodos)} funcionário(s) carregados em {self.tempo_carga_ms:.0f} ms")
+            if not remocoes_habilitadas:
+                print("[FERIAS] Tabela ferias_remocoes não encontrada (migração 006): cada sincronização recarrega todas as férias")
+
+    def refresh(self):
+        """
+        Relê as férias dos funcionários com períodos incluídos, alterados ou
+        excluídos desde a última sincronização. Retorna quantos funcionários
+        foram atualizados.
+        """
+        if not self.habilitado:
+            return 0
+        if not self.carregado or not self._remocoes_habilitadas:
+            self.load()
+            return 0
+
+        with db_connection() as conn:
+            if conn is None:
+                return 0
+            cursor = conn.cursor()
+            watermark = _db_watermark(cursor)
+            cursor.execute("SELECT DISTINCT funcionario_id FROM ferias WHERE updated_at >= %s",
+                           (self._watermark - REFRESH_OVERLAP,))
+            ids = {row[0] for row in cursor.fetchall()}
+            cursor.execute("SELECT id, funcionario_id FROM ferias_remocoes WHERE id > %s ORDER BY id",
+                           (self._ultima_remocao,))
+            remocoes = cursor.fetchall()
+            ids.update(funcionario_id for _, funcionario_id in remocoes)
+
+            periodos = {}
+            if ids:
+                cursor.execute(FERIAS_SQL + " WHERE funcionario_id = ANY(%s)", (sorted(ids),))
+                periodos = _agrupar(cursor.fetchall())
+            cursor.close()
+
+        with self._lock:
+            # Funcionários sem nenhum período restante saem do índice
+            for funcionario_id in ids:
+                if funcionario_id in periodos:
+                    self._periodos[funcionario_id] = periodos[funcionario_id]
+                else:
+                    self._periodos.pop(funcionario_id, None)
+            if remocoes:
+                self._ultima_remocao = remocoes[-1][0]
+            self._watermark = watermark
+            self.atualizado_em = datetime.now()
+            self.total_atualizacoes += len(ids)
+        return len(ids)
+
+    def start_refresher(self):
+        """Inicia a thread que sincroniza o índice periodicamente com o banco."""
+        if not self.habilitado or self._refresher is not None:
+            return
+
+        def _loop():
+            while True:
+                time.sleep(self.intervalo)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"[FERIAS] Erro ao sincronizar as férias: {e}")
+
+        self._refresher = threading.Thread(target=_loop, name="vacation-index-refresher", daemon=True)
+        self._refresher.start()
+
+    # ---------------------------
+    # Consulta
+    # ---------------------------
+    def de_ferias(self, funcionario_id, dia):
+        """
+        Se o funcionário está de férias no dia, ou None quando o índice não
+        está carregado e a verificação deve consultar o banco.
+        """
+        with self._lock:
+            if not self.carregado:
+                self.total_sem_indice += 1
+                return None
+            self.total_consultas += 1
+            return _contem(self._periodos.get(funcionario_id), dia)
+
+    def em_ferias(self, pares):
+        """
+        Modo em lote: dos pares (funcionario_id, dia) informados, os que caem
+        em férias, ou None quando o índice não está carregado.
+        """
+        with self._lock:
+            if not self.carregado:
+                self.total_sem_indice += 1
+                return None
+            self.total_consultas += 1
+            return {
+                (funcionario_id, dia) for funcionario_id, dia in pares
+                if _contem(self._periodos.get(funcionario_id), dia)
+            }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "habilitado": self.habilitado,
+                "carregado": self.carregado,
+                "funcionarios_com_ferias": len(self._periodos),
+                "total_periodos": sum(len(inicios) for inicios, _ in self._periodos.values()),
+                "sincronizacao_incremental": self._remocoes_habilitadas,
+                "carregado_em": self.carregado_em.isoformat() if self.carregado_em else None,
+                "atualizado_em": self.atualizado_em.isoformat() if self.atualizado_em else None,
+                "tempo_carga_ms": round(self.tempo_carga_ms, 1),
+                "intervalo_sincronizacao_segundos": self.intervalo,
+                "total_consultas": self.total_consultas,
+                "total_sem_indice": self.total_sem_indice,
+                "total_atualizacoes": self.total_atualizacoes
+            }
+
+
+def _agrupar(linhas):
+    # (funcionario_id, data_inicio, data_fim) -> {funcionario_id: ([inícios], [fins])},
+    # ordenados e com os períodos sobrepostos ou contíguos unidos
+    por_funcionario = {}
+    for funcionario_id, data_inicio, data_fim in linhas:
+        if data_fim >= data_inicio:
+            por_funcionario.setdefault(funcionario_id, []).append((data_inicio, data_fim))
+
+    periodos = {}
+    for funcionario_id, intervalos in por_funcionario.items():
+        inicios, fins = [], []
+        for data_inicio, data_fim in sorted(intervalos):
+            if fins and data_inicio <= fins[-1] + timedelta(days=1):
+                fins[-1] = max(fins[-1], data_fim)
+            else:
+                inicios.append(data_inicio)
+                fins.append(data_fim)
+        periodos[funcionario_id] = (inicios, fins)
+    return periodos
+
+
+def _contem(periodos, dia):
+    # Último período iniciado até o dia; como não há sobreposição, só ele pode conter o dia
+    if not periodos:
+        return False
+    inicios, fins = periodos
+    i = bisect_right(inicios, dia) - 1
+    return i >= 0 and fins[i] >= dia
+
+
+def _db_watermark(cursor):
+    # Usa o relógio do banco (mesma referência do updated_at)
+    cursor.execute("SELECT LOCALTIMESTAMP")
+    return cursor.fetchone()[0]
+
+
+def _tabela_remocoes_existe(cursor):
+    cursor.execute("SELECT to_regclass('public.ferias_remocoes') IS NOT NULL")
+    return cursor.fetchone()[0]
+
+
+# Índice de férias compartilhado pelo processo
+vacation_index = VacationIndex()
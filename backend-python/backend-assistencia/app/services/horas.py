@@ -0,0 +1,119 @@
+import math
+from datetime import timedelta
+
+# Cálculo das horas do registro de ponto, feito no próprio processo (antes era
+# feito pelo backend Node.js em /reg/calcular-registro-ponto-assistencia). As
+# regras e o formato dos intervalos são os mesmos do Node.js.
+
+# Jornada esperada (horas) por tipo_escala_enum
+JORNADAS = {
+    '8h': 8, '12h': 12, '16h': 16, '24h': 22,
+    '12x36': 12, '24x72': 22, '32h': 32, '20h': 20
+}
+JORNADA_PADRAO = 8
+
+# Pausa de almoço (horas) descontada do tempo trabalhado
+PAUSAS_ALMOCO = {'24h': 2, '24x72': 2, '16h': 2, '8h': 1, '12h': 1}
+
+# Primeira chave dos advisory locks que serializam as gravações de ponto de um
+# mesmo funcionário, nas batidas e nos lotes (a segunda é o funcionario_id)
+LOCK_PONTO_FUNCIONARIO = 4701
+
+
+def _arredondar(valor):
+    # Math.round do JavaScript: meio para cima
+    piso = math.floor(valor)
+    return piso + 1 if valor - piso >= 0.5 else piso
+
+
+def formatar_intervalo(horas):
+    """
+    Horas (fração) -> 'H:MM:00', com minutos arredondados, como o Node.js
+    envia ao PostgreSQL. Quando o arredondamento chega a 60 minutos o valor
+    passa para a hora seguinte (o Node.js gerava 'H:60:00', que o
+    PostgreSQL rejeita).
+    """
+    h = math.floor(horas)
+    m = _arredondar((horas - h) * 60)
+    if m == 60:
+        h, m = h + 1, 0
+    return f"{h}:{m:02d}:00"
+
+
+def calcular_horas(escala, entrada, saida):
+    """
+    Horas do registro entre `entrada` e `saida` (datetimes) para a escala do
+    funcionário. Saída igual ou anterior à entrada é considerada no dia
+    seguinte. Retorna os intervalos gravados em registros_ponto.
+    """
+    if saida <= entrada:
+        saida += timedelta(days=1)
+
+    tempo = (saida - entrada).total_seconds() / 3600
+    pausa = PAUSAS_ALMOCO.get(escala, 0)
+    jornada = JORNADAS.get(escala, JORNADA_PADRAO)
+
+    # A pausa só é descontada de quem trabalhou mais do que ela
+    trabalhado = tempo - pausa if tempo > pausa else tempo
+    diferenca = trabalhado - jornada
+
+    return {
+        "horas_normais": formatar_intervalo(min(trabalhado, jornada)),
+        "hora_extra": formatar_intervalo(diferenca if diferenca > 0 else 0),
+        "hora_desconto": formatar_intervalo(abs(diferenca) if diferenca < 0 else 0),
+        "total_trabalhado": formatar_intervalo(trabalhado),
+        "hora_saida_ajustada": formatar_intervalo(tempo)
+    }
+
+
+def registrar_entrada(cursor, funcionario_id, unidade_id, data, hora_entrada, id_biometrico):
+    """
+    Insere o registro de entrada usando o cursor (e a transação) de quem chama.
+    Retorna o id.
+
+    A decisão pela entrada pode ter vindo dos turnos em memória, que não
+    enxergam as batidas recentes de outras instâncias: com as gravações do
+    funcionário serializadas pelo advisory lock, a entrada só é inserida se
+    ele ainda não tiver entrada sem saída nem registro completo no dia na
+    unidade. Caso contrário retorna None.
+    """
+    cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", (LOCK_PONTO_FUNCIONARIO, funcionario_id))
+    cursor.execute("""
+        INSERT INTO registros_ponto (
+            funcionario_id, unidade_id, data_hora, hora_entrada, hora_saida, id_biometrico
+        )
+        SELECT %(funcionario_id)s, %(unidade_id)s, %(data)s, %(hora_entrada)s, NULL, %(id_biometrico)s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM registros_ponto
+            WHERE funcionario_id = %(funcionario_id)s
+            AND (hora_saida IS NULL
+                 OR (unidade_id = %(unidade_id)s AND hora_entrada IS NOT NULL
+                     AND data_hora >= %(data)s AND data_hora < %(data)s::date + 1))
+        )
+        RETURNING id
+    """, {
+        "funcionario_id": funcionario_id, "unidade_id": unidade_id, "data": data, "hora_entrada": hora_entrada,
+        "id_biometrico": id_biometrico or None
+    })
+    registro = cursor.fetchone()
+    return registro[0] if registro else None
+
+
+def registrar_saida(cursor, registro_id, escala, entrada, saida):
+    """
+    Grava a saída e as horas calculadas no registro de entrada. Retorna as
+    horas. Uma entrada que já tem saída não é alterada (cursor.rowcount 0).
+    """
+    horas = calcular_horas(escala, entrada, saida)
+    cursor.execute("""
+        UPDATE registros_ponto
+        SET hora_saida = %(hora_saida)s,
+            horas_normais = %(horas_normais)s::interval,
+            hora_extra = %(hora_extra)s::interval,
+            hora_desconto = %(hora_desconto)s::interval,
+            total_trabalhado = %(total_trabalhado)s::interval,
+            hora_saida_ajustada = %(hora_saida_ajustada)s::interval,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = %(id)s AND hora_saida IS NULL
+    """, {**horas, "hora_saida": saida.strftime("%H:%M:%S"), "id": registro_id})
+    return horas
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Tempo (segundos) em que a resposta de uma chave fica guardada
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", 600))
+
+# Limite de chaves guardadas; acima dele as mais antigas são descartadas
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", 10000))
+
+# Espera máxima (segundos) de uma repetição pela requisição original ainda em andamento
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 15))
+
+# Tamanho máximo aceito para a chave
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+class _Entrada:
+    def __init__(self, assinatura):
+        self.assinatura = assinatura
+        self.concluida = threading.Event()
+        self.resposta = None  # (corpo, status) quando a requisição original teve sucesso
+        self.expira_em = None
+
+
+class IdempotencyStore:
+    """
+    Respostas recentes por Idempotency-Key, em memória e com TTL curto.
+
+    A primeira requisição com a chave é executada normalmente; uma repetição
+    recebe a resposta guardada sem nova captura, identificação ou acesso ao
+    banco. Repetições que chegam enquanto a original ainda está em andamento
+    esperam por ela. Só respostas 2xx são guardadas: após um erro a chave é
+    liberada e a próxima tentativa executa de novo.
+    """
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL_SECONDS, max_keys=IDEMPOTENCY_MAX_KEYS, espera=IDEMPOTENCY_WAIT_SECONDS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.espera = espera
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # chave -> _Entrada, a mais antiga primeiro
+        self.total_executadas = 0
+        self.total_repetidas = 0
+        self.total_conflitos = 0
+        self.total_em_andamento = 0
+
+    def reservar(self, chave, assinatura):
+        """
+        Retorna ("executar", None) quando quem chama deve processar a
+        requisição (e depois chamar concluir ou liberar), ("repetida",
+        (corpo, status)) com a resposta guardada, ("conflito", None) se a
+        chave já foi usada com outros dados ou ("em_andamento", None) se a
+        original não terminou dentro do prazo de espera.
+        """
+        limite = time.monotonic() + self.espera
+        while True:
+            with self._lock:
+                self._expirar()
+                entrada = self._entradas.get(chave)
+                if entrada is not None and entrada.expira_em is not None and entrada.expira_em <= time.monotonic():
+                    # Vencida, mas ainda atrás de uma requisição em andamento na fila
+                    del self._entradas[chave]
+                    entrada = None
+                if entrada is None:
+                    self._entradas[chave] = _Entrada(assinatura)
+                    self.total_executadas += 1
+                    return "executar", None
+                if entrada.assinatura != assinatura:
+                    self.total_conflitos += 1
+                    return "conflito", None
+                if entrada.resposta is not None:
+                    self.total_repetidas += 1
+                    return "repetida", entrada.resposta
+
+            # A requisição original ainda está em andamento
+            if not entrada.concluida.wait(max(limite - time.monotonic(), 0)):
+                with self._lock:
+                    self.total_em_andamento += 1
+                return "em_andamento", None
+            # Concluída: devolve a resposta guardada ou, se ela falhou, executa de novo
+
+    def concluir(self, chave, corpo, status):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return
+            if 200 <= status < 300:
+                entrada.resposta = (corpo, status)
+                entrada.expira_em = time.monotonic() + self.ttl
+            else:
+                del self._entradas[chave]
+        entrada.concluida.set()
+
+    def liberar(self, chave):
+        """Descarta a chave sem guardar resposta (a requisição original falhou)."""
+        with self._lock:
+            entrada = self._entradas.pop(chave, None)
+        if entrada is not None:
+            entrada.concluida.set()
+
+    def _expirar(self):
+        # Chamado com o lock: remove do início as respostas vencidas e, acima do
+        # limite, as mais antigas já concluídas
+        agora = time.monotonic()
+        excedentes = len(self._entradas) - self.max_keys
+        remover = []
+        for chave, entrada in self._entradas.items():
+            if entrada.expira_em is None:
+                continue  # em andamento
+            if entrada.expira_em > agora and len(remover) >= excedentes:
+                break
+            remover.append(chave)
+        for chave in remover:
+            del self._entradas[chave]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "chaves": len(self._entradas),
+                "em_andamento": sum(1 for entrada in self._entradas.values() if entrada.expira_em is None),
+                "total_executadas": self.total_executadas,
+                "total_repetidas": self.total_repetidas,
+                "total_conflitos": self.total_conflitos,
+                "total_em_andamento": self.total_em_andamento,
+                "ttl_segundos": self.ttl
+            }
+
+
+# Respostas do registro de ponto compartilhadas pelo processo
+idempotency_store = IdempotencyStore()
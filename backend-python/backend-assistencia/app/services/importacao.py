@@ -0,0 +1,189 @@
+import argparse
+import csv
+import io
+from datetime import datetime
+
+from app.db.database import db_connection
+
+TIPO_ESCALA_VALIDOS = ['8h', '12h', '16h', '24h', '12x36', '24x72', '32h', '20h']
+
+# Colunas gravadas pelo COPY, na ordem do arquivo temporário
+COLUNAS_COPY = ("nome", "cpf", "cargo", "id_biometrico", "unidade_id", "matricula", "tipo_escala", "telefone",
+                "email", "data_admissao")
+
+# Campos que não podem se repetir entre funcionários (os mesmos do /register)
+CAMPOS_UNICOS = (("id_biometrico", "ID biométrico"), ("cpf", "CPF"), ("email", "Email"),
+                 ("matricula", "Matrícula"), ("nome", "Nome"))
+
+
+def ler_csv(texto, unidade_id=None):
+    """
+    Lê o CSV de importação: as colunas do fir.csv (UserID, UserName, FIR,
+    Timestamp) mais as colunas de RH (cpf, cargo, matricula, unidade_id,
+    data_admissao, tipo_escala, telefone, email). Sem a coluna matricula,
+    o UserID do fir.csv é usado como matrícula; unidade_id informado vale
+    para as linhas sem unidade.
+    """
+    linhas = []
+    for linha in csv.DictReader(io.StringIO(texto.lstrip("\ufeff"))):
+        linha = {(chave or "").strip(): (valor or "").strip() for chave, valor in linha.items()}
+        linhas.append({
+            "nome": linha.get("nome") or linha.get("UserName"),
+            "id_biometrico": linha.get("id_biometrico") or linha.get("FIR"),
+            "matricula": linha.get("matricula") or linha.get("UserID"),
+            "cpf": linha.get("cpf"),
+            "cargo": linha.get("cargo", ""),
+            "unidade_id": linha.get("unidade_id") or unidade_id,
+            "data_admissao": linha.get("data_admissao"),
+            "tipo_escala": linha.get("tipo_escala"),
+            "telefone": linha.get("telefone"),
+            "email": linha.get("email"),
+        })
+    return linhas
+
+
+def importar_funcionarios(conn, linhas):
+    """
+    Valida e grava um lote de funcionários com digital.
+
+    Os conflitos (no próprio arquivo e com o banco) são verificados para o
+    lote inteiro em duas consultas, as linhas válidas entram com um único
+    COPY e os ids gerados voltam em mais uma consulta. Não faz commit.
+
+    Retorna (resultados, importados): um resultado por linha, na ordem do
+    arquivo, e a lista (id, id_biometrico, unidade_id) dos funcionários
+    gravados, para atualizar o índice biométrico.
+    """
+    resultados = [None] * len(linhas)
+    validas = []
+    for indice, linha in enumerate(linhas):
+        funcionario, motivo = _validar_linha(linha)
+        if motivo:
+            resultados[indice] = {"linha": indice + 1, "situacao": "rejeitado", "motivo": motivo}
+        else:
+            validas.append((indice, funcionario))
+
+    cursor = conn.cursor()
+    validas = _sem_conflitos(cursor, validas, resultados)
+
+    importados = []
+    if validas:
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer, quoting=csv.QUOTE_ALL)  # "" é texto vazio para o COPY, não NULL
+        for _, funcionario in validas:
+            escritor.writerow([funcionario[coluna] for coluna in COLUNAS_COPY])
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY funcionarios ({', '.join(COLUNAS_COPY)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+        cursor.execute("SELECT matricula, id FROM funcionarios WHERE matricula = ANY(%s)",
+                       ([funcionario["matricula"] for _, funcionario in validas],))
+        ids = dict(cursor.fetchall())
+        for indice, funcionario in validas:
+            funcionario_id = ids[funcionario["matricula"]]
+            importados.append((funcionario_id, funcionario["id_biometrico"], funcionario["unidade_id"]))
+            resultados[indice] = {"linha": indice + 1, "situacao": "importado", "id": funcionario_id,
+                                  "matricula": funcionario["matricula"]}
+    cursor.close()
+    return resultados, importados
+
+
+def _validar_linha(linha):
+    # Retorna (funcionário normalizado, None) ou (None, motivo da rejeição)
+    faltando = [campo for campo in ("nome", "cpf", "matricula", "unidade_id", "data_admissao", "telefone", "email")
+                if not linha.get(campo)]
+    if faltando:
+        return None, f"Campos obrigatórios ausentes: {', '.join(faltando)}"
+    if not linha.get("id_biometrico") or linha["id_biometrico"] == "None":
+        return None, "Digital (FIR) ausente."
+    if linha.get("tipo_escala") not in TIPO_ESCALA_VALIDOS:
+        return None, f"Tipo de escala inválido. Valores válidos: {', '.join(TIPO_ESCALA_VALIDOS)}"
+    try:
+        matricula = int(linha["matricula"])
+        unidade_id = int(linha["unidade_id"])
+    except ValueError:
+        return None, "matricula e unidade_id devem ser números."
+    data_admissao = _data(linha["data_admissao"])
+    if data_admissao is None:
+        return None, "data_admissao inválida. Use AAAA-MM-DD ou DD/MM/AAAA."
+    return {**linha, "matricula": matricula, "unidade_id": unidade_id, "data_admissao": data_admissao,
+            "cargo": linha.get("cargo") or ""}, None
+
+
+def _data(texto):
+    for formato in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _sem_conflitos(cursor, validas, resultados):
+    # Valores únicos já cadastrados, uma subconsulta por campo (cada uma pelo seu índice)
+    valores = {campo: sorted({funcionario[campo] for _, funcionario in validas}) for campo, _ in CAMPOS_UNICOS}
+    existentes = {campo: set() for campo, _ in CAMPOS_UNICOS}
+    unidades = set()
+    if validas:
+        cursor.execute(" UNION ALL ".join(
+            f"SELECT '{campo}', {campo}::text FROM funcionarios WHERE {campo} = ANY(%({campo})s)"
+            for campo, _ in CAMPOS_UNICOS
+        ), valores)
+        for campo, valor in cursor.fetchall():
+            existentes[campo].add(valor)
+        cursor.execute("SELECT id FROM unidades WHERE id = ANY(%s)",
+                       (sorted({funcionario["unidade_id"] for _, funcionario in validas}),))
+        unidades = {row[0] for row in cursor.fetchall()}
+
+    aceitas = []
+    vistos = {campo: set() for campo, _ in CAMPOS_UNICOS}
+    for indice, funcionario in validas:
+        no_banco = [nome for campo, nome in CAMPOS_UNICOS if str(funcionario[campo]) in existentes[campo]]
+        no_arquivo = [nome for campo, nome in CAMPOS_UNICOS if funcionario[campo] in vistos[campo]]
+        if no_banco:
+            motivo = f"{', '.join(no_banco)} já existe"
+        elif no_arquivo:
+            motivo = f"{', '.join(no_arquivo)} repetido em linha anterior do arquivo"
+        elif funcionario["unidade_id"] not in unidades:
+            motivo = "Unidade não encontrada."
+        else:
+            motivo = None
+        if motivo:
+            resultados[indice] = {"linha": indice + 1, "situacao": "rejeitado", "motivo": motivo}
+            continue
+        for campo, _ in CAMPOS_UNICOS:
+            vistos[campo].add(funcionario[campo])
+        aceitas.append((indice, funcionario))
+    return aceitas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa funcionários com digital a partir de um CSV (formato do fir.csv mais as colunas de RH).")
+    parser.add_argument("arquivo", help="CSV com UserID, UserName, FIR, Timestamp e as colunas de RH")
+    parser.add_argument("--unidade", type=int, help="unidade_id das linhas sem a coluna unidade_id")
+    parser.add_argument("--simular", action="store_true", help="valida e mostra o resultado sem gravar")
+    args = parser.parse_args()
+
+    with open(args.arquivo, encoding="utf-8") as arquivo:
+        linhas = ler_csv(arquivo.read(), args.unidade)
+
+    with db_connection() as conn:
+        if conn is None:
+            raise SystemExit("Não foi possível conectar ao banco de dados")
+        resultados, importados = importar_funcionarios(conn, linhas)
+        if args.simular:
+            conn.rollback()
+        else:
+            conn.commit()
+
+    for resultado in resultados:
+        if resultado["situacao"] == "rejeitado":
+            print(f"Linha {resultado['linha']}: {resultado['motivo']}")
+    acao = "validados (simulação, nada foi gravado)" if args.simular else "importados"
+    print(f"{len(importados)} de {len(linhas)} funcionários {acao}")
+    if importados and not args.simular:
+        # O servidor em execução recebe as novas digitais pela sincronização incremental do índice
+        print("As digitais entram no índice dos servidores em execução na próxima sincronização (BIOMETRIC_INDEX_REFRESH_SECONDS)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from dotenv import load_dotenv
+
+from app.services.gateway import LatencyHistogram
+from app.services.matcher import create_matcher
+
+load_dotenv()
+
+# Espera máxima (segundos) de quem pediu uma captura ou cadastro, incluindo a fila
+DEVICE_JOB_TIMEOUT_SECONDS = float(os.getenv("DEVICE_JOB_TIMEOUT_SECONDS", 60))
+
+# Espera antes de tentar reabrir o leitor após uma falha (dobra a cada falha seguida)
+DEVICE_REOPEN_BACKOFF_SECONDS = float(os.getenv("DEVICE_REOPEN_BACKOFF_SECONDS", 1))
+DEVICE_REOPEN_BACKOFF_MAX_SECONDS = 30
+
+# Prioridades da fila do leitor: identificação (batida de ponto) antes de cadastro
+PRIORIDADE_IDENTIFICACAO = 0
+PRIORIDADE_CADASTRO = 1
+
+
+class DeviceUnavailableError(Exception):
+    """O leitor não respondeu ou não pôde ser aberto dentro do prazo."""
+
+
+class DeviceWorker:
+    """
+    Thread dona do leitor biométrico durante toda a vida do processo. O
+    leitor é aberto uma vez e fica aberto entre as capturas; após um erro é
+    fechado e reaberto na próxima tarefa, com espera crescente enquanto as
+    aberturas continuarem falhando.
+
+    Capturas e cadastros entram em uma fila com prioridade (identificação
+    antes de cadastro, em ordem de chegada dentro da mesma prioridade) e o
+    resultado volta para a thread da requisição que os pediu.
+    """
+
+    def __init__(self, matcher_factory=create_matcher):
+        self._matcher_factory = matcher_factory
+        self._matcher = None
+        self._fila = queue.PriorityQueue()
+        self._sequencia = itertools.count()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.aberto = False
+        self.falhas_seguidas = 0
+        self.total_aberturas = 0
+        self.total_erros = 0
+        self.ultimo_erro = None
+        self._tempos = {"capture": LatencyHistogram(), "enroll": LatencyHistogram()}
+        self._esperas = {"capture": LatencyHistogram(), "enroll": LatencyHistogram()}
+
+    def start(self):
+        """Inicia a thread do leitor (uma única vez por processo)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="biometric-device", daemon=True)
+            self._thread.start()
+
+    def capture(self, timeout=None):
+        """Captura uma digital e retorna a FIR em texto."""
+        return self._executar(PRIORIDADE_IDENTIFICACAO, "capture", (), timeout)
+
+    def enroll(self, id_biometrico, timeout=None):
+        """Cadastra uma digital e retorna a FIR em texto."""
+        return self._executar(PRIORIDADE_CADASTRO, "enroll", (id_biometrico,), timeout)
+
+    def _executar(self, prioridade, operacao, args, timeout):
+        self.start()
+        futuro = Future()
+        self._fila.put((prioridade, next(self._sequencia), operacao, args, time.perf_counter(), futuro))
+        try:
+            return futuro.result(timeout or DEVICE_JOB_TIMEOUT_SECONDS)
+        except FutureTimeout:
+            # Se ainda estiver na fila, a tarefa é descartada quando chegar a vez dela
+            futuro.cancel()
+            raise DeviceUnavailableError(f"Leitor não concluiu '{operacao}' em {timeout or DEVICE_JOB_TIMEOUT_SECONDS:.0f}s")
+
+    def _loop(self):
+        # Abre o leitor já na partida para que a primeira batida não pague a abertura
+        try:
+            self._abrir()
+        except Exception as e:
+            self._falhou("abertura", e)
+        while True:
+            _, _, operacao, args, enfileirada_em, futuro = self._fila.get()
+            if not futuro.set_running_or_notify_cancel():
+                continue  # quem pediu desistiu antes da vez da tarefa
+            inicio = time.perf_counter()
+            with self._lock:
+                self._esperas[operacao].observe((inicio - enfileirada_em) * 1000)
+            try:
+                self._abrir()
+                resultado = getattr(self._matcher, operacao)(*args)
+            except Exception as e:
+                self._falhou(operacao, e)
+                futuro.set_exception(e)
+                continue
+            with self._lock:
+                self._tempos[operacao].observe((time.perf_counter() - inicio) * 1000)
+                self.falhas_seguidas = 0
+            futuro.set_result(resultado)
+
+    def _abrir(self):
+        if self.aberto:
+            return
+        if self.falhas_seguidas:
+            time.sleep(min(DEVICE_REOPEN_BACKOFF_SECONDS * 2 ** (self.falhas_seguidas - 1), DEVICE_REOPEN_BACKOFF_MAX_SECONDS))
+        # O objeto do SDK é criado na própria thread do leitor, que é a única a usá-lo
+        if self._matcher is None:
+            self._matcher = self._matcher_factory()
+        self._matcher.open_device()
+        self.aberto = True
+        with self._lock:
+            self.total_aberturas += 1
+        print(f"[LEITOR BIOMETRICO] Leitor aberto (abertura nº {self.total_aberturas})")
+
+    def _falhou(self, operacao, erro):
+        print(f"[LEITOR BIOMETRICO] Erro em '{operacao}': {erro}. O leitor será reaberto na próxima tarefa")
+        if self.aberto:
+            try:
+                self._matcher.close_device()
+            except Exception:
+                pass
+        self.aberto = False
+        with self._lock:
+            self.falhas_seguidas += 1
+            self.total_erros += 1
+            self.ultimo_erro = f"{time.strftime('%d/%m/%Y %H:%M:%S')} {operacao}: {erro}"
+
+    def stats(self):
+        with self._lock:
+            return {
+                "aberto": self.aberto,
+                "profundidade_fila": self._fila.qsize(),
+                "total_aberturas": self.total_aberturas,
+                "total_erros": self.total_erros,
+                "falhas_seguidas": self.falhas_seguidas,
+                "ultimo_erro": self.ultimo_erro,
+                "captura": {"espera_fila": self._esperas["capture"].snapshot(), "execucao": self._tempos["capture"].snapshot()},
+                "cadastro": {"espera_fila": self._esperas["enroll"].snapshot(), "execucao": self._tempos["enroll"].snapshot()}
+            }
+
+
+# Leitor compartilhado pelo processo
+device_worker = DeviceWorker()
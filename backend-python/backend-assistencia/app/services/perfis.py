@@ -0,0 +1,86 @@
+import os
+from collections import namedtuple
+
+from dotenv import load_dotenv
+
+from app.services.cache import TTLCache
+
+load_dotenv()
+
+# Validade (segundos) dos perfis de funcionários e vínculos guardados em memória.
+# Cadastros feitos por este backend invalidam o perfil na hora; alterações feitas
+# pelo Node.js chegam pela sincronização do índice biométrico ou no fim do TTL.
+CACHE_FUNCIONARIO_TTL_SECONDS = float(os.getenv("CACHE_FUNCIONARIO_TTL_SECONDS", 60))
+
+# Validade (segundos) dos nomes das unidades
+CACHE_UNIDADE_TTL_SECONDS = float(os.getenv("CACHE_UNIDADE_TTL_SECONDS", 600))
+
+# Limite de entradas de cada cache; acima dele as usadas há mais tempo são descartadas
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+
+# Dados usados na batida de ponto e na identificação; vínculos trazem nome,
+# cpf, email, escala e status do funcionário e unidade, matrícula, cargo e
+# digital do próprio vínculo
+Perfil = namedtuple("Perfil", "funcionario_id nome cpf unidade_id matricula cargo id_biometrico email tipo_escala status data_admissao")
+
+PERFIL_FUNCIONARIO_SQL = """
+    SELECT id, nome, cpf, unidade_id, matricula, cargo, id_biometrico, email, tipo_escala, status, data_admissao
+    FROM funcionarios WHERE id = %s
+"""
+
+PERFIL_VINCULO_SQL = """
+    SELECT fua.funcionario_id, f.nome, f.cpf, fua.unidade_id, fua.matricula, fua.cargo, fua.id_biometrico,
+           f.email, f.tipo_escala, f.status, f.data_admissao
+    FROM funcionarios_unidades_adicionais fua
+    INNER JOIN funcionarios f ON fua.funcionario_id = f.id
+    WHERE fua.id = %s AND fua.status = 1
+"""
+
+funcionario_cache = TTLCache("funcionarios", CACHE_FUNCIONARIO_TTL_SECONDS, CACHE_MAX_ENTRIES)
+vinculo_cache = TTLCache("vinculos", CACHE_FUNCIONARIO_TTL_SECONDS, CACHE_MAX_ENTRIES)
+unidade_cache = TTLCache("unidades", CACHE_UNIDADE_TTL_SECONDS, CACHE_MAX_ENTRIES)
+
+
+def perfil_funcionario(cursor, funcionario_id):
+    """Perfil do funcionário (ou None), lido do banco com o cursor de quem chama na falta do cache."""
+    return funcionario_cache.obter(int(funcionario_id), lambda: _perfil(cursor, PERFIL_FUNCIONARIO_SQL, funcionario_id))
+
+
+def perfil_vinculo(cursor, vinculo_id):
+    """Perfil do vínculo adicional ativo (ou None)."""
+    return vinculo_cache.obter(int(vinculo_id), lambda: _perfil(cursor, PERFIL_VINCULO_SQL, vinculo_id))
+
+
+def nome_unidade(cursor, unidade_id):
+    """Nome da unidade (ou None)."""
+    if unidade_id is None:
+        return None
+
+    def carregar():
+        cursor.execute("SELECT nome FROM unidades WHERE id = %s", (unidade_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    return unidade_cache.obter(unidade_id, carregar)
+
+
+def invalidar_funcionario(*funcionario_ids):
+    """Descarta os perfis dos funcionários e dos vínculos deles (que repetem nome, escala e status)."""
+    ids = {int(funcionario_id) for funcionario_id in funcionario_ids}
+    if not ids:
+        return
+    funcionario_cache.invalidar(*ids)
+    vinculo_cache.invalidar_se(lambda perfil: perfil.funcionario_id in ids)
+
+
+def invalidar_vinculo(*vinculo_ids):
+    vinculo_cache.invalidar(*(int(vinculo_id) for vinculo_id in vinculo_ids))
+
+
+def stats():
+    return {cache.nome: cache.stats() for cache in (funcionario_cache, vinculo_cache, unidade_cache)}
+
+
+def _perfil(cursor, sql, registro_id):
+    cursor.execute(sql, (registro_id,))
+    row = cursor.fetchone()
+    return Perfil(*row) if row else None
@@ -0,0 +1,279 @@
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from psycopg2.extras import execute_values
+
+from app.services.ferias import vacation_index
+from app.services.horas import LOCK_PONTO_FUNCIONARIO, calcular_horas
+
+load_dotenv()
+
+# Limite de batidas por chamada do /register_ponto/bulk
+PONTO_LOTE_MAX = int(os.getenv("PONTO_LOTE_MAX", 5000))
+
+# Linhas enviadas ao banco por comando na gravação do lote
+PONTO_LOTE_PAGE_SIZE = 1000
+
+# Tolerância para o relógio do terminal adiantado em relação ao servidor
+TOLERANCIA_RELOGIO = timedelta(minutes=5)
+
+Batida = namedtuple("Batida", "indice funcionario_id vinculo_id unidade_id momento tipo")
+
+
+def registrar_lote(conn, itens):
+    """
+    Valida e grava as batidas enviadas por um terminal que ficou sem conexão.
+
+    A validação é feita para o lote inteiro com um número fixo de consultas
+    (funcionários, férias, entradas sem saída e registros já gravados), e as
+    batidas aceitas são gravadas com execute_values: entradas (já com a saída
+    quando ela vem no mesmo lote) em INSERTs de várias linhas e saídas de
+    entradas já gravadas em UPDATEs de várias linhas.
+
+    Lotes com os mesmos funcionários (o reenvio de um lote, por exemplo), e
+    as batidas deles, são serializados por advisory locks de transação,
+    tomados antes da validação: o segundo só decide depois que o primeiro
+    fizer commit ou rollback.
+
+    Não faz commit. Retorna um resultado por item, na ordem recebida, com
+    situacao "aceito", "rejeitado" ou "duplicado" (já sincronizado antes).
+
+    Batidas de vínculo adicional informam vinculo_id e valem para a unidade
+    do vínculo; o funcionario_id, quando omitido, vem do próprio vínculo.
+    """
+    resultados = [None] * len(itens)
+    batidas = []
+    for indice, item in enumerate(itens):
+        batida, motivo = _ler_item(indice, item)
+        if motivo:
+            resultados[indice] = _resultado(indice, "rejeitado", motivo)
+        else:
+            batidas.append(batida)
+
+    if batidas:
+        cursor = conn.cursor()
+        contexto = _carregar_contexto(cursor, batidas)
+        inserir, fechar = _decidir(batidas, contexto, resultados)
+        fechados = _gravar(cursor, inserir, fechar)
+        # Entradas fechadas por outra transação entre a leitura e o UPDATE
+        for registro_id, _, _, indice in fechar:
+            if registro_id not in fechados:
+                resultados[indice] = _resultado(indice, "rejeitado", "Saída já registrada para esta entrada.", "saida")
+        cursor.close()
+    return resultados
+
+
+def _resultado(indice, situacao, motivo=None, tipo=None):
+    resultado = {"indice": indice, "situacao": situacao}
+    if tipo:
+        resultado["tipo"] = tipo
+    if motivo:
+        resultado["motivo"] = motivo
+    return resultado
+
+
+def _ler_item(indice, item):
+    # Retorna (Batida, None) ou (None, motivo da rejeição)
+    if not isinstance(item, dict):
+        return None, "Item inválido."
+    try:
+        vinculo_id = int(item['vinculo_id']) if item.get('vinculo_id') is not None else None
+        funcionario_id = int(item['funcionario_id']) if item.get('funcionario_id') is not None else None
+        unidade_id = int(item.get('unidade_id'))
+    except (TypeError, ValueError):
+        return None, "funcionario_id (ou vinculo_id) e unidade_id são obrigatórios."
+    if funcionario_id is None and vinculo_id is None:
+        return None, "funcionario_id (ou vinculo_id) e unidade_id são obrigatórios."
+    try:
+        momento = datetime.fromisoformat(str(item.get('data_hora'))).replace(microsecond=0, tzinfo=None)
+    except ValueError:
+        return None, "data_hora inválida. Use o formato AAAA-MM-DD HH:MM:SS."
+    if momento > datetime.now() + TOLERANCIA_RELOGIO:
+        return None, "data_hora no futuro."
+    tipo = str(item.get('tipo') or '').lower().replace('í', 'i')
+    if tipo not in ('entrada', 'saida'):
+        return None, "tipo deve ser 'entrada' ou 'saida'."
+    return Batida(indice, funcionario_id, vinculo_id, unidade_id, momento, tipo), None
+
+
+def _carregar_contexto(cursor, batidas):
+    # Vínculos ativos do lote: o funcionário e a unidade de cada um
+    vinculos_ids = sorted({batida.vinculo_id for batida in batidas if batida.vinculo_id is not None})
+    vinculos = {}
+    if vinculos_ids:
+        cursor.execute("""
+            SELECT id, funcionario_id, unidade_id, id_biometrico FROM funcionarios_unidades_adicionais
+            WHERE id = ANY(%s) AND status = 1
+        """, (vinculos_ids,))
+        vinculos = {row[0]: row for row in cursor.fetchall()}
+    # Completa (na própria lista do lote) o funcionario_id das batidas que só informaram o vínculo
+    batidas[:] = [
+        batida._replace(funcionario_id=vinculos[batida.vinculo_id][1])
+        if batida.funcionario_id is None and batida.vinculo_id in vinculos else batida
+        for batida in batidas
+    ]
+
+    ids = sorted({batida.funcionario_id for batida in batidas if batida.funcionario_id is not None})
+    dias = sorted({(batida.funcionario_id, batida.momento.date()) for batida in batidas if batida.funcionario_id is not None})
+    if not dias:
+        return vinculos, {}, set(), {}, set(), set()
+    # Serializa os lotes dos mesmos funcionários até o fim da transação; em
+    # ordem de id, para que dois lotes não se bloqueiem mutuamente
+    cursor.execute("""
+        SELECT pg_advisory_xact_lock(%s, id) FROM (SELECT unnest(%s::int[]) AS id ORDER BY 1) ids
+    """, (LOCK_PONTO_FUNCIONARIO, ids))
+    inicio = min(dia for _, dia in dias) - timedelta(days=1)
+    fim = max(dia for _, dia in dias) + timedelta(days=1)  # exclusivo
+
+    cursor.execute("""
+        SELECT id, unidade_id, tipo_escala, status, id_biometrico FROM funcionarios WHERE id = ANY(%s)
+    """, (ids,))
+    funcionarios = {row[0]: row for row in cursor.fetchall()}
+
+    # Pares (funcionário, dia) do lote que caem em férias, do índice em memória
+    # ou, se ele não estiver carregado, do banco
+    ferias = vacation_index.em_ferias(dias)
+    if ferias is None:
+        cursor.execute("""
+            SELECT DISTINCT d.funcionario_id, d.dia
+            FROM unnest(%s::int[], %s::date[]) AS d(funcionario_id, dia)
+            JOIN ferias f ON f.funcionario_id = d.funcionario_id
+                AND f.data_inicio <= d.dia AND f.data_fim >= d.dia
+        """, ([funcionario_id for funcionario_id, _ in dias], [dia for _, dia in dias]))
+        ferias = set(cursor.fetchall())
+
+    # Última entrada sem saída de cada funcionário em cada unidade
+    cursor.execute("""
+        SELECT DISTINCT ON (funcionario_id, unidade_id) funcionario_id, unidade_id, id, data_hora, hora_entrada
+        FROM registros_ponto
+        WHERE funcionario_id = ANY(%s) AND hora_saida IS NULL AND hora_entrada IS NOT NULL
+        ORDER BY funcionario_id, unidade_id, data_hora DESC, hora_entrada DESC
+    """, (ids,))
+    abertos = {
+        (funcionario_id, unidade_id): ("banco", registro_id, datetime.combine(data_hora.date(), hora_entrada))
+        for funcionario_id, unidade_id, registro_id, data_hora, hora_entrada in cursor.fetchall()
+    }
+
+    # Registros já gravados no período do lote, para reconhecer reenvios
+    cursor.execute("""
+        SELECT funcionario_id, unidade_id, data_hora, hora_entrada, hora_saida FROM registros_ponto
+        WHERE funcionario_id = ANY(%s) AND data_hora >= %s AND data_hora < %s
+    """, (ids, inicio, fim))
+    entradas_gravadas = set()
+    saidas_gravadas = set()
+    for funcionario_id, unidade_id, data_hora, hora_entrada, hora_saida in cursor.fetchall():
+        if hora_entrada is None:
+            continue
+        entrada = datetime.combine(data_hora.date(), hora_entrada)
+        entradas_gravadas.add((funcionario_id, unidade_id, entrada))
+        if hora_saida is not None:
+            # Saída no dia seguinte quando o horário não passa do da entrada (como em calcular_horas)
+            saida = datetime.combine(data_hora.date(), hora_saida)
+            saidas_gravadas.add((funcionario_id, unidade_id, saida if saida > entrada else saida + timedelta(days=1)))
+
+    return vinculos, funcionarios, ferias, abertos, entradas_gravadas, saidas_gravadas
+
+
+def _decidir(batidas, contexto, resultados):
+    vinculos, funcionarios, ferias, abertos, entradas_gravadas, saidas_gravadas = contexto
+    inserir = []  # [funcionario_id, unidade_id, dia, hora_entrada, id_biometrico, hora_saida, horas]
+    fechar = []  # (registro_id, hora_saida, horas, indice da batida)
+
+    # Em ordem cronológica por funcionário e unidade, para que a saída encontre
+    # a entrada anterior do próprio lote
+    for batida in sorted(batidas, key=lambda b: (b.funcionario_id or 0, b.unidade_id, b.momento, b.tipo != 'entrada')):
+        chave = (batida.funcionario_id, batida.unidade_id)
+        funcionario = funcionarios.get(batida.funcionario_id)
+        vinculo = vinculos.get(batida.vinculo_id)
+        # Unidade e id biométrico do registro: os do vínculo ou os da lotação do funcionário
+        pessoa = (vinculo[2], vinculo[3]) if vinculo else (funcionario[1], funcionario[4]) if funcionario else None
+        motivo = None
+        if batida.vinculo_id is not None and (vinculo is None or vinculo[1] != batida.funcionario_id):
+            motivo = "Vínculo adicional não encontrado."
+        elif funcionario is None:
+            motivo = "Funcionário não encontrado no banco de dados."
+        elif pessoa[0] != batida.unidade_id:
+            motivo = "Funcionário não pertence a esta unidade."
+        elif funcionario[3] != 1:
+            motivo = "Funcionário inativo não pode bater ponto."
+        elif (batida.funcionario_id, batida.momento.date()) in ferias:
+            motivo = "Funcionário de férias, você não pode registrar o ponto!"
+        if motivo:
+            resultados[batida.indice] = _resultado(batida.indice, "rejeitado", motivo, batida.tipo)
+            continue
+
+        if batida.tipo == 'entrada':
+            if chave + (batida.momento,) in entradas_gravadas:
+                resultados[batida.indice] = _resultado(batida.indice, "duplicado", "Registro já sincronizado.", batida.tipo)
+            elif chave in abertos:
+                resultados[batida.indice] = _resultado(batida.indice, "rejeitado", "Já existe entrada sem saída nesta unidade.", batida.tipo)
+            else:
+                abertos[chave] = ("lote", len(inserir), batida.momento)
+                inserir.append([batida.funcionario_id, batida.unidade_id, batida.momento.date(), batida.momento.time(),
+                                pessoa[1], None, None])
+                resultados[batida.indice] = _resultado(batida.indice, "aceito", tipo=batida.tipo)
+            continue
+
+        aberto = abertos.get(chave)
+        hora_saida = batida.momento.time()
+        if chave + (batida.momento,) in saidas_gravadas:
+            resultados[batida.indice] = _resultado(batida.indice, "duplicado", "Registro já sincronizado.", batida.tipo)
+        elif aberto is None or aberto[2] >= batida.momento:
+            resultados[batida.indice] = _resultado(batida.indice, "rejeitado", "Registro de entrada não encontrado para a saída.", batida.tipo)
+        elif (batida.momento.date() - aberto[2].date()).days > 1:
+            resultados[batida.indice] = _resultado(batida.indice, "rejeitado", f"Saída em aberto no dia {aberto[2].strftime('%d/%m/%Y')}. Favor procurar o RH!", batida.tipo)
+        else:
+            horas = calcular_horas(funcionario[2], aberto[2], batida.momento)
+            if aberto[0] == "lote":
+                inserir[aberto[1]][5:] = [hora_saida, horas]
+            else:
+                fechar.append((aberto[1], hora_saida, horas, batida.indice))
+            del abertos[chave]
+            resultados[batida.indice] = _resultado(batida.indice, "aceito", tipo=batida.tipo)
+
+    return inserir, fechar
+
+
+def _colunas_horas(horas):
+    if horas is None:
+        return (None,) * 5
+    return (horas["horas_normais"], horas["hora_extra"], horas["hora_desconto"],
+            horas["total_trabalhado"], horas["hora_saida_ajustada"])
+
+
+def _gravar(cursor, inserir, fechar):
+    if inserir:
+        execute_values(cursor, """
+            INSERT INTO registros_ponto (
+                funcionario_id, unidade_id, data_hora, hora_entrada, id_biometrico, hora_saida,
+                horas_normais, hora_extra, hora_desconto, total_trabalhado, hora_saida_ajustada
+            ) VALUES %s
+        """, [
+            (funcionario_id, unidade_id, dia, hora_entrada, id_biometrico or None, hora_saida)
+            + _colunas_horas(horas)
+            for funcionario_id, unidade_id, dia, hora_entrada, id_biometrico, hora_saida, horas in inserir
+        ], template="(%s, %s, %s, %s, %s, %s, %s::interval, %s::interval, %s::interval, %s::interval, %s::interval)",
+            page_size=PONTO_LOTE_PAGE_SIZE)
+
+    if not fechar:
+        return set()
+    # Só fecha entradas ainda sem saída; devolve os ids efetivamente atualizados
+    atualizados = execute_values(cursor, """
+        UPDATE registros_ponto AS r
+        SET hora_saida = v.hora_saida::time,
+            horas_normais = v.horas_normais::interval,
+            hora_extra = v.hora_extra::interval,
+            hora_desconto = v.hora_desconto::interval,
+            total_trabalhado = v.total_trabalhado::interval,
+            hora_saida_ajustada = v.hora_saida_ajustada::interval,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (VALUES %s) AS v(id, hora_saida, horas_normais, hora_extra, hora_desconto, total_trabalhado, hora_saida_ajustada)
+        WHERE r.id = v.id AND r.hora_saida IS NULL
+        RETURNING r.id
+    """, [
+        (registro_id, hora_saida.strftime("%H:%M:%S")) + _colunas_horas(horas)
+        for registro_id, hora_saida, horas, _ in fechar
+    ], page_size=PONTO_LOTE_PAGE_SIZE, fetch=True)
+    return {row[0] for row in atualizados}
@@ -0,0 +1,108 @@
+import gzip
+import hashlib
+import os
+from contextlib import ExitStack
+
+import psycopg2
+from dotenv import load_dotenv
+from flask import Response, current_app, jsonify, request
+
+from app.db.database import db_connection
+
+load_dotenv()
+
+# Tamanho mínimo (bytes) do JSON para que a resposta seja comprimida com gzip
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", 8192))
+
+# Nível de compressão: 6 é o padrão do gzip, bom equilíbrio entre CPU e tamanho
+GZIP_NIVEL = 6
+
+# Linhas lidas por vez do cursor do servidor (e enviadas em um pedaço) nas respostas em streaming
+STREAM_ITERSIZE = int(os.getenv("STREAM_ITERSIZE", 1000))
+
+# Formatos das respostas em streaming: documento JSON {chave: [...]} ou um objeto JSON por linha
+FORMATOS_STREAMING = {"json": "application/json", "ndjson": "application/x-ndjson"}
+
+
+def json_condicional(dados, status=200):
+    """
+    Resposta JSON com ETag e compressão.
+
+    O ETag (fraco, o mesmo com ou sem gzip) é o hash do JSON: se o cliente
+    enviar If-None-Match com ele, a resposta é 304 sem corpo. Corpos a partir
+    de GZIP_MIN_BYTES são comprimidos quando o cliente aceita gzip.
+    """
+    corpo = current_app.json.dumps(dados, separators=(",", ":")).encode("utf-8")
+    resposta = Response(corpo, status=status, mimetype="application/json")
+    resposta.set_etag(hashlib.sha1(corpo).hexdigest(), weak=True)
+    resposta.vary.add("Accept-Encoding")
+    resposta.make_conditional(request)
+
+    if resposta.status_code == 200 and len(corpo) >= GZIP_MIN_BYTES and request.accept_encodings.quality("gzip") > 0:
+        resposta.set_data(gzip.compress(corpo, GZIP_NIVEL))
+        resposta.content_encoding = "gzip"
+    return resposta
+
+
+def json_streaming(sql, parametros, item, chave, formato="json"):
+    """
+    Resposta em streaming das linhas de uma consulta.
+
+    As linhas são lidas por um cursor nomeado (do lado do servidor), em lotes
+    de STREAM_ITERSIZE, e cada lote é enviado assim que lido: a memória não
+    cresce com o número de linhas e o primeiro byte sai sem esperar o
+    resultado inteiro. item(linha) converte a linha no objeto enviado.
+
+    A conexão fica emprestada do pool até o fim do envio (ou a desconexão do
+    cliente). Um erro no meio do envio só pode interromper a resposta, já que
+    o status foi enviado: o JSON fica incompleto e o erro vai para o log.
+    """
+    pilha = ExitStack()
+    conn = pilha.enter_context(db_connection())
+    if conn is None:
+        pilha.close()
+        return jsonify({"message": "Erro ao conectar ao banco de dados"}), 500
+
+    # A consulta é aberta antes da resposta, para que erros nela ainda virem 500
+    cursor = conn.cursor(name="streaming")
+    try:
+        cursor.execute(sql, parametros)
+    except psycopg2.Error as e:
+        pilha.close()
+        print(f"[STREAMING] Erro ao abrir a consulta: {e}")
+        return jsonify({"message": "Erro ao consultar o banco de dados"}), 500
+
+    json_provider = current_app.json
+
+    def dumps(objeto):
+        return json_provider.dumps(objeto, separators=(",", ":"))
+
+    def gerar():
+        enviados = 0
+        try:
+            if formato == "json":
+                yield "{" + dumps(chave) + ":["
+            while True:
+                linhas = cursor.fetchmany(STREAM_ITERSIZE)
+                if not linhas:
+                    break
+                itens = [dumps(item(linha)) for linha in linhas]
+                if formato == "ndjson":
+                    yield "\n".join(itens) + "\n"
+                else:
+                    yield ("," if enviados else "") + ",".join(itens)
+                enviados += len(linhas)
+            if formato == "json":
+                yield "]}"
+        except psycopg2.Error as e:
+            print(f"[STREAMING] Envio interrompido após {enviados} linha(s): {e}")
+        finally:
+            try:
+                cursor.close()
+            except psycopg2.Error:
+                pass
+
+    resposta = Response(gerar(), mimetype=FORMATOS_STREAMING[formato])
+    # Devolve a conexão ao pool quando o servidor encerra a resposta
+    resposta.call_on_close(pilha.close)
+    return resposta
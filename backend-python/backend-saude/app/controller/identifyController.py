@@ -1,66 +1,129 @@
 from flask import request, jsonify
-from app.db.database import get_db_connection
-from app.services.biometric import IndexSearch, identify_user
+from app.db.database import db_connection
+from app.services.leitor import DeviceUnavailableError
+from app.services.matcher import fir_valida
+from app.services.biometric import biometric_index, identify_user
+from app.services.perfis import perfil_funcionario
 import time
 
 
+# Limite de digitais por chamada do /identify/batch
+IDENTIFY_BATCH_MAX = 500
 
 
 # identificar o usuário
 def identify_user_route():
-    # Limpa o banco de dados de indexação
-    IndexSearch.ClearDB()
-
-    # Conectar ao banco de dados
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Buscar todos os usuários no banco de dados e adicionar FIR à indexação
-    cursor.execute("SELECT id_biometrico, id FROM funcionarios")
-    for row in cursor.fetchall():
-        # A adição de FIR para indexação
-        IndexSearch.AddFIR(row[0], int(row[1]))  
-
-    conn.close()
-
     # Captura os dados de biometria para identificação
-    fir_data = identify_user()
-
-    # Identificação do usuário
-    IndexSearch.IdentifyUser(fir_data, 5)
-
-    if IndexSearch.UserID != 0:
-        id_biometrico = IndexSearch.UserID
-
-        # Buscar os dados do usuário no banco de dados
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT nome, cpf, data_admissao, unidade_id, matricula, cargo FROM funcionarios WHERE id = %s", (id_biometrico,))
-        user_data = cursor.fetchone()
-        user_name = user_data[0]
-        cpf = user_data[1]
-        data_admissao = user_data[2]
-        unidade_id = user_data[3]
-        matricula = user_data[4]
-      
-        cargo = user_data[5]
-
-        conn.close()
-
-        # Recuperando a data_admissao diretamente do banco de dados
-        data_admissao_formatada = data_admissao.strftime("%d/%m/%Y")  
-
-        return jsonify({
-            "message": f"User identified: {user_name} (ID: {id_biometrico})",
-            "cpf": cpf,
-            "cargo": cargo,
-            "data_admissao": data_admissao_formatada,
-            "unidade_id": unidade_id,
-            "matricula": matricula
+    try:
+        fir_data = identify_user()
+    except DeviceUnavailableError as e:
+        print(f"Leitor indisponível: {e}")
+        return jsonify({"message": "Leitor biométrico indisponível. Por favor, tente novamente."}), 503
+
+    return _identificar(fir_data)
+
+
+# Identificação com a digital já capturada pelo terminal (FIR em texto no campo
+# "fir", e opcionalmente unidade_id para buscar primeiro na unidade): não usa o
+# leitor do servidor, então pode rodar em qualquer instância atrás do balanceador
+def identify_template_route():
+    data = request.json or {}
+    fir_data = data.get('fir')
+    if not isinstance(fir_data, str) or not fir_data.strip():
+        return jsonify({"message": "Campo 'fir' com a digital capturada é obrigatório."}), 400
+    if not fir_valida(fir_data):
+        return jsonify({"message": "Digital inválida: a FIR enviada não pôde ser decodificada."}), 400
+    return _identificar(fir_data, data.get('unidade_id'))
+
+
+def _identificar(fir_data, unidade_id=None):
+    # Identificação do usuário no índice mantido em memória
+    id_biometrico = biometric_index.identify(fir_data, unidade_id)
+
+    if id_biometrico != 0:
+
+        # Dados do usuário do cache de perfis, ou do banco na falta dele (conexão emprestada do pool)
+        with db_connection() as conn:
+            if conn is None:
+                return jsonify({"message": "Erro ao conectar ao banco de dados"}), 500
+            cursor = conn.cursor()
+
+            perfil = perfil_funcionario(cursor, id_biometrico)
+            if perfil is None:
+                return jsonify({"message": "User not identified"}), 404
+
+            # Recuperando a data_admissao diretamente do banco de dados
+            data_admissao_formatada = perfil.data_admissao.strftime("%d/%m/%Y")
+
+            return jsonify({
+                "message": f"User identified: {perfil.nome} (ID: {id_biometrico})",
+                "cpf": perfil.cpf,
+                "cargo": perfil.cargo,
+                "data_admissao": data_admissao_formatada,
+                "unidade_id": perfil.unidade_id,
+                "matricula": perfil.matricula
         
-        }), 200
+            }), 200
     else:
         return jsonify({"message": "User not identified"}), 404
 
 
+# Identificação em lote: várias digitais já capturadas (lista "firs", e
+# opcionalmente unidade_id) em uma única chamada, distribuídas entre as réplicas
+# do índice. Retorna um resultado por digital, na ordem recebida
+def identify_batch_route():
+    data = request.json or {}
+    firs = data.get('firs')
+    if not isinstance(firs, list) or not firs:
+        return jsonify({"message": "Campo 'firs' com a lista de digitais é obrigatório."}), 400
+    if len(firs) > IDENTIFY_BATCH_MAX:
+        return jsonify({"message": f"No máximo {IDENTIFY_BATCH_MAX} digitais por chamada."}), 400
+
+    # Digitais inválidas não derrubam o lote: recebem erro no próprio resultado
+    validas = [i for i, fir in enumerate(firs) if isinstance(fir, str) and fir.strip() and fir_valida(fir)]
+    ids = biometric_index.identify_many([firs[i] for i in validas], data.get('unidade_id'))
+    identificados = dict(zip(validas, ids))
+
+    # Dados de todos os funcionários identificados em uma consulta
+    encontrados = {user_id for user_id in ids if user_id != 0}
+    funcionarios = {}
+    if encontrados:
+        with db_connection() as conn:
+            if conn is None:
+                return jsonify({"message": "Erro ao conectar ao banco de dados"}), 500
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, nome, matricula, unidade_id FROM funcionarios WHERE id = ANY(%s)
+            """, (list(encontrados),))
+            funcionarios = {row[0]: row for row in cursor.fetchall()}
+            cursor.close()
+
+    resultados = []
+    for indice in range(len(firs)):
+        if indice not in identificados:
+            resultados.append({"indice": indice, "identificado": False, "erro": "Digital inválida"})
+            continue
+        funcionario = funcionarios.get(identificados[indice])
+        if funcionario is None:
+            resultados.append({"indice": indice, "identificado": False})
+            continue
+        resultados.append({
+            "indice": indice,
+            "identificado": True,
+            "tipo": "funcionario",
+            "funcionario_id": funcionario[0],
+            "nome": funcionario[1],
+            "matricula": funcionario[2],
+            "unidade_id": funcionario[3]
+        })
+
+    return jsonify({
+        "total": len(firs),
+        "identificados": sum(1 for resultado in resultados if resultado["identificado"]),
+        "resultados": resultados
+    }), 200
+
+
+# Situação do índice biométrico em memória (tamanho e tempo de carga)
+def index_status_route():
+    return jsonify(biometric_index.stats()), 200
@@ -1,189 +1,377 @@
 # Importações de bibliotecas necessárias
-from datetime import datetime, timedelta  # Manipulação de datas e horários
+from datetime import datetime, time, timedelta  # Manipulação de datas e horários
 from flask import jsonify, request        # Utilidades Flask para requisição e resposta
-from app.db.database import get_db_connection  # Função de conexão com o banco de dados
-from app.services.biometric import IndexSearch, identify_user  # Lógica biométrica
-import requests  # Para fazer chamadas HTTP ao backend em Node.js
+from app.db.database import db_connection  # Conexões emprestadas do pool
+from app.services.horas import fechar_entrada_sem_saida, registrar_entrada, registrar_saida  # Cálculo e gravação das horas
+from app.services.notificacoes import enfileirar_email, notification_worker  # Fila de e-mails de comprovante
+from app.services.idempotencia import idempotency_store, IDEMPOTENCY_KEY_MAX_LENGTH  # Repetições do terminal
+from app.services.leitor import DeviceUnavailableError  # Leitor ocupado ou sem resposta
+from app.services.ponto_lote import registrar_lote, PONTO_LOTE_MAX  # Batidas enviadas em lote pelo terminal
+from app.services.turnos import open_shift_state  # Entradas sem saída e registros do dia em memória
+from app.services.perfis import perfil_funcionario, nome_unidade  # Perfis e unidades em cache
+from app.services.ferias import vacation_index  # Períodos de férias em memória
+from app.services.matcher import fir_valida  # Validação da digital enviada pelo terminal
+from app.services.biometric import biometric_index, identify_user  # Lógica biométrica
+import psycopg2  # Erros ao gravar o registro de ponto
 
 
 # http://localhost:3001
 
 # http://biometrico.itaguai.rj.gov.br:3001
 
-# ===========================
-# Função auxiliar para envio de e-mail
-# ===========================
-def send_email(subject, recipient, body):
-    try:
-        # Envia um POST com os dados do e-mail para o backend Node.js
-        response = requests.post("http://biometrico.itaguai.rj.gov.br:3001/api/enviar-email", json={
-            "subject": subject,
-            "recipient": recipient,
-            "body": body
-        })
-        response.raise_for_status()  # Lança exceção se o status não for 2xx
-        print(f"E-mail enviado para {recipient}")
-    except requests.RequestException as e:
-        print(f"Erro ao enviar e-mail: {e}")
+# Escalas em que a saída pode ocorrer no dia seguinte ao da entrada
+ESCALAS_24H = ('24h', '24x72')
+
+# Consulta única da batida de ponto quando os turnos em memória não podem
+# responder: funcionário, nomes das unidades (para a mensagem de unidade
+# errada), férias no dia, entrada pendente dos últimos 2 dias (somente escalas
+# de 24h), último registro do dia e última entrada sem saída na unidade do
+# terminal (fechada automaticamente ou completada)
+DECISAO_PONTO_SQL = """
+    WITH funcionario AS (
+        SELECT id, nome, cpf, unidade_id, matricula, cargo, id_biometrico, email, tipo_escala, status
+        FROM funcionarios WHERE id = %(funcionario_id)s
+    )
+    SELECT f.id, f.nome, f.cpf, f.unidade_id, f.matricula, f.cargo, f.id_biometrico, f.email, f.tipo_escala, f.status,
+           uf.nome, ut.nome,
+           EXISTS (
+               SELECT 1 FROM ferias
+               WHERE funcionario_id = f.id AND data_inicio <= %(data)s AND data_fim >= %(data)s
+           ),
+           pendente.id, pendente.hora_entrada, pendente.hora_saida, pendente.data_hora,
+           hoje.id, hoje.hora_entrada, hoje.hora_saida, hoje.data_hora,
+           aberto.id, aberto.hora_entrada, aberto.data_hora
+    FROM funcionario f
+    LEFT JOIN unidades uf ON uf.id = f.unidade_id
+    LEFT JOIN unidades ut ON ut.id = %(unidade_terminal)s
+    LEFT JOIN LATERAL (
+        SELECT id, hora_entrada, hora_saida, data_hora FROM registros_ponto
+        WHERE funcionario_id = f.id
+        AND f.tipo_escala IN %(escalas_24h)s
+        AND data_hora >= %(data)s - INTERVAL '1 day'
+        AND data_hora < %(data)s + INTERVAL '1 day'
+        AND hora_saida IS NULL
+        ORDER BY data_hora DESC LIMIT 1
+    ) pendente ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT id, hora_entrada, hora_saida, data_hora FROM registros_ponto
+        WHERE funcionario_id = f.id
+        AND data_hora >= %(data)s AND data_hora < %(data)s + INTERVAL '1 day'
+        ORDER BY data_hora DESC LIMIT 1
+    ) hoje ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT id, hora_entrada, data_hora FROM registros_ponto
+        WHERE funcionario_id = f.id AND unidade_id = %(unidade_terminal)s AND hora_saida IS NULL
+        ORDER BY data_hora DESC LIMIT 1
+    ) aberto ON TRUE
+"""
+
+# Férias no dia, quando o índice de férias em memória não está carregado
+FERIAS_SQL = """
+    SELECT EXISTS (
+        SELECT 1 FROM ferias
+        WHERE funcionario_id = %(funcionario_id)s AND data_inicio <= %(data)s AND data_fim >= %(data)s
+    )
+"""
+
+
+def _registro_ponto(colunas):
+    # (id, hora_entrada, hora_saida, data_hora) ou None quando o LEFT JOIN não encontrou registro
+    return tuple(colunas) if colunas[0] is not None else None
+
+
+def _registro_do_turno(registro):
+    # RegistroPonto dos turnos em memória no formato de _registro_ponto
+    return (registro.id, registro.hora_entrada, registro.hora_saida, registro.data_hora) if registro else None
+
+
+def _hora(texto):
+    # "HH:MM:SS" (ou "HH:MM") enviado pelo terminal -> time
+    texto = str(texto)
+    return datetime.strptime(texto, "%H:%M:%S" if texto.count(":") == 2 else "%H:%M").time()
+
+
+def _aguarde_saida(tempo_decorrido_minutos):
+    tempo_restante = int(1 - tempo_decorrido_minutos) + 1
+    return jsonify({
+        "message": f"Você deve aguardar pelo menos 5 minutos após a entrada para registrar a saída. Tempo restante: {tempo_restante} minuto(s)."
+    }), 400
+
+
+def _batida_repetida(funcionario_id, unidade_id_terminal, data_registro):
+    # Batida repetida na unidade do terminal, respondida pelos turnos em memória
+    # sem acesso ao banco: entrada de menos de 1 minuto ou dia já encerrado.
+    # Retorna None quando a decisão precisa do banco.
+    data_atual = datetime.strptime(data_registro, "%Y-%m-%d").date()
+    turno = open_shift_state.consultar(funcionario_id, data_atual)
+    if turno is None:
+        return None
+    ultimo = turno.ultimo_do_dia()
+    if ultimo is None or ultimo.unidade_id != unidade_id_terminal or ultimo.hora_entrada is None:
+        return None
+
+    if ultimo.hora_saida is None:
+        # Última entrada do dia, que é também a entrada pendente em qualquer escala
+        tempo_decorrido_minutos = (datetime.now() - datetime.combine(data_atual, ultimo.hora_entrada)).total_seconds() / 60
+        if tempo_decorrido_minutos < 1:
+            print(f"[TENTATIVA BLOQUEADA] Funcionário ID: {funcionario_id} | Tempo decorrido: {tempo_decorrido_minutos:.2f} minutos")
+            return _aguarde_saida(tempo_decorrido_minutos)
+        return None
+
+    # Dia encerrado, sem entrada pendente de ontem ou de hoje (escalas de 24h)
+    if turno.ultimo_aberto(desde=data_atual - timedelta(days=1)) is None:
+        return jsonify({"message": f"Você já bateu sua saída hoje ({data_atual.strftime('%d/%m/%Y')})."}), 400
+    return None
+
+
+def _funcionario_inativo():
+    return jsonify({"error": "Funcionário inativo não pode bater ponto."}), 403
+
+
+def _erro_ao_gravar(conn, e):
+    conn.rollback()
+    print(f"[ERRO] Falha ao gravar registro de ponto: {e}")
+    return jsonify({"message": "Erro ao registrar ponto no sistema"}), 500
+
+
+def _assinatura_ponto(data):
+    # Dados que precisam ser iguais para que a repetição receba a mesma resposta
+    return (data.get('unidade_id'), data.get('data'), data.get('hora_entrada'), data.get('fir'))
+
 
 # ===========================
 # Função principal: Registrar ponto via biometria
 # ===========================
 def register_ponto():
     data = request.json or {}  # Lê os dados enviados no corpo da requisição
+    return _com_idempotencia(data, lambda: _register_ponto(data))
+
+
+# Registro de ponto com a digital já capturada pelo terminal (FIR em texto no
+# campo "fir"): não usa o leitor do servidor, então pode rodar em qualquer
+# instância do backend atrás do balanceador
+def register_ponto_template():
+    data = request.json or {}
+    fir_data = data.get('fir')
+    if not isinstance(fir_data, str) or not fir_data.strip():
+        return jsonify({"message": "Campo 'fir' com a digital capturada é obrigatório."}), 400
+    if not fir_valida(fir_data):
+        return jsonify({"message": "Digital inválida: a FIR enviada não pôde ser decodificada."}), 400
+    return _com_idempotencia(data, lambda: _register_ponto(data, fir_data))
+
+
+# ===========================
+# Registro de ponto em lote: batidas guardadas por um terminal que ficou sem
+# conexão (lista "registros" com funcionario_id, unidade_id, data_hora e tipo),
+# validadas e gravadas juntas, com um resultado por batida
+# ===========================
+def register_ponto_bulk():
+    data = request.json or {}
+    itens = data.get('registros')
+    if not isinstance(itens, list) or not itens:
+        return jsonify({"message": "Campo 'registros' com a lista de batidas é obrigatório."}), 400
+    if len(itens) > PONTO_LOTE_MAX:
+        return jsonify({"message": f"No máximo {PONTO_LOTE_MAX} batidas por chamada."}), 400
+
+    with db_connection() as conn:
+        if conn is None:
+            return jsonify({"message": "Erro ao conectar ao banco de dados"}), 500
+        try:
+            resultados = registrar_lote(conn, itens)
+            conn.commit()
+        except psycopg2.Error as e:
+            return _erro_ao_gravar(conn, e)
+        if any(resultado["situacao"] == "aceito" for resultado in resultados):
+            # O lote grava direto no banco, sem passar pelos turnos em memória
+            open_shift_state.recarregar(conn, [int(itens[resultado["indice"]]["funcionario_id"])
+                                               for resultado in resultados if resultado["situacao"] == "aceito"])
 
+    return jsonify({
+        "total": len(itens),
+        "aceitos": sum(1 for resultado in resultados if resultado["situacao"] == "aceito"),
+        "rejeitados": sum(1 for resultado in resultados if resultado["situacao"] == "rejeitado"),
+        "duplicados": sum(1 for resultado in resultados if resultado["situacao"] == "duplicado"),
+        "resultados": resultados
+    }), 200
+
+
+def _com_idempotencia(data, registrar):
+    # Chave opcional enviada pelo terminal (cabeçalho ou campo do corpo): uma
+    # repetição após timeout recebe a resposta original, sem nova captura,
+    # identificação ou acesso ao banco
+    chave = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if not chave:
+        return registrar()
+    chave = str(chave)
+    if len(chave) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return jsonify({"message": f"Idempotency-Key deve ter no máximo {IDEMPOTENCY_KEY_MAX_LENGTH} caracteres."}), 400
+
+    situacao, anterior = idempotency_store.reservar(chave, _assinatura_ponto(data))
+    if situacao == "repetida":
+        corpo, status = anterior
+        resposta = jsonify(corpo)
+        resposta.headers['Idempotent-Replayed'] = 'true'
+        return resposta, status
+    if situacao == "conflito":
+        return jsonify({"message": "Idempotency-Key já utilizada com outros dados de registro de ponto."}), 422
+    if situacao == "em_andamento":
+        return jsonify({"message": "Registro de ponto com esta Idempotency-Key ainda em processamento. Tente novamente."}), 409
+
+    try:
+        resposta, status = registrar()
+    except Exception:
+        idempotency_store.liberar(chave)
+        raise
+    idempotency_store.concluir(chave, resposta.get_json(), status)
+    return resposta, status
+
+
+def _register_ponto(data, fir_data=None):
     # Captura os parâmetros principais enviados pelo terminal
     unidade_id_terminal = data.get('unidade_id')
     data_registro = data.get('data') or datetime.now().date().strftime("%Y-%m-%d")
     hora_entrada = data.get('hora_entrada') or datetime.now().strftime("%H:%M:%S")
 
     # ===========================
-    # 1. Preparação para identificação biométrica
-    # ===========================
-    IndexSearch.ClearDB()  # Limpa base de digitais temporária
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id_biometrico, id FROM funcionarios")
-    for row in cursor.fetchall():
-        IndexSearch.AddFIR(row[0], int(row[1]))  # Adiciona cada funcionário à base de identificação
-    conn.close()
-
-    # ===========================
-    # 2. Captura da digital no leitor e identificação
+    # 1. Captura da digital no leitor e identificação no índice em memória
+    #    (primeiro entre os funcionários da unidade do terminal); a captura
+    #    é pulada quando o terminal já enviou a digital
     # ===========================
-    fir_data = identify_user()
+    if fir_data is None:
+        try:
+            fir_data = identify_user()
+        except DeviceUnavailableError as e:
+            print(f"Leitor indisponível: {e}")
+            return jsonify({"message": "Leitor biométrico indisponível. Por favor, tente novamente."}), 503
     if not fir_data:
         return jsonify({"message": "Nenhuma impressão digital capturada. Por favor, tente novamente."}), 400
 
-    IndexSearch.IdentifyUser(fir_data, 5)  # Tenta identificar com tolerância 5
-    if IndexSearch.UserID == 0:
+    funcionario_id = biometric_index.identify(fir_data, unidade_id_terminal)  # Tenta identificar com tolerância 5
+    if funcionario_id == 0:
         return jsonify({"message": "Usuário não identificado. Digital não cadastrada no sistema."}), 401
 
-    funcionario_id = IndexSearch.UserID  # ID do funcionário identificado
+    repetida = _batida_repetida(funcionario_id, unidade_id_terminal, data_registro)
+    if repetida:
+        return repetida
+
+    # A conexão volta ao pool em qualquer retorno do registro, inclusive nos erros 4xx
+    with db_connection() as conn:
+        if conn is None:
+            return jsonify({"message": "Erro ao conectar ao banco de dados"}), 500
+        return _registrar_ponto_identificado(conn, funcionario_id, unidade_id_terminal, data_registro, hora_entrada)
+
 
+def _registrar_ponto_identificado(conn, funcionario_id, unidade_id_terminal, data_registro, hora_entrada):
     # ===========================
-    # 3. Buscar dados do funcionário no banco
+    # 2. Funcionário (perfil em cache), férias (índice em memória) e registros
+    #    de ponto usados na decisão entre entrada e saída (turnos em memória);
+    #    se os turnos não puderem responder, tudo vem de uma única consulta
     # ===========================
-    conn = get_db_connection()
+    data_atual = datetime.strptime(data_registro, "%Y-%m-%d").date()
+    turno = open_shift_state.consultar(funcionario_id, data_atual)
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, nome, cpf, unidade_id, matricula, cargo, id_biometrico, email
-        FROM funcionarios WHERE id = %s
-    """, (funcionario_id,))
-    user_data = cursor.fetchone()
-    if not user_data:
+    parametros = {
+        "funcionario_id": funcionario_id,
+        "unidade_terminal": unidade_id_terminal,
+        "data": data_atual,
+        "escalas_24h": ESCALAS_24H
+    }
+    if turno:
+        decisao = perfil_funcionario(cursor, funcionario_id)
+        if decisao:
+            de_ferias = vacation_index.de_ferias(funcionario_id, data_atual)
+            if de_ferias is None:
+                cursor.execute(FERIAS_SQL, parametros)
+                de_ferias = cursor.fetchone()[0]
+            # Nomes das unidades só são buscados (e guardados em cache) na mensagem de unidade errada
+            decisao = tuple(decisao[:10]) + (None, None, de_ferias)
+    else:
+        cursor.execute(DECISAO_PONTO_SQL, parametros)
+        decisao = cursor.fetchone()
+    if not decisao:
         return jsonify({"message": "Funcionário não encontrado no banco de dados."}), 404
 
     # Atribui as informações do funcionário a variáveis
-    funcionario_id, user_name, cpf, unidade_id_funcionario, matricula, cargo, id_biometrico, email = user_data
+    (funcionario_id, user_name, cpf, unidade_id_funcionario, matricula, cargo, id_biometrico, email,
+     escala, status, unidade_funcionario_nome, unidade_terminal_nome, de_ferias) = decisao[:13]
 
     # ===========================
-    # 4. Validação de unidade (terminal vs funcionário)
+    # 3. Validação de unidade (terminal vs funcionário)
     # ===========================
     if not unidade_id_terminal:
         return jsonify({"message": "unidade_id é obrigatório"}), 400
 
     if unidade_id_funcionario != unidade_id_terminal:
-        # Busca nomes das unidades para detalhar o erro
-        cursor.execute("SELECT nome FROM unidades WHERE id = %s", (unidade_id_funcionario,))
-        unidade_funcionario_nome = cursor.fetchone()
-        cursor.execute("SELECT nome FROM unidades WHERE id = %s", (unidade_id_terminal,))
-        unidade_terminal_nome = cursor.fetchone()
+        # Nomes das unidades para detalhar o erro (retornados pela consulta única ou do cache)
+        if turno:
+            unidade_funcionario_nome = nome_unidade(cursor, unidade_id_funcionario)
+            unidade_terminal_nome = nome_unidade(cursor, unidade_id_terminal)
+        unidade_funcionario = unidade_funcionario_nome or unidade_id_funcionario
+        unidade_terminal = unidade_terminal_nome or unidade_id_terminal
 
-        print(f"[ACESSO NEGADO] Funcionário: {user_name} (ID: {funcionario_id}) | Unidade do funcionário: {unidade_funcionario_nome[0] if unidade_funcionario_nome else unidade_id_funcionario} | Unidade do terminal: {unidade_terminal_nome[0] if unidade_terminal_nome else unidade_id_terminal} | Data/Hora: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
+        print(f"[ACESSO NEGADO] Funcionário: {user_name} (ID: {funcionario_id}) | Unidade do funcionário: {unidade_funcionario} | Unidade do terminal: {unidade_terminal} | Data/Hora: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
 
         return jsonify({
             "message": "Funcionário não pertence a esta unidade.",
             "funcionario": user_name,
-            "unidade_funcionario": unidade_funcionario_nome[0] if unidade_funcionario_nome else unidade_id_funcionario,
-            "unidade_terminal": unidade_terminal_nome[0] if unidade_terminal_nome else unidade_id_terminal
+            "unidade_funcionario": unidade_funcionario,
+            "unidade_terminal": unidade_terminal
         }), 403
 
     # ===========================
-    # 5. Verifica se o funcionário está de férias
+    # 4. Verifica se o funcionário está de férias
     # ===========================
-    data_atual = datetime.strptime(data_registro, "%Y-%m-%d").date()
-    cursor.execute("""
-        SELECT data_inicio, data_fim FROM ferias 
-        WHERE funcionario_id = %s AND data_inicio <= %s AND data_fim >= %s
-    """, (funcionario_id, data_atual, data_atual))
-    ferias_data = cursor.fetchone()
-    if ferias_data:
+    if de_ferias:
         return jsonify({"message": "Funcionário de férias, você não pode registrar o ponto!"}), 400
 
     # ===========================
-    # 6. Busca escala do funcionário e verifica registros considerando a escala
+    # 5. Registros considerando a escala
     # ===========================
-    cursor.execute("SELECT tipo_escala FROM funcionarios WHERE id = %s", (funcionario_id,))
-    escala_result = cursor.fetchone()
-    escala = escala_result[0] if escala_result else '8h'
-    
-    # Para escalas de 24h, verifica registros dos últimos 2 dias
-    # Para outras escalas, verifica apenas o dia atual
-    if escala in ['24h', '24x72']:
-        cursor.execute("""
-            SELECT id, hora_entrada, hora_saida, data_hora FROM registros_ponto 
-            WHERE funcionario_id = %s 
-            AND DATE(data_hora) >= %s - INTERVAL '1 day'
-            AND DATE(data_hora) <= %s
-            AND hora_saida IS NULL
-            ORDER BY data_hora DESC LIMIT 1
-        """, (funcionario_id, data_atual, data_atual))
-        ultimo_ponto_pendente = cursor.fetchone()
-        
-        # Também verifica se já tem registro completo no dia atual
-        cursor.execute("""
-            SELECT id, hora_entrada, hora_saida, data_hora FROM registros_ponto 
-            WHERE funcionario_id = %s 
-            AND DATE(data_hora) = %s 
-            ORDER BY data_hora DESC LIMIT 1
-        """, (funcionario_id, data_atual))
-        ultimo_ponto_hoje = cursor.fetchone()
+    # Para escalas de 24h, a consulta traz a entrada pendente dos últimos 2 dias
+    # Para outras escalas, considera apenas o último registro do dia atual
+    if turno:
+        ultimo_ponto_hoje = _registro_do_turno(turno.ultimo_do_dia())
+        pendente_24h = _registro_do_turno(turno.ultimo_aberto(desde=data_atual - timedelta(days=1)))
+        aberta = turno.ultimo_aberto(unidade_id_terminal)
+        # (id, hora_entrada, data_hora) da última entrada sem saída na unidade do terminal
+        entrada_aberta = (aberta.id, aberta.hora_entrada, aberta.data_hora) if aberta else None
+    else:
+        ultimo_ponto_hoje = _registro_ponto(decisao[17:21])
+        pendente_24h = _registro_ponto(decisao[13:17])
+        entrada_aberta = tuple(decisao[21:24]) if decisao[21] is not None else None
+    if escala in ESCALAS_24H:
+        ultimo_ponto_pendente = pendente_24h
     else:
-        # Para escalas normais, mantém a lógica atual
-        cursor.execute("""
-            SELECT id, hora_entrada, hora_saida, data_hora FROM registros_ponto 
-            WHERE funcionario_id = %s 
-            AND DATE(data_hora) = %s 
-            ORDER BY data_hora DESC LIMIT 1
-        """, (funcionario_id, data_atual))
-        ultimo_ponto_hoje = cursor.fetchone()
         ultimo_ponto_pendente = ultimo_ponto_hoje if ultimo_ponto_hoje and ultimo_ponto_hoje[2] is None else None
 
     mensagem = ""
 
     # ===========================
-    # 7. REGISTRO DE ENTRADA
+    # 6. REGISTRO DE ENTRADA
     # ===========================
     # Se não há ponto pendente E não há registro completo hoje
     if not ultimo_ponto_pendente and (not ultimo_ponto_hoje or ultimo_ponto_hoje[2] is None):
         # Não há registro pendente, registra entrada
-        payload = {
-            "funcionario_id": funcionario_id,
-            "unidade_id": unidade_id_terminal,
-            "data": data_registro,
-            "hora_entrada": hora_entrada,
-            "hora_saida": None,
-            "id_biometrico": id_biometrico
-        }
+        if status != 1:
+            return _funcionario_inativo()
+        # Não há registro completo hoje (caso contrário o último registro do dia
+        # teria saída), então a entrada pode ser gravada
         try:
-            response = requests.post(
-                "http://biometrico.itaguai.rj.gov.br:3001/reg/calcular-registro-ponto",
-                json=payload,
-                timeout=10
-            )
-            response.raise_for_status()
-        except requests.RequestException as e:
-            # Se o Node.js retornou erro, tente pegar a mensagem do corpo da resposta
-            if e.response is not None and e.response.content:
-                try:
-                    error_json = e.response.json()
-                    return jsonify(error_json), e.response.status_code
-                except Exception:
-                    # Se não for JSON, retorna texto puro
-                    return jsonify({"message": e.response.text}), e.response.status_code
-            # Se não tem resposta do Node, retorna erro genérico
-            return jsonify({"message": "Erro ao registrar ponto no sistema"}), 500
+            if entrada_aberta:
+                # Entrada de outro dia esquecida sem saída nesta unidade
+                hora_saida_automatica = fechar_entrada_sem_saida(cursor, entrada_aberta[0], entrada_aberta[1])
+                print(f"Registro anterior (ID: {entrada_aberta[0]}) completado automaticamente com saída às {hora_saida_automatica}")
+            # Entrada pendente considerada na decisão: a do dia ou, nas escalas de 24h, desde o dia anterior
+            pendente_desde = data_atual - timedelta(days=1) if escala in ESCALAS_24H else data_atual
+            registro_entrada_id = registrar_entrada(cursor, funcionario_id, unidade_id_terminal, data_registro, hora_entrada,
+                                                    id_biometrico, pendente_desde)
+        except psycopg2.Error as e:
+            return _erro_ao_gravar(conn, e)
+        if registro_entrada_id is None:
+            # Entrada ou registro do dia gravado por outro terminal ou instância depois da leitura
+            conn.rollback()
+            open_shift_state.recarregar(conn, [funcionario_id])
+            return jsonify({"message": "Registro de ponto alterado por outro terminal. Por favor, tente novamente."}), 409
 
         # Envia e-mail de comprovante de entrada
         data_hora = datetime.now()
@@ -191,7 +379,8 @@ def register_ponto():
             f"Registro de entrada realizado com sucesso para funcionario: {user_name}\n"
             f"Comprovante enviado para o e-mail {email}"
         )
-        send_email(
+        enfileirar_email(
+            cursor,
             subject="Registro de Entrada - Ponto Registrado",
             recipient=email,
             body=f"""
@@ -213,7 +402,7 @@ def register_ponto():
         print(f"[ENTRADA REGISTRADA] Funcionário: {user_name} (ID: {funcionario_id}) | Unidade: {unidade_id_terminal} | Data/Hora: {data_registro} {hora_entrada}")
 
     # ===========================
-    # 8. REGISTRO DE SAÍDA (com bloqueio de 5 minutos)
+    # 7. REGISTRO DE SAÍDA (com bloqueio de 5 minutos)
     # ===========================
     elif ultimo_ponto_pendente and ultimo_ponto_pendente[2] is None:
         # Há entrada sem saída (pode ser de ontem para escalas 24h), registra saída
@@ -225,45 +414,39 @@ def register_ponto():
         if tempo_decorrido_minutos < 1:
             tempo_restante = int(1 - tempo_decorrido_minutos) + 1
             print(f"[TENTATIVA BLOQUEADA] Funcionário: {user_name} (ID: {funcionario_id}) | Tempo decorrido: {tempo_decorrido_minutos:.2f} minutos | Tempo restante: {tempo_restante} minuto(s)")
-            return jsonify({
-                "message": f"Você deve aguardar pelo menos 5 minutos após a entrada para registrar a saída. Tempo restante: {tempo_restante} minuto(s)."
-            }), 400
+            return _aguarde_saida(tempo_decorrido_minutos)
 
         # Se passou mais de 5 minutos, registra a saída
-        hora_saida = datetime.now().strftime("%H:%M:%S")
-        payload = {
-            "funcionario_id": funcionario_id,
-            "unidade_id": unidade_id_terminal,
-            "data": ultimo_ponto_pendente[3].date().strftime("%Y-%m-%d"),  # Usa a data da entrada
-            "hora_entrada": hora_entrada_time.strftime("%H:%M:%S"),
-            "hora_saida": hora_saida,
-            "id_biometrico": id_biometrico
-        }
+        if status != 1:
+            return _funcionario_inativo()
+        if not entrada_aberta:
+            return jsonify({"error": "Registro de entrada não encontrado para o dia."}), 404
+
+        # Saída no dia da entrada pendente; se ficar antes da entrada, conta como dia seguinte
+        hora_saida = datetime.now().replace(microsecond=0).time()
         try:
-            response = requests.post(
-                "http://biometrico.itaguai.rj.gov.br:3001/reg/calcular-registro-ponto",
-                json=payload,
-                timeout=10
+            registrar_saida(
+                cursor,
+                entrada_aberta[0],
+                escala,
+                datetime.combine(entrada_aberta[2].date(), entrada_aberta[1]),
+                datetime.combine(ultimo_ponto_pendente[3].date(), hora_saida)
             )
-            response.raise_for_status()
-        except requests.RequestException as e:
-            # Se o Node.js retornou erro, tente pegar a mensagem do corpo da resposta
-            if e.response is not None and e.response.content:
-                try:
-                    error_json = e.response.json()
-                    return jsonify(error_json), e.response.status_code
-                except Exception:
-                    # Se não for JSON, retorna texto puro
-                    return jsonify({"message": e.response.text}), e.response.status_code
-            # Se não tem resposta do Node, retorna erro genérico
-            return jsonify({"message": "Erro ao registrar ponto no sistema"}), 500
+        except psycopg2.Error as e:
+            return _erro_ao_gravar(conn, e)
+        if cursor.rowcount == 0:
+            # A entrada já tinha saída, gravada por outro terminal ou instância
+            conn.rollback()
+            open_shift_state.recarregar(conn, [funcionario_id])
+            return jsonify({"message": "Registro de ponto alterado por outro terminal. Por favor, tente novamente."}), 409
 
         # Envia e-mail de comprovante de saída
         mensagem = (
             f"Registro de saida realizado com sucesso para funcionario: {user_name}\n"
             f"Comprovante enviado para o e-mail {email}"
         )
-        send_email(
+        enfileirar_email(
+            cursor,
             subject="Registro de Saída - Ponto Registrado",
             recipient=email,
             body=f"""
@@ -285,7 +468,7 @@ def register_ponto():
         print(f"[SAÍDA REGISTRADA] Funcionário: {user_name} (ID: {funcionario_id}) | Unidade: {unidade_id_terminal} | Tempo trabalhado: {tempo_decorrido_minutos:.2f} minutos")
 
     # ===========================
-    # 9. Caso já tenha registro completo hoje
+    # 8. Caso já tenha registro completo hoje
     # ===========================
     elif ultimo_ponto_hoje and ultimo_ponto_hoje[1] is not None and ultimo_ponto_hoje[2] is not None:
         # Já tem entrada e saída hoje
@@ -294,20 +477,31 @@ def register_ponto():
         }), 400
 
     # ===========================
-    # 10. Caso inesperado
+    # 9. Caso inesperado
     # ===========================
     else:
         return jsonify({
             "message": "Estado do registro de ponto não identificado. Contate o suporte."
         }), 500
 
-    # Finaliza conexões com banco
+    # Confirma o registro de ponto e o comprovante na mesma transação; o envio do
+    # e-mail fica com o worker em segundo plano
+    conn.commit()
     cursor.close()
-    conn.close()
+    notification_worker.notificar()
 
     # Determina o tipo baseado na condição que foi executada
     tipo_registro = "entrada" if not ultimo_ponto_pendente and (not ultimo_ponto_hoje or ultimo_ponto_hoje[2] is None) else "saida"
 
+    # Write-through nos turnos em memória, depois do commit
+    if tipo_registro == "entrada":
+        if entrada_aberta:
+            open_shift_state.fechar(funcionario_id, entrada_aberta[0], _hora(hora_saida_automatica))
+        open_shift_state.abrir(funcionario_id, registro_entrada_id, unidade_id_terminal,
+                               datetime.combine(data_atual, time()), _hora(hora_entrada))
+    else:
+        open_shift_state.fechar(funcionario_id, entrada_aberta[0], hora_saida)
+
     # Resposta de sucesso com detalhes do registro
     return jsonify({
         "message": mensagem,
@@ -0,0 +1,49 @@
+from flask import jsonify
+from app.db.database import db_pool
+from app.services.gateway import node_gateway
+from app.services.idempotencia import idempotency_store
+from app.services.leitor import device_worker
+from app.services.notificacoes import notification_worker
+from app.services.turnos import open_shift_state
+from app.services.ferias import vacation_index
+from app.services import perfis
+
+
+# Situação do pool de conexões: conexões em uso, ociosas e tempo de espera
+def db_pool_status_route():
+    return jsonify(db_pool.stats()), 200
+
+
+# Situação da entrega dos e-mails de comprovante (fila notificacoes_outbox)
+def notificacoes_status_route():
+    return jsonify(notification_worker.stats()), 200
+
+
+# Chamadas ao backend Node.js: estado do circuit breaker e latência por endpoint
+def gateway_status_route():
+    return jsonify(node_gateway.stats()), 200
+
+
+# Chaves de idempotência do registro de ponto: respostas guardadas e repetições atendidas
+def idempotencia_status_route():
+    return jsonify(idempotency_store.stats()), 200
+
+
+# Leitor biométrico: sessão aberta, fila de capturas/cadastros e tempos de cada operação
+def leitor_status_route():
+    return jsonify(device_worker.stats()), 200
+
+
+# Turnos em memória: entradas sem saída, registros do dia e decisões atendidas sem o banco
+def turnos_status_route():
+    return jsonify(open_shift_state.stats()), 200
+
+
+# Cache de perfis e unidades: entradas, taxa de acerto, invalidações e descartes por tamanho
+def cache_status_route():
+    return jsonify(perfis.stats()), 200
+
+
+# Índice de férias: períodos carregados, sincronizações e verificações atendidas sem o banco
+def ferias_status_route():
+    return jsonify(vacation_index.stats()), 200
@@ -1,5 +1,10 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import extensions
 from dotenv import load_dotenv
 
 # Carregar as variáveis do arquivo .env
@@ -12,9 +17,126 @@ DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 
-# Função para conectar ao banco de dados
-def get_db_connection():
-    try:
+# Pool de conexões
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))  # conexões abertas na inicialização
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 10))  # limite de conexões simultâneas
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 5))  # espera máxima (s) por uma conexão livre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # idade máxima (s) de uma conexão
+DB_POOL_PING_AFTER = int(os.getenv("DB_POOL_PING_AFTER", 30))  # ociosidade (s) que exige SELECT 1 antes do uso
+
+
+class PoolTimeout(Exception):
+    """Nenhuma conexão foi liberada dentro de DB_POOL_TIMEOUT."""
+
+
+class ConnectionPool:
+    """
+    Pool de conexões limitado e seguro entre threads. Conexões ociosas há
+    mais de ping_after segundos são testadas antes de voltar ao uso e
+    conexões mais antigas que recycle segundos são fechadas e reabertas.
+    """
+
+    def __init__(self, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 recycle=DB_POOL_RECYCLE, ping_after=DB_POOL_PING_AFTER):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._cond = threading.Condition()
+        self._ociosas = []  # (conexão, aberta_em, devolvida_em), a mais recente no fim
+        self._abertas_em = {}  # conexão em uso -> momento em que foi aberta
+        self._em_uso = 0
+        self._aguardando = 0
+        self.total_aberturas = 0
+        self.total_descartes = 0
+        self.total_esperas = 0
+        self.total_timeouts = 0
+        self.espera_total_ms = 0.0
+        self.espera_max_ms = 0.0
+
+    def prefill(self):
+        """Abre as conexões mínimas do pool."""
+        conexoes = [self.getconn() for _ in range(self.minconn)]
+        for conn in conexoes:
+            self.putconn(conn)
+
+    def getconn(self):
+        inicio = time.perf_counter()
+        with self._cond:
+            self._aguardando += 1
+            try:
+                while not self._ociosas and self._em_uso >= self.maxconn:
+                    restante = self.timeout - (time.perf_counter() - inicio)
+                    if restante <= 0:
+                        self.total_timeouts += 1
+                        raise PoolTimeout(f"Nenhuma conexão livre em {self.timeout:.0f}s ({self.maxconn} em uso)")
+                    self._cond.wait(restante)
+            finally:
+                self._aguardando -= 1
+            ociosa = self._ociosas.pop() if self._ociosas else None
+            self._em_uso += 1
+            self._registrar_espera((time.perf_counter() - inicio) * 1000)
+
+        # Teste e abertura de conexões ficam fora do lock
+        try:
+            conn, aberta_em = self._validar(ociosa) if ociosa else (None, None)
+            if conn is None:
+                conn, aberta_em = self._abrir(), time.monotonic()
+        except Exception:
+            with self._cond:
+                self._em_uso -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._abertas_em[conn] = aberta_em
+        return conn
+
+    def putconn(self, conn):
+        """Devolve a conexão ao pool, desfazendo qualquer transação pendente."""
+        with self._cond:
+            aberta_em = self._abertas_em.pop(conn, None)
+        if aberta_em is None:
+            return
+
+        reutilizar = not conn.closed and time.monotonic() - aberta_em < self.recycle
+        if reutilizar and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                reutilizar = False
+        if not reutilizar:
+            self._descartar(conn)
+
+        with self._cond:
+            self._em_uso -= 1
+            if reutilizar:
+                self._ociosas.append((conn, aberta_em, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            ociosas, self._ociosas = self._ociosas, []
+        for conn, _, _ in ociosas:
+            self._descartar(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "em_uso": self._em_uso,
+                "ociosas": len(self._ociosas),
+                "aguardando": self._aguardando,
+                "maximo": self.maxconn,
+                "total_aberturas": self.total_aberturas,
+                "total_descartes": self.total_descartes,
+                "total_esperas": self.total_esperas,
+                "total_timeouts": self.total_timeouts,
+                "espera_media_ms": round(self.espera_total_ms / self.total_esperas, 2) if self.total_esperas else 0.0,
+                "espera_max_ms": round(self.espera_max_ms, 2)
+            }
+
+    def _abrir(self):
         conn = psycopg2.connect(
             host=DB_HOST,
             port=DB_PORT,
@@ -22,8 +144,60 @@ def get_db_connection():
             user=DB_USER,
             password=DB_PASSWORD
         )
-        print("Conexão com o banco de dados estabelecida!")
+        with self._cond:
+            self.total_aberturas += 1
         return conn
-    except Exception as e:
+
+    def _validar(self, ociosa):
+        # Retorna (None, None) quando a conexão ociosa não pode mais ser usada
+        conn, aberta_em, devolvida_em = ociosa
+        agora = time.monotonic()
+        if conn.closed or agora - aberta_em >= self.recycle:
+            self._descartar(conn)
+            return None, None
+        if agora - devolvida_em >= self.ping_after:
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+                conn.rollback()
+            except psycopg2.Error:
+                self._descartar(conn)
+                return None, None
+        return conn, aberta_em
+
+    def _descartar(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self.total_descartes += 1
+
+    def _registrar_espera(self, espera_ms):
+        self.total_esperas += 1
+        self.espera_total_ms += espera_ms
+        self.espera_max_ms = max(self.espera_max_ms, espera_ms)
+
+
+# Pool compartilhado por todo o processo
+db_pool = ConnectionPool()
+
+
+@contextmanager
+def db_connection():
+    """
+    Empresta uma conexão do pool e a devolve ao sair do bloco, inclusive em
+    returns antecipados e exceções. Produz None se não houver conexão
+    disponível (banco fora do ar ou pool esgotado).
+    """
+    try:
+        conn = db_pool.getconn()
+    except (psycopg2.Error, PoolTimeout) as e:
         print(f"Erro ao conectar ao banco de dados: {e}")
-        return None
+        conn = None
+    try:
+        yield conn
+    finally:
+        if conn is not None:
+            db_pool.putconn(conn)
@@ -0,0 +1,15 @@
+# app/routes/statusRoutes.py
+
+from app.controller.statusController import db_pool_status_route, notificacoes_status_route, gateway_status_route, \
+    idempotencia_status_route, leitor_status_route, turnos_status_route, cache_status_route, \
+    ferias_status_route
+
+def status_routes(app):
+    app.add_url_rule('/status/db', 'status_db', db_pool_status_route, methods=['GET'])
+    app.add_url_rule('/status/notificacoes', 'status_notificacoes', notificacoes_status_route, methods=['GET'])
+    app.add_url_rule('/status/gateway', 'status_gateway', gateway_status_route, methods=['GET'])
+    app.add_url_rule('/status/idempotencia', 'status_idempotencia', idempotencia_status_route, methods=['GET'])
+    app.add_url_rule('/status/leitor', 'status_leitor', leitor_status_route, methods=['GET'])
+    app.add_url_rule('/status/turnos', 'status_turnos', turnos_status_route, methods=['GET'])
+    app.add_url_rule('/status/cache', 'status_cache', cache_status_route, methods=['GET'])
+    app.add_url_rule('/status/ferias', 'status_ferias', ferias_status_route, methods=['GET'])
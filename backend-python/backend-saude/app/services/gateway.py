@@ -0,0 +1,231 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Backend Node.js (envio dos e-mails de comprovante)
+NODE_API_URL = os.getenv("NODE_API_URL", "http://biometrico.itaguai.rj.gov.br:3001")
+
+# Prazo total (segundos) de uma chamada, incluindo novas tentativas
+NODE_API_TIMEOUT_SECONDS = float(os.getenv("NODE_API_TIMEOUT_SECONDS", 10))
+
+# Prazo (segundos) para estabelecer a conexão em cada tentativa
+NODE_API_CONNECT_TIMEOUT_SECONDS = float(os.getenv("NODE_API_CONNECT_TIMEOUT_SECONDS", 3))
+
+# Novas tentativas após falhas seguras de repetir
+NODE_API_RETRIES = int(os.getenv("NODE_API_RETRIES", 2))
+
+# Conexões keep-alive mantidas com o Node.js
+NODE_API_POOL_SIZE = int(os.getenv("NODE_API_POOL_SIZE", 10))
+
+# Circuit breaker: falhas seguidas que abrem o circuito e tempo (segundos) até testar de novo
+NODE_API_CIRCUIT_FAILURES = int(os.getenv("NODE_API_CIRCUIT_FAILURES", 5))
+NODE_API_CIRCUIT_RESET_SECONDS = float(os.getenv("NODE_API_CIRCUIT_RESET_SECONDS", 30))
+
+# Espera antes da primeira nova tentativa (dobra a cada tentativa)
+RETRY_BACKOFF_SECONDS = 0.1
+
+# Respostas que indicam falha do Node.js (e não erro de validação da requisição)
+STATUS_FALHA = (502, 503, 504)
+
+# Limites (ms) das faixas do histograma de latência
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class CircuitOpenError(requests.RequestException):
+    """O circuito está aberto: o Node.js falhou seguidamente e a chamada nem é feita."""
+
+
+class LatencyHistogram:
+    """Histograma de latência em faixas fixas (LATENCY_BUCKETS_MS, mais uma faixa acima do último limite)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.contagens = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.soma_ms = 0.0
+
+    def observe(self, ms):
+        posicao = next((i for i, limite in enumerate(self.buckets) if ms <= limite), len(self.buckets))
+        self.contagens[posicao] += 1
+        self.total += 1
+        self.soma_ms += ms
+
+    def percentil(self, p):
+        # Limite superior da faixa que contém o percentil (None acima do último limite)
+        if not self.total:
+            return None
+        alvo = p / 100 * self.total
+        acumulado = 0
+        for posicao, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return self.buckets[posicao] if posicao < len(self.buckets) else None
+        return None
+
+    def snapshot(self):
+        faixas = {f"<={limite}": contagem for limite, contagem in zip(self.buckets, self.contagens)}
+        faixas[f">{self.buckets[-1]}"] = self.contagens[-1]
+        return {
+            "total": self.total,
+            "media_ms": round(self.soma_ms / self.total, 1) if self.total else None,
+            "p50_ms": self.percentil(50),
+            "p95_ms": self.percentil(95),
+            "p99_ms": self.percentil(99),
+            "faixas_ms": faixas
+        }
+
+
+class CircuitBreaker:
+    """
+    fechado -> aberto após `falhas_para_abrir` falhas seguidas; aberto ->
+    meio_aberto após `reset_seconds`, liberando uma única chamada de teste,
+    que fecha o circuito em caso de sucesso ou o reabre em caso de falha.
+    """
+
+    def __init__(self, falhas_para_abrir=NODE_API_CIRCUIT_FAILURES, reset_seconds=NODE_API_CIRCUIT_RESET_SECONDS):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.estado = "fechado"
+        self.falhas_seguidas = 0
+        self.aberto_em = None
+        self.total_aberturas = 0
+        self.total_rejeitadas = 0
+
+    def permitir(self):
+        with self._lock:
+            if self.estado == "aberto" and time.monotonic() - self.aberto_em >= self.reset_seconds:
+                self.estado = "meio_aberto"
+                return True
+            if self.estado != "fechado":
+                self.total_rejeitadas += 1
+                return False
+            return True
+
+    def sucesso(self):
+        with self._lock:
+            self.estado = "fechado"
+            self.falhas_seguidas = 0
+
+    def falha(self):
+        with self._lock:
+            self.falhas_seguidas += 1
+            if self.estado == "meio_aberto" or self.falhas_seguidas >= self.falhas_para_abrir:
+                if self.estado != "aberto":
+                    self.total_aberturas += 1
+                    print(f"[GATEWAY NODE] Circuito aberto após {self.falhas_seguidas} falha(s) seguida(s)")
+                self.estado = "aberto"
+                self.aberto_em = time.monotonic()
+
+
+class GatewayClient:
+    """
+    Cliente HTTP compartilhado para o backend Node.js: conexões keep-alive,
+    prazo por chamada, novas tentativas limitadas, circuit breaker e
+    histograma de latência por endpoint.
+
+    Chamadas não idempotentes (como o envio de e-mail) só são repetidas
+    quando a conexão nem chegou a ser estabelecida; chamadas idempotentes
+    também são repetidas após timeout de leitura e respostas 502/503/504.
+    """
+
+    def __init__(self, base_url=NODE_API_URL, retries=NODE_API_RETRIES, breaker=None):
+        self.base_url = base_url
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=NODE_API_POOL_SIZE)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._latencias = {}  # path -> LatencyHistogram
+        self._resultados = {}  # path -> {"sucesso": n, "erro": n, "tentativas_extras": n}
+
+    def post(self, path, json=None, deadline=None, idempotent=False):
+        """
+        POST em base_url + path. Retorna a resposta do Node.js (inclusive 4xx,
+        que o chamador trata com raise_for_status). Lança CircuitOpenError
+        quando o circuito está aberto e requests.RequestException quando
+        todas as tentativas falharem.
+        """
+        if not self.breaker.permitir():
+            raise CircuitOpenError(f"Circuito aberto para {self.base_url}: chamada a {path} não realizada")
+
+        deadline = deadline or NODE_API_TIMEOUT_SECONDS
+        limite = time.monotonic() + deadline
+        url = self.base_url.rstrip("/") + path
+        tentativa = 0
+        while True:
+            restante = limite - time.monotonic()
+            inicio = time.perf_counter()
+            try:
+                if restante <= 0:
+                    raise requests.Timeout(f"Prazo de {deadline:.1f}s esgotado para {path}")
+                response = self._session.post(url, json=json, timeout=(min(NODE_API_CONNECT_TIMEOUT_SECONDS, restante), restante))
+                erro = None
+                if response.status_code in STATUS_FALHA:
+                    erro = requests.HTTPError(f"{response.status_code} do Node.js em {path}", response=response)
+            except requests.RequestException as e:
+                response = None
+                erro = e
+            self._registrar(path, (time.perf_counter() - inicio) * 1000, erro is None, tentativa > 0)
+
+            if erro is None:
+                self.breaker.sucesso()
+                return response
+
+            espera = RETRY_BACKOFF_SECONDS * 2 ** tentativa
+            if tentativa >= self.retries or not self._pode_repetir(erro, idempotent) or time.monotonic() + espera >= limite:
+                self.breaker.falha()
+                if response is not None:
+                    # 502/503/504: devolve a resposta para o chamador repassar a mensagem
+                    return response
+                raise erro
+            tentativa += 1
+            time.sleep(espera)
+
+    @staticmethod
+    def _pode_repetir(erro, idempotent):
+        if idempotent:
+            return True
+        # Falha ao conectar: o Node.js não chegou a receber a requisição
+        if isinstance(erro, requests.ConnectTimeout):
+            return True
+        motivo = getattr(erro.args[0], "reason", None) if erro.args else None
+        return isinstance(motivo, NewConnectionError)
+
+    def _registrar(self, path, ms, sucesso, repeticao):
+        with self._lock:
+            histograma = self._latencias.setdefault(path, LatencyHistogram())
+            histograma.observe(ms)
+            resultados = self._resultados.setdefault(path, {"sucesso": 0, "erro": 0, "tentativas_extras": 0})
+            resultados["sucesso" if sucesso else "erro"] += 1
+            resultados["tentativas_extras"] += repeticao
+
+    def stats(self):
+        with self._lock:
+            endpoints = {
+                path: {**self._resultados[path], "latencia": histograma.snapshot()}
+                for path, histograma in self._latencias.items()
+            }
+        return {
+            "base_url": self.base_url,
+            "circuito": {
+                "estado": self.breaker.estado,
+                "falhas_seguidas": self.breaker.falhas_seguidas,
+                "total_aberturas": self.breaker.total_aberturas,
+                "total_rejeitadas": self.breaker.total_rejeitadas
+            },
+            "endpoints": endpoints
+        }
+
+
+# Cliente compartilhado por controllers e workers
+node_gateway = GatewayClient()
@@ -0,0 +1,124 @@
+from datetime import timedelta
+
+# Cálculo das horas do registro de ponto, feito no próprio processo (antes era
+# feito pelo backend Node.js em /reg/calcular-registro-ponto). As regras e o
+# formato dos intervalos são os mesmos do Node.js.
+
+# Jornada esperada (horas) por tipo_escala_enum
+JORNADAS = {
+    '8h': 8, '12h': 12, '16h': 16, '24h': 22,
+    '12x36': 12, '24x72': 22, '32h': 32, '20h': 20
+}
+JORNADA_PADRAO = 8
+
+# Pausa de almoço (horas) descontada do tempo trabalhado
+PAUSAS_ALMOCO = {'24h': 2, '24x72': 2, '16h': 2, '8h': 1, '12h': 1}
+
+# Entrada anterior que ficou sem saída é fechada com hora_entrada + 10 minutos
+SAIDA_AUTOMATICA_MINUTOS = 10
+STATUS_REGISTRADO = 'registrado'
+STATUS_SAIDA_AUTOMATICA = 'não registrado a saída'
+
+# Primeira chave dos advisory locks que serializam as gravações de ponto de um
+# mesmo funcionário, nas batidas e nos lotes (a segunda é o funcionario_id)
+LOCK_PONTO_FUNCIONARIO = 4701
+
+
+def formatar_intervalo(segundos):
+    """Segundos -> 'H:MM:SS' (horas sem limite de 24, como o Node.js envia ao PostgreSQL)."""
+    return f"{segundos // 3600}:{segundos % 3600 // 60:02d}:{segundos % 60:02d}"
+
+
+def calcular_horas(escala, entrada, saida):
+    """
+    Horas do registro entre `entrada` e `saida` (datetimes) para a escala do
+    funcionário. Saída igual ou anterior à entrada é considerada no dia
+    seguinte. Retorna os intervalos gravados em registros_ponto.
+    """
+    if saida <= entrada:
+        saida += timedelta(days=1)
+
+    tempo = round((saida - entrada).total_seconds())
+    pausa = PAUSAS_ALMOCO.get(escala, 0) * 3600
+    jornada = JORNADAS.get(escala, JORNADA_PADRAO) * 3600
+
+    # A pausa só é descontada de quem trabalhou mais do que ela
+    trabalhado = tempo - pausa if tempo > pausa else tempo
+    diferenca = trabalhado - jornada
+
+    return {
+        "horas_normais": formatar_intervalo(min(trabalhado, jornada)),
+        "hora_extra": formatar_intervalo(max(diferenca, 0)),
+        "hora_desconto": formatar_intervalo(max(-diferenca, 0)),
+        "total_trabalhado": formatar_intervalo(trabalhado),
+        "hora_saida_ajustada": formatar_intervalo(tempo)
+    }
+
+
+def hora_saida_automatica(hora_entrada):
+    """Saída atribuída a uma entrada esquecida: hora_entrada + 10 minutos, sem segundos."""
+    minutos = hora_entrada.hour * 60 + hora_entrada.minute + SAIDA_AUTOMATICA_MINUTOS
+    return f"{minutos // 60 % 24:02d}:{minutos % 60:02d}:00"
+
+
+def fechar_entrada_sem_saida(cursor, registro_id, hora_entrada):
+    """Fecha a entrada anterior que ficou sem saída. Retorna a hora de saída atribuída."""
+    hora_saida = hora_saida_automatica(hora_entrada)
+    cursor.execute("""
+        UPDATE registros_ponto
+        SET hora_saida = %s, status = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s AND hora_saida IS NULL
+    """, (hora_saida, STATUS_SAIDA_AUTOMATICA, registro_id))
+    return hora_saida
+
+
+def registrar_entrada(cursor, funcionario_id, unidade_id, data, hora_entrada, id_biometrico, pendente_desde):
+    """
+    Insere o registro de entrada usando o cursor (e a transação) de quem chama.
+    Retorna o id.
+
+    A decisão pela entrada pode ter vindo dos turnos em memória, que não
+    enxergam as batidas recentes de outras instâncias: com as gravações do
+    funcionário serializadas pelo advisory lock, a entrada só é inserida se
+    ainda não houver registro dele no dia nem entrada sem saída desde
+    pendente_desde. Caso contrário retorna None.
+    """
+    cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", (LOCK_PONTO_FUNCIONARIO, funcionario_id))
+    cursor.execute("""
+        INSERT INTO registros_ponto (
+            funcionario_id, unidade_id, data_hora, hora_entrada, hora_saida, id_biometrico, status
+        )
+        SELECT %(funcionario_id)s, %(unidade_id)s, %(data)s, %(hora_entrada)s, NULL, %(id_biometrico)s, %(status)s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM registros_ponto
+            WHERE funcionario_id = %(funcionario_id)s
+            AND ((data_hora >= %(data)s AND data_hora < %(data)s::date + 1)
+                 OR (hora_saida IS NULL AND data_hora >= %(pendente_desde)s))
+        )
+        RETURNING id
+    """, {
+        "funcionario_id": funcionario_id, "unidade_id": unidade_id, "data": data, "hora_entrada": hora_entrada,
+        "id_biometrico": id_biometrico or None, "status": STATUS_REGISTRADO, "pendente_desde": pendente_desde
+    })
+    registro = cursor.fetchone()
+    return registro[0] if registro else None
+
+
+def registrar_saida(cursor, registro_id, escala, entrada, saida):
+    """
+    Grava a saída e as horas calculadas no registro de entrada. Retorna as
+    horas. Uma entrada que já tem saída não é alterada (cursor.rowcount 0).
+    """
+    horas = calcular_horas(escala, entrada, saida)
+    cursor.execute("""
+        UPDATE registros_ponto
+        SET hora_saida = %(hora_saida)s,
+            horas_normais = %(horas_normais)s::interval,
+            hora_extra = %(hora_extra)s::interval,
+            hora_desconto = %(hora_desconto)s::interval,
+            total_trabalhado = %(total_trabalhado)s::interval,
+            hora_saida_ajustada = %(hora_saida_ajustada)s::interval,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = %(id)s AND hora_saida IS NULL
+    """, {**horas, "hora_saida": saida.strftime("%H:%M:%S"), "id": registro_id})
+    return horas
@@ -0,0 +1,331 @@
+import binascii
+import csv
+import itertools
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Backend de comparação de digitais:
+#   "nbiobsp" -> SDK NBioBSP via COM (Windows com leitor conectado)
+#   "numpy"   -> motor de referência em NumPy, sem leitor (testes, benchmarks e carga em Linux)
+BIOMETRIC_BACKEND = os.getenv("BIOMETRIC_BACKEND", "nbiobsp").lower()
+
+# Limite de réplicas do pool de matchers com o SDK NBioBSP: cada réplica cria um
+# objeto COM (com sua própria IndexSearch) por unidade, ou seja, réplicas × unidades
+# instâncias do SDK, cada uma com uma cópia das digitais da unidade
+NBIOBSP_MAX_REPLICAS = int(os.getenv("NBIOBSP_MAX_REPLICAS", 1))
+
+# Arquivo reproduzido pela captura simulada do backend "numpy"
+# (fir.csv gerado pelo bioarquivo, ou um arquivo texto com uma FIR por linha)
+BIOMETRIC_REPLAY_FILE = os.getenv("BIOMETRIC_REPLAY_FILE", "fir.csv")
+
+
+class Matcher:
+    """
+    Operações de biometria usadas pelos controllers: base de busca
+    (clear, add_template, remove_template, identify) e leitor (open_device,
+    close_device, enroll, capture). Cada instância é uma base de busca
+    independente.
+
+    Com o leitor aberto por open_device, enroll e capture usam a sessão já
+    aberta; sem ela, cada operação abre e fecha o leitor.
+    """
+
+    MAX_REPLICAS = None  # Limite de réplicas do MatcherPool com este backend (None: sem limite)
+
+    def open_device(self):
+        """Abre o leitor e o mantém aberto até close_device."""
+
+    def close_device(self):
+        """Fecha o leitor aberto por open_device."""
+
+    def clear(self):
+        raise NotImplementedError
+
+    def add_template(self, fir, user_id):
+        raise NotImplementedError
+
+    def remove_template(self, user_id):
+        raise NotImplementedError
+
+    def identify(self, fir, security_level):
+        """Retorna o user_id da digital encontrada ou 0."""
+        raise NotImplementedError
+
+    def enroll(self, id_biometrico):
+        """Cadastra uma digital no leitor e retorna a FIR codificada em texto."""
+        raise NotImplementedError
+
+    def capture(self):
+        """Captura uma digital no leitor e retorna a FIR codificada em texto."""
+        raise NotImplementedError
+
+
+# ===========================
+# Backend NBioBSP (COM)
+# ===========================
+class NBioBSPMatcher(Matcher):
+    MAX_REPLICAS = NBIOBSP_MAX_REPLICAS
+
+    def __init__(self):
+        # Importado aqui para que o restante do sistema funcione fora do Windows
+        import comtypes
+        import comtypes.client
+
+        # Threads criadas pelo processo (como a do leitor) precisam iniciar o COM
+        try:
+            comtypes.CoInitialize()
+        except OSError:
+            pass  # COM já iniciado nesta thread
+
+        self._nbiobsp = comtypes.client.CreateObject("NBioBSPCOM.NBioBSP")
+        self._device = self._nbiobsp.Device
+        self._extraction = self._nbiobsp.Extraction
+        self._index_search = self._nbiobsp.IndexSearch
+        self._sessao_aberta = False
+
+    def open_device(self):
+        self._device.Open(255)
+        self._sessao_aberta = True
+
+    def close_device(self):
+        self._sessao_aberta = False
+        self._device.Close(255)
+
+    def clear(self):
+        self._index_search.ClearDB()
+
+    def add_template(self, fir, user_id):
+        # AddFIR aceita tanto a FIR binária (array de bytes) quanto a FIR em texto
+        self._index_search.AddFIR(fir, user_id)
+
+    def remove_template(self, user_id):
+        self._index_search.RemoveUser(user_id)
+
+    def identify(self, fir, security_level):
+        self._index_search.IdentifyUser(fir, security_level)
+        return self._index_search.UserID
+
+    def enroll(self, id_biometrico):
+        if not self._sessao_aberta:
+            self._device.Open(255)
+        self._extraction.Enroll(id_biometrico, 0)
+        if not self._sessao_aberta:
+            self._device.Close(255)
+        return self._extraction.TextEncodeFIR
+
+    def capture(self):
+        self._extraction.WindowStyle = 1
+        if not self._sessao_aberta:
+            self._device.Open(255)
+        self._extraction.Capture(1)
+        if not self._sessao_aberta:
+            self._device.Close(255)
+        return self._extraction.TextEncodeFIR
+
+
+# ===========================
+# Backend de referência (NumPy)
+# ===========================
+
+# Tamanho do vetor de características extraído de cada template
+FEATURE_SIZE = 1024
+
+# Cabeçalho fixo da FIR (versão, tamanho, formato), ignorado na comparação
+FIR_HEADER_BYTES = 24
+
+# FIR em texto do TextEncodeFIR: base64 com "*" no lugar de "+", sem o padding
+FIR_TEXTO = re.compile(r"[A-Za-z0-9*+/]+=*")
+
+
+def decode_fir(fir):
+    """
+    Converte uma FIR (texto do TextEncodeFIR ou bytes) para bytes.
+
+    Levanta ValueError quando o texto não é uma FIR válida (corrompida ou
+    truncada), para que ela não chegue ao matcher como bytes que nunca
+    seriam identificados.
+    """
+    if isinstance(fir, (bytes, bytearray, memoryview)):
+        return bytes(fir)
+    texto = fir.strip()
+    if not FIR_TEXTO.fullmatch(texto):
+        raise ValueError("FIR em texto com caracteres inválidos")
+    texto = texto.rstrip("=").replace("*", "+")
+    try:
+        fir_bytes = binascii.a2b_base64(texto + "=" * (-len(texto) % 4))
+    except binascii.Error as e:
+        raise ValueError(f"FIR em texto inválida: {e}") from None
+    if len(fir_bytes) <= FIR_HEADER_BYTES:
+        raise ValueError("FIR truncada")
+    return fir_bytes
+
+
+def fir_valida(fir):
+    """Se a FIR (texto ou bytes) pode ser decodificada."""
+    try:
+        decode_fir(fir)
+    except ValueError:
+        return False
+    return True
+
+
+def encode_fir(raw):
+    """Converte bytes de uma FIR para o formato texto usado no banco."""
+    return binascii.b2a_base64(raw, newline=False).decode("ascii").rstrip("=").replace("+", "*")
+
+
+def extract_features(fir):
+    """
+    Vetor de características normalizado (contagem de pares de bytes).
+    Aproximação para testes e benchmarks: não substitui o algoritmo de
+    minúcias do NBioBSP, mas preserva o custo e o formato da busca 1:N.
+    """
+    dados = np.frombuffer(decode_fir(fir), dtype=np.uint8)[FIR_HEADER_BYTES:]
+    if dados.size < 2:
+        return np.zeros(FEATURE_SIZE, dtype=np.float32)
+    pares = ((dados[:-1].astype(np.uint32) << 8) | dados[1:]) % FEATURE_SIZE
+    vetor = np.bincount(pares, minlength=FEATURE_SIZE).astype(np.float32)
+    norma = np.linalg.norm(vetor)
+    return vetor / norma if norma else vetor
+
+
+def similarity_threshold(security_level):
+    """Similaridade mínima exigida para cada nível de segurança (1 a 9)."""
+    security_level = min(max(int(security_level), 1), 9)
+    return 0.80 + 0.02 * security_level
+
+
+class ReplayCaptureSource:
+    """Captura simulada: reproduz em ciclo as digitais de um arquivo."""
+
+    def __init__(self, path=BIOMETRIC_REPLAY_FILE):
+        self.path = path
+        self._registros = self._ler(path)
+        self._ciclo = itertools.cycle(self._registros) if self._registros else None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _ler(path):
+        if not os.path.exists(path):
+            return []
+        with open(path, newline="", encoding="utf-8") as arquivo:
+            if path.lower().endswith(".csv"):
+                # Formato do fir.csv: UserID, UserName, FIR, Timestamp
+                return [
+                    (linha.get("UserID"), linha["FIR"])
+                    for linha in csv.DictReader(arquivo)
+                    if linha.get("FIR") and linha["FIR"] != "None"
+                ]
+            return [(None, linha.strip()) for linha in arquivo if linha.strip()]
+
+    def next(self):
+        with self._lock:
+            if self._ciclo is None:
+                return None
+            return next(self._ciclo)[1]
+
+    def find(self, user_id):
+        for registro_id, fir in self._registros:
+            if registro_id is not None and registro_id.lstrip("0") == str(user_id).lstrip("0"):
+                return fir
+        return None
+
+
+class NumpyMatcher(Matcher):
+    """
+    Motor de referência vetorizado: as digitais são decodificadas uma vez
+    em vetores de características e a identificação é um produto matricial
+    contra toda a base.
+    """
+
+    def __init__(self, capture_source=None):
+        self._capture_source = capture_source
+        self._ids = []
+        self._features = []
+        self._posicoes = {}  # user_id -> posição em _ids/_features
+        self._matriz = None
+        self._vetor_ids = None
+
+    def clear(self):
+        self._ids = []
+        self._features = []
+        self._posicoes = {}
+        self._matriz = None
+
+    def add_template(self, fir, user_id):
+        if user_id in self._posicoes:
+            self.remove_template(user_id)
+        self._posicoes[user_id] = len(self._ids)
+        self._ids.append(user_id)
+        self._features.append(extract_features(fir))
+        self._matriz = None
+
+    def remove_template(self, user_id):
+        posicao = self._posicoes.pop(user_id, None)
+        if posicao is None:
+            return
+        # Move o último elemento para a posição removida (O(1))
+        ultimo = len(self._ids) - 1
+        if posicao != ultimo:
+            self._ids[posicao] = self._ids[ultimo]
+            self._features[posicao] = self._features[ultimo]
+            self._posicoes[self._ids[posicao]] = posicao
+        self._ids.pop()
+        self._features.pop()
+        self._matriz = None
+
+    def identify(self, fir, security_level):
+        if not self._ids:
+            return 0
+        if self._matriz is None:
+            self._matriz = np.vstack(self._features)
+            self._vetor_ids = np.asarray(self._ids, dtype=np.int64)
+        scores = self._matriz @ extract_features(fir)
+        melhor = int(np.argmax(scores))
+        if scores[melhor] < similarity_threshold(security_level):
+            return 0
+        return int(self._vetor_ids[melhor])
+
+    def enroll(self, id_biometrico):
+        fir = self._source().find(id_biometrico)
+        if fir is None:
+            # Digital sintética e determinística para o identificador informado
+            rng = np.random.default_rng(zlib.crc32(str(id_biometrico).encode("utf-8")))
+            fir = encode_fir(rng.integers(0, 256, size=512, dtype=np.uint8).tobytes())
+        return fir
+
+    def capture(self):
+        return self._source().next()
+
+    def _source(self):
+        if self._capture_source is None:
+            self._capture_source = ReplayCaptureSource()
+        return self._capture_source
+
+
+BACKENDS = {
+    "nbiobsp": NBioBSPMatcher,
+    "numpy": NumpyMatcher,
+}
+
+
+def create_matcher(backend=None):
+    """Cria uma instância do backend configurado em BIOMETRIC_BACKEND."""
+    backend = (backend or BIOMETRIC_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend biométrico inválido: {backend}. Valores válidos: {', '.join(BACKENDS)}")
+    return BACKENDS[backend]()
+
+
+def max_replicas(backend=None):
+    """Limite de réplicas do MatcherPool para o backend (None: sem limite)."""
+    backend = (backend or BIOMETRIC_BACKEND).lower()
+    matcher_class = BACKENDS.get(backend)
+    return matcher_class.MAX_REPLICAS if matcher_class is not None else None
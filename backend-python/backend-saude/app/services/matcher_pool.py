@@ -0,0 +1,187 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Réplicas da base de busca, cada uma com seus próprios matchers e sua própria thread
+MATCHER_POOL_SIZE = int(os.getenv("MATCHER_POOL_SIZE", min(4, os.cpu_count() or 1)))
+
+
+class _Replica:
+    """
+    Uma cópia completa da base de busca (um matcher por unidade), usada
+    somente pela sua thread: os objetos do SDK são criados e chamados nela,
+    e o resultado de cada identificação volta pelo Future da chamada, sem
+    estado compartilhado entre requisições (como o UserID do IndexSearch).
+    """
+
+    def __init__(self, numero, matcher_factory):
+        self.numero = numero
+        self._matcher_factory = matcher_factory
+        self._fila = queue.Queue()
+        self._shards = {}  # unidade_id -> Matcher, acessado somente pela thread da réplica
+        self.pendentes = 0  # identificações na fila ou em execução (protegido pelo lock do pool)
+        self.divergente = False  # perdeu uma alteração difundida: fica fora das identificações até a próxima carga
+        self.total_identificacoes = 0
+        self.total_erros = 0
+        self._thread = threading.Thread(target=self._loop, name=f"matcher-replica-{numero}", daemon=True)
+        self._thread.start()
+
+    def enviar(self, operacao, *args, futuro=None):
+        self._fila.put((operacao, args, futuro))
+
+    def _loop(self):
+        while True:
+            operacao, args, futuro = self._fila.get()
+            if operacao == "encerrar":
+                # Pool substituído por uma carga completa: os matchers são liberados na própria thread
+                self._shards.clear()
+                return
+            if futuro is not None:
+                try:
+                    futuro.set_result(getattr(self, f"_{operacao}")(*args))
+                except Exception as e:
+                    self.total_erros += 1
+                    futuro.set_exception(e)
+                continue
+            try:
+                getattr(self, f"_{operacao}")(*args)
+            except Exception as e:
+                # A réplica fica divergente (e fora das identificações) até a próxima carga completa
+                self.total_erros += 1
+                self.divergente = True
+                print(f"[POOL DE MATCHERS] Erro em '{operacao}' na réplica {self.numero}, réplica fora das identificações até a próxima carga: {e}")
+
+    def _add_template(self, unidade_id, fir, user_id):
+        shard = self._shards.get(unidade_id)
+        if shard is None:
+            shard = self._matcher_factory()
+            self._shards[unidade_id] = shard
+        shard.add_template(fir, user_id)
+
+    def _remove_template(self, unidade_id, user_id):
+        shard = self._shards.get(unidade_id)
+        if shard is not None:
+            shard.remove_template(user_id)
+
+    def _clear(self):
+        # Início de uma carga completa: daqui em diante recebe as mesmas alterações que as demais
+        for shard in self._shards.values():
+            shard.clear()
+        self.divergente = False
+
+    def _barreira(self):
+        return None
+
+    def _identify(self, fir, unidade_id, security_level):
+        # Retorna (user_id, buscou na unidade do terminal, buscou nas demais unidades)
+        self.total_identificacoes += 1
+        shard_terminal = self._shards.get(unidade_id) if unidade_id is not None else None
+        if shard_terminal is not None:
+            user_id = shard_terminal.identify(fir, security_level)
+            if user_id != 0:
+                return user_id, True, False
+
+        for shard in self._shards.values():
+            if shard is shard_terminal:
+                continue
+            user_id = shard.identify(fir, security_level)
+            if user_id != 0:
+                return user_id, shard_terminal is not None, True
+        return 0, shard_terminal is not None, True
+
+
+class MatcherPool:
+    """
+    Pool de réplicas isoladas da base de busca particionada por unidade.
+
+    Cadastros, remoções e limpezas são enviados a todas as réplicas, na
+    ordem em que foram feitos; cada identificação vai para a réplica com
+    menos identificações pendentes. Como cada réplica processa sua fila em
+    ordem, uma identificação sempre enxerga as alterações feitas antes dela.
+    Identificações simultâneas rodam em paralelo, uma por réplica.
+
+    Uma réplica em que uma alteração falhou deixa de receber identificações
+    até ser reconstruída pela próxima carga completa (clear).
+
+    Cada réplica cria um matcher por unidade; max_replicas limita o tamanho
+    do pool para backends em que cada matcher é caro (o NBioBSP cria um
+    objeto COM por matcher, ver NBIOBSP_MAX_REPLICAS).
+    """
+
+    def __init__(self, matcher_factory, tamanho=None, max_replicas=None):
+        tamanho = max(int(tamanho or MATCHER_POOL_SIZE), 1)
+        if max_replicas is not None and tamanho > max_replicas:
+            print(f"[POOL DE MATCHERS] {tamanho} réplicas configuradas, limitado a {max_replicas} pelo backend biométrico")
+            tamanho = max(max_replicas, 1)
+        self.tamanho = tamanho
+        self._lock = threading.Lock()
+        self._replicas = [_Replica(numero, matcher_factory) for numero in range(self.tamanho)]
+
+    def add_template(self, unidade_id, fir, user_id):
+        self._difundir("add_template", unidade_id, fir, user_id)
+
+    def remove_template(self, unidade_id, user_id):
+        self._difundir("remove_template", unidade_id, user_id)
+
+    def clear(self):
+        self._difundir("clear")
+
+    def encerrar(self):
+        """Encerra as réplicas depois de atenderem as operações já enviadas."""
+        self._difundir("encerrar")
+
+    def aguardar(self):
+        """Espera todas as réplicas aplicarem as alterações enviadas até aqui."""
+        futuros = []
+        for replica in self._replicas:
+            futuro = Future()
+            replica.enviar("barreira", futuro=futuro)
+            futuros.append(futuro)
+        for futuro in futuros:
+            futuro.result()
+
+    def identify(self, fir, unidade_id, security_level):
+        """Identifica em uma réplica livre; retorna (user_id, buscou_unidade, buscou_global)."""
+        futuro = self.submit(fir, unidade_id, security_level)
+        return futuro.result()
+
+    def submit(self, fir, unidade_id, security_level):
+        """Envia a identificação para a réplica menos ocupada e retorna o Future do resultado."""
+        futuro = Future()
+        with self._lock:
+            # Réplicas divergentes só atendem se não houver nenhuma íntegra
+            replicas = [r for r in self._replicas if not r.divergente] or self._replicas
+            replica = min(replicas, key=lambda r: r.pendentes)
+            replica.pendentes += 1
+        futuro.add_done_callback(lambda _: self._concluida(replica))
+        replica.enviar("identify", fir, unidade_id, security_level, futuro=futuro)
+        return futuro
+
+    def _concluida(self, replica):
+        with self._lock:
+            replica.pendentes -= 1
+
+    def _difundir(self, operacao, *args):
+        for replica in self._replicas:
+            replica.enviar(operacao, *args)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tamanho": self.tamanho,
+                "replicas": [
+                    {
+                        "pendentes": replica.pendentes,
+                        "fila": replica._fila.qsize(),
+                        "divergente": replica.divergente,
+                        "total_identificacoes": replica.total_identificacoes,
+                        "total_erros": replica.total_erros
+                    }
+                    for replica in self._replicas
+                ]
+            }
@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+
+from app.db.database import db_connection
+from app.services.gateway import node_gateway
+
+load_dotenv()
+
+# Endpoint do backend Node.js que envia os e-mails
+EMAIL_API_PATH = "/api/enviar-email"
+
+# Tempo máximo (segundos) de cada chamada ao endpoint de e-mail
+EMAIL_TIMEOUT_SECONDS = float(os.getenv("EMAIL_TIMEOUT_SECONDS", 10))
+
+# Notificações reservadas por vez pelo worker
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 20))
+
+# Intervalo (segundos) entre verificações da fila quando não há notificações novas
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", 5))
+
+# Tentativas antes de marcar a notificação como 'falha'
+OUTBOX_MAX_TENTATIVAS = int(os.getenv("OUTBOX_MAX_TENTATIVAS", 8))
+
+# Espera antes da nova tentativa: BACKOFF_BASE * 2^(tentativas - 1), limitada a BACKOFF_MAX
+OUTBOX_BACKOFF_BASE_SECONDS = 30
+OUTBOX_BACKOFF_MAX_SECONDS = 3600
+
+# Tempo (segundos) em que uma notificação fica reservada por um worker; se o
+# processo cair durante o envio, ela volta para a fila depois desse prazo
+OUTBOX_RESERVA_SECONDS = 300
+
+
+def enfileirar_email(cursor, subject, recipient, body):
+    """
+    Grava o e-mail na fila usando o cursor (e a transação) de quem chama.
+    O envio acontece depois do commit, pela thread do NotificationWorker.
+    """
+    if not recipient:
+        return None
+    cursor.execute("""
+        INSERT INTO notificacoes_outbox (assunto, destinatario, corpo)
+        VALUES (%s, %s, %s)
+        RETURNING id
+    """, (subject, recipient, body))
+    return cursor.fetchone()[0]
+
+
+def backoff_seconds(tentativas):
+    return min(OUTBOX_BACKOFF_BASE_SECONDS * 2 ** (tentativas - 1), OUTBOX_BACKOFF_MAX_SECONDS)
+
+
+class NotificationWorker:
+    """
+    Entrega em segundo plano os e-mails gravados em notificacoes_outbox.
+    Reserva lotes com FOR UPDATE SKIP LOCKED (vários processos podem rodar
+    o worker ao mesmo tempo), envia cada e-mail pelo node_gateway e
+    registra o resultado: 'enviado', nova tentativa com backoff ou 'falha'.
+    """
+
+    def __init__(self, gateway=node_gateway):
+        self._gateway = gateway
+        self._acordar = threading.Event()
+        self._thread = None
+        self.total_enviados = 0
+        self.total_erros = 0
+        self.total_falhas = 0
+        self.ultimo_envio_em = None
+
+    def start(self):
+        """Inicia a thread de entrega (uma única vez por processo)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="notification-outbox", daemon=True)
+        self._thread.start()
+
+    def notificar(self):
+        """Acorda o worker logo após o commit de uma nova notificação."""
+        self._acordar.set()
+
+    def _loop(self):
+        while True:
+            try:
+                # Lote cheio: provavelmente há mais notificações esperando
+                if self.processar_lote() >= OUTBOX_BATCH_SIZE:
+                    continue
+            except Exception as e:
+                print(f"[NOTIFICACOES] Erro ao processar a fila de e-mails: {e}")
+            self._acordar.wait(OUTBOX_POLL_SECONDS)
+            self._acordar.clear()
+
+    def processar_lote(self):
+        """Reserva e entrega um lote de notificações. Retorna quantas foram processadas."""
+        lote = self._reservar_lote()
+        resultados = [(notificacao[0], notificacao[4], self._enviar(*notificacao[1:4])) for notificacao in lote]
+        if resultados:
+            self._registrar_resultados(resultados)
+        return len(lote)
+
+    def _reservar_lote(self):
+        with db_connection() as conn:
+            if conn is None:
+                return []
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE notificacoes_outbox
+                SET status = 'enviando',
+                    tentativas = tentativas + 1,
+                    proxima_tentativa = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                WHERE id IN (
+                    SELECT id FROM notificacoes_outbox
+                    WHERE status IN ('pendente', 'enviando') AND proxima_tentativa <= CURRENT_TIMESTAMP
+                    ORDER BY proxima_tentativa, id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, assunto, destinatario, corpo, tentativas
+            """, (OUTBOX_RESERVA_SECONDS, OUTBOX_BATCH_SIZE))
+            lote = cursor.fetchall()
+            conn.commit()
+            cursor.close()
+        return lote
+
+    def _enviar(self, subject, recipient, body):
+        # Retorna None em caso de sucesso ou a mensagem de erro
+        try:
+            response = self._gateway.post(EMAIL_API_PATH, json={
+                "subject": subject,
+                "recipient": recipient,
+                "body": body
+            }, deadline=EMAIL_TIMEOUT_SECONDS)
+            response.raise_for_status()  # Lança exceção se o status não for 2xx
+            print(f"E-mail enviado para {recipient}")
+            return None
+        except requests.RequestException as e:
+            print(f"Erro ao enviar e-mail para {recipient}: {e}")
+            return str(e)
+
+    def _registrar_resultados(self, resultados):
+        enviados = [(notificacao_id,) for notificacao_id, _, erro in resultados if erro is None]
+        novas_tentativas = []
+        falhas = []
+        for notificacao_id, tentativas, erro in resultados:
+            if erro is None:
+                continue
+            if tentativas >= OUTBOX_MAX_TENTATIVAS:
+                falhas.append((erro, notificacao_id))
+            else:
+                novas_tentativas.append((backoff_seconds(tentativas), erro, notificacao_id))
+
+        with db_connection() as conn:
+            if conn is None:
+                # As notificações voltam para a fila quando a reserva expirar
+                return
+            cursor = conn.cursor()
+            cursor.executemany("""
+                UPDATE notificacoes_outbox
+                SET status = 'enviado', enviado_em = CURRENT_TIMESTAMP, ultimo_erro = NULL
+                WHERE id = %s
+            """, enviados)
+            cursor.executemany("""
+                UPDATE notificacoes_outbox
+                SET status = 'pendente', proxima_tentativa = CURRENT_TIMESTAMP + make_interval(secs => %s), ultimo_erro = %s
+                WHERE id = %s
+            """, novas_tentativas)
+            cursor.executemany("""
+                UPDATE notificacoes_outbox
+                SET status = 'falha', ultimo_erro = %s
+                WHERE id = %s
+            """, falhas)
+            conn.commit()
+            cursor.close()
+
+        self.total_enviados += len(enviados)
+        self.total_erros += len(novas_tentativas)
+        self.total_falhas += len(falhas)
+        if enviados:
+            self.ultimo_envio_em = time.strftime("%d/%m/%Y %H:%M:%S")
+
+    def stats(self):
+        return {
+            "total_enviados": self.total_enviados,
+            "total_erros": self.total_erros,
+            "total_falhas": self.total_falhas,
+            "ultimo_envio_em": self.ultimo_envio_em
+        }
+
+
+# Worker compartilhado pelo processo
+notification_worker = NotificationWorker()
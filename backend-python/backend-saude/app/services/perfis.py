@@ -0,0 +1,59 @@
+import os
+from collections import namedtuple
+
+from dotenv import load_dotenv
+
+from app.services.cache import TTLCache
+
+load_dotenv()
+
+# Validade (segundos) dos perfis de funcionários guardados em memória. Cadastros
+# feitos por este backend invalidam o perfil na hora; alterações feitas pelo
+# Node.js chegam pela sincronização do índice biométrico ou no fim do TTL.
+CACHE_FUNCIONARIO_TTL_SECONDS = float(os.getenv("CACHE_FUNCIONARIO_TTL_SECONDS", 60))
+
+# Validade (segundos) dos nomes das unidades
+CACHE_UNIDADE_TTL_SECONDS = float(os.getenv("CACHE_UNIDADE_TTL_SECONDS", 600))
+
+# Limite de entradas de cada cache; acima dele as usadas há mais tempo são descartadas
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+
+# Dados do funcionário usados na batida de ponto e na identificação
+Perfil = namedtuple("Perfil", "funcionario_id nome cpf unidade_id matricula cargo id_biometrico email tipo_escala status data_admissao")
+
+PERFIL_FUNCIONARIO_SQL = """
+    SELECT id, nome, cpf, unidade_id, matricula, cargo, id_biometrico, email, tipo_escala, status, data_admissao
+    FROM funcionarios WHERE id = %s
+"""
+
+funcionario_cache = TTLCache("funcionarios", CACHE_FUNCIONARIO_TTL_SECONDS, CACHE_MAX_ENTRIES)
+unidade_cache = TTLCache("unidades", CACHE_UNIDADE_TTL_SECONDS, CACHE_MAX_ENTRIES)
+
+
+def perfil_funcionario(cursor, funcionario_id):
+    """Perfil do funcionário (ou None), lido do banco com o cursor de quem chama na falta do cache."""
+    def carregar():
+        cursor.execute(PERFIL_FUNCIONARIO_SQL, (funcionario_id,))
+        row = cursor.fetchone()
+        return Perfil(*row) if row else None
+    return funcionario_cache.obter(int(funcionario_id), carregar)
+
+
+def nome_unidade(cursor, unidade_id):
+    """Nome da unidade (ou None)."""
+    if unidade_id is None:
+        return None
+
+    def carregar():
+        cursor.execute("SELECT nome FROM unidades WHERE id = %s", (unidade_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    return unidade_cache.obter(unidade_id, carregar)
+
+
+def invalidar_funcionario(*funcionario_ids):
+    funcionario_cache.invalidar(*(int(funcionario_id) for funcionario_id in funcionario_ids))
+
+
+def stats():
+    return {cache.nome: cache.stats() for cache in (funcionario_cache, unidade_cache)}
@@ -0,0 +1,86 @@
+import mmap
+import os
+import struct
+from datetime import datetime, timedelta
+
+# Formato do arquivo de snapshot do índice biométrico:
+#   cabeçalho: magic, versão, total de digitais, marca d'água (segundos desde 1970), última remoção
+#   entradas:  user_id, unidade_id (-1 = sem unidade), tipo, offset e tamanho da digital
+#   dados:     digitais binárias concatenadas
+SNAPSHOT_MAGIC = b"BIOSNAP\x00"
+SNAPSHOT_VERSION = 1
+
+_HEADER = struct.Struct("<8sIIdq")
+_ENTRY = struct.Struct("<qqBQI")
+
+TIPO_FUNCIONARIO = 0
+TIPO_VINCULO = 1
+
+_EPOCH = datetime(1970, 1, 1)
+_SEM_UNIDADE = -1
+
+
+def write_snapshot(path, entries, watermark, ultima_remocao):
+    """
+    Grava o snapshot de forma atômica (arquivo temporário + replace).
+    entries: lista de (user_id, unidade_id, tipo, digital em bytes).
+    """
+    cabecalho = _HEADER.pack(
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        len(entries),
+        (watermark - _EPOCH).total_seconds(),
+        int(ultima_remocao or 0)
+    )
+
+    offset = 0
+    tabela = bytearray()
+    for user_id, unidade_id, tipo, template in entries:
+        unidade = _SEM_UNIDADE if unidade_id is None else unidade_id
+        tabela += _ENTRY.pack(user_id, unidade, tipo, offset, len(template))
+        offset += len(template)
+
+    temporario = f"{path}.tmp"
+    with open(temporario, "wb") as arquivo:
+        arquivo.write(cabecalho)
+        arquivo.write(tabela)
+        for _, _, _, template in entries:
+            arquivo.write(template)
+        arquivo.flush()
+        os.fsync(arquivo.fileno())
+    os.replace(temporario, path)
+    return len(cabecalho) + len(tabela) + offset
+
+
+def read_snapshot(path):
+    """
+    Lê o snapshot via mmap. Retorna (watermark, ultima_remocao, entries)
+    ou None se o arquivo não existir ou for de outra versão/corrompido.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) < _HEADER.size:
+        return None
+
+    with open(path, "rb") as arquivo:
+        with mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as dados:
+            magic, versao, total, watermark, ultima_remocao = _HEADER.unpack_from(dados, 0)
+            if magic != SNAPSHOT_MAGIC or versao != SNAPSHOT_VERSION:
+                return None
+
+            inicio_dados = _HEADER.size + total * _ENTRY.size
+            if len(dados) < inicio_dados:
+                return None
+
+            entries = []
+            for posicao in range(total):
+                user_id, unidade_id, tipo, offset, tamanho = _ENTRY.unpack_from(dados, _HEADER.size + posicao * _ENTRY.size)
+                inicio = inicio_dados + offset
+                if inicio + tamanho > len(dados):
+                    return None
+                entries.append((
+                    user_id,
+                    None if unidade_id == _SEM_UNIDADE else unidade_id,
+                    tipo,
+                    dados[inicio:inicio + tamanho]
+                ))
+
+    return _EPOCH + timedelta(seconds=watermark), ultima_remocao, entries
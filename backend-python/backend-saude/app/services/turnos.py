@@ -0,0 +1,287 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime
+
+from dotenv import load_dotenv
+
+from app.db.database import db_connection
+
+load_dotenv()
+
+# Intervalo (segundos) da recarga completa do estado a partir do banco, que traz
+# as alterações feitas fora deste processo (outras instâncias, correções pelo
+# Node.js). 0 desativa o estado em memória: a decisão volta a consultar o banco.
+PONTO_ESTADO_REFRESH_SECONDS = int(os.getenv("PONTO_ESTADO_REFRESH_SECONDS", 30))
+
+# Entradas sem saída (de qualquer dia) e registros do dia corrente
+REGISTROS_ESTADO_SQL = """
+    SELECT funcionario_id, id, unidade_id, data_hora, hora_entrada, hora_saida FROM registros_ponto
+    WHERE (hora_saida IS NULL OR (data_hora >= %(dia)s AND data_hora < %(dia)s + INTERVAL '1 day'))
+"""
+
+RegistroPonto = namedtuple("RegistroPonto", "id unidade_id data_hora hora_entrada hora_saida")
+
+
+class TurnoFuncionario:
+    """Cópia do estado de um funcionário no dia, com as buscas usadas na decisão do ponto."""
+
+    def __init__(self, dia, abertos, fechados):
+        self.dia = dia
+        self.abertos = abertos  # entradas sem saída, de qualquer dia
+        self.fechados = fechados  # registros com saída do dia
+
+    def ultimo_aberto(self, unidade_id=None, desde=None):
+        """Última entrada sem saída, opcionalmente só da unidade e entre o dia desde e o dia corrente."""
+        candidatos = [
+            registro for registro in self.abertos
+            if (unidade_id is None or registro.unidade_id == unidade_id)
+            and (desde is None or desde <= registro.data_hora.date() <= self.dia)
+        ]
+        return _ultimo(candidatos)
+
+    def ultimo_do_dia(self):
+        """Último registro do dia, com ou sem saída."""
+        return _ultimo([registro for registro in self.abertos if registro.data_hora.date() == self.dia] + self.fechados)
+
+    def completo_no_dia(self, unidade_id):
+        """Se já há registro com entrada e saída no dia, na unidade."""
+        return any(registro.unidade_id == unidade_id and registro.hora_entrada is not None for registro in self.fechados)
+
+
+class OpenShiftState:
+    """
+    Turnos em aberto de todos os funcionários, em memória.
+
+    Guarda as entradas sem saída (de qualquer dia) e os registros já fechados
+    no dia corrente, carregados de uma vez na partida e atualizados a cada
+    batida gravada por este processo (write-through, depois do commit). Com
+    ele a decisão entre entrada e saída, e a resposta às batidas repetidas,
+    não precisam consultar registros_ponto.
+
+    Alterações feitas fora do processo chegam na recarga periódica; consultas
+    de outro dia que não o corrente retornam None e ficam com o banco.
+    """
+
+    def __init__(self, intervalo=PONTO_ESTADO_REFRESH_SECONDS):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._abertos = {}  # funcionario_id -> {registro_id: RegistroPonto}
+        self._fechados = {}  # funcionario_id -> {registro_id: RegistroPonto} do dia corrente
+        self._dia = None
+        self._durante_carga = None  # gravações feitas enquanto uma carga lê o banco, reaplicadas no fim
+        self._refresher = None
+        self.carregado = False
+        self.carregado_em = None
+        self.tempo_carga_ms = 0
+        self.total_consultas = 0
+        self.total_sem_estado = 0
+        self.total_gravacoes = 0
+        self.total_recargas = 0
+
+    @property
+    def habilitado(self):
+        return self.intervalo > 0
+
+    # ---------------------------
+    # Carga a partir do banco
+    # ---------------------------
+    def load(self):
+        """Recarrega o estado de todos os funcionários com uma única consulta."""
+        if not self.habilitado:
+            return
+        with db_connection() as conn:
+            if conn is None:
+                raise RuntimeError("Não foi possível conectar ao banco para carregar os turnos em aberto")
+            self._carregar(conn)
+
+    def recarregar(self, conn, funcionario_ids=None):
+        """
+        Relê do banco, com a conexão de quem chama, o estado dos funcionários
+        informados (ou de todos), depois de gravações que não passaram pelo
+        write-through. Em caso de erro o estado fica desativado até a próxima
+        recarga periódica, e a decisão volta a consultar o banco.
+        """
+        if not self.carregado:
+            return
+        try:
+            if funcionario_ids is None:
+                self._carregar(conn)
+                return
+            ids = sorted(set(funcionario_ids))
+            with self._lock:
+                dia = self._dia
+            cursor = conn.cursor()
+            cursor.execute(REGISTROS_ESTADO_SQL + " AND funcionario_id = ANY(%(ids)s)", {"dia": dia, "ids": ids})
+            linhas = cursor.fetchall()
+            cursor.close()
+        except Exception as e:
+            print(f"[TURNOS] Erro ao recarregar os turnos em aberto: {e}")
+            with self._lock:
+                self.carregado = False
+            return
+
+        with self._lock:
+            # Com uma carga completa lendo o banco, a recarga parcial é reaplicada
+            # sobre o resultado dela, que pode ter sido lido antes
+            if self._durante_carga is not None:
+                self._durante_carga.append((self._substituir, (ids, linhas)))
+            self._substituir(ids, linhas)
+
+    def _carregar(self, conn):
+        inicio = time.perf_counter()
+        dia = date.today()
+        with self._lock:
+            self._durante_carga = []
+        try:
+            cursor = conn.cursor()
+            cursor.execute(REGISTROS_ESTADO_SQL, {"dia": dia})
+            linhas = cursor.fetchall()
+            cursor.close()
+        except Exception:
+            with self._lock:
+                self._durante_carga = None
+            raise
+
+        abertos, fechados = {}, {}
+        for funcionario_id, *colunas in linhas:
+            registro = RegistroPonto(*colunas)
+            destino = abertos if registro.hora_saida is None else fechados
+            destino.setdefault(funcionario_id, {})[registro.id] = registro
+
+        with self._lock:
+            primeira_carga = not self.total_recargas
+            self._abertos, self._fechados, self._dia = abertos, fechados, dia
+            # Batidas gravadas enquanto a consulta rodava podem não estar no resultado
+            for operacao, argumentos in self._durante_carga:
+                operacao(*argumentos)
+            self._durante_carga = None
+            self.carregado = True
+            self.carregado_em = datetime.now()
+            self.tempo_carga_ms = (time.perf_counter() - inicio) * 1000
+            self.total_recargas += 1
+            total_abertos = sum(len(registros) for registros in self._abertos.values())
+
+        if primeira_carga:
+            print(f"[TURNOS] {total_abertos} entrada(s) sem saída de {len(abertos)} funcionário(s) carregadas em {self.tempo_carga_ms:.0f} ms")
+
+    def start_refresher(self):
+        """Inicia a thread que recarrega o estado periodicamente."""
+        if not self.habilitado or self._refresher is not None:
+            return
+
+        def _loop():
+            while True:
+                time.sleep(self.intervalo)
+                try:
+                    self.load()
+                except Exception as e:
+                    print(f"[TURNOS] Erro ao recarregar os turnos em aberto: {e}")
+
+        self._refresher = threading.Thread(target=_loop, name="open-shift-refresher", daemon=True)
+        self._refresher.start()
+
+    # ---------------------------
+    # Consulta
+    # ---------------------------
+    def consultar(self, funcionario_id, dia):
+        """
+        TurnoFuncionario do funcionário no dia, ou None quando o estado não
+        pode responder (não carregado ou dia diferente do corrente) e a
+        decisão deve consultar o banco.
+        """
+        with self._lock:
+            self._virar_dia()
+            if not self.carregado or dia != self._dia:
+                self.total_sem_estado += 1
+                return None
+            self.total_consultas += 1
+            return TurnoFuncionario(
+                dia,
+                list(self._abertos.get(funcionario_id, {}).values()),
+                list(self._fechados.get(funcionario_id, {}).values())
+            )
+
+    # ---------------------------
+    # Write-through das batidas gravadas
+    # ---------------------------
+    def abrir(self, funcionario_id, registro_id, unidade_id, data_hora, hora_entrada):
+        """Entrada gravada (sem saída)."""
+        self._gravar(self._abrir, (funcionario_id, RegistroPonto(registro_id, unidade_id, data_hora, hora_entrada, None)))
+
+    def fechar(self, funcionario_id, registro_id, hora_saida):
+        """Saída gravada na entrada registro_id."""
+        self._gravar(self._fechar, (funcionario_id, registro_id, hora_saida))
+
+    def _gravar(self, operacao, argumentos):
+        with self._lock:
+            if not self.carregado and self._durante_carga is None:
+                return
+            self.total_gravacoes += 1
+            if self._durante_carga is not None:
+                self._durante_carga.append((operacao, argumentos))
+            if self.carregado:
+                operacao(*argumentos)
+
+    def _abrir(self, funcionario_id, registro):
+        # Chamado com o lock
+        self._fechados.get(funcionario_id, {}).pop(registro.id, None)
+        self._abertos.setdefault(funcionario_id, {})[registro.id] = registro
+
+    def _fechar(self, funcionario_id, registro_id, hora_saida):
+        # Chamado com o lock; a saída sem a entrada no estado (já fechada pela recarga) é ignorada
+        registro = self._abertos.get(funcionario_id, {}).pop(registro_id, None)
+        if registro is not None:
+            self._guardar(funcionario_id, registro._replace(hora_saida=hora_saida))
+
+    def _substituir(self, funcionario_ids, linhas):
+        # Chamado com o lock: o estado dos funcionários passa a ser o das linhas relidas
+        for funcionario_id in funcionario_ids:
+            self._abertos.pop(funcionario_id, None)
+            self._fechados.pop(funcionario_id, None)
+        for funcionario_id, *colunas in linhas:
+            self._guardar(funcionario_id, RegistroPonto(*colunas))
+
+    def _guardar(self, funcionario_id, registro):
+        # Chamado com o lock: registros com saída só interessam no dia corrente
+        if registro.hora_saida is None:
+            self._abertos.setdefault(funcionario_id, {})[registro.id] = registro
+        elif registro.data_hora.date() == self._dia:
+            self._fechados.setdefault(funcionario_id, {})[registro.id] = registro
+
+    def _virar_dia(self):
+        # Chamado com o lock: na virada do dia os registros fechados deixam de ser do dia corrente
+        hoje = date.today()
+        if self.carregado and self._dia != hoje:
+            self._fechados = {}
+            self._dia = hoje
+
+    def stats(self):
+        with self._lock:
+            return {
+                "habilitado": self.habilitado,
+                "carregado": self.carregado,
+                "dia": self._dia.isoformat() if self._dia else None,
+                "funcionarios_com_entrada_aberta": sum(1 for registros in self._abertos.values() if registros),
+                "entradas_abertas": sum(len(registros) for registros in self._abertos.values()),
+                "registros_fechados_no_dia": sum(len(registros) for registros in self._fechados.values()),
+                "carregado_em": self.carregado_em.isoformat() if self.carregado_em else None,
+                "tempo_carga_ms": round(self.tempo_carga_ms, 1),
+                "intervalo_recarga_segundos": self.intervalo,
+                "total_consultas": self.total_consultas,
+                "total_sem_estado": self.total_sem_estado,
+                "total_gravacoes": self.total_gravacoes,
+                "total_recargas": self.total_recargas
+            }
+
+
+def _ultimo(registros):
+    # Mesma ordem das consultas da decisão: data_hora, depois hora_entrada e id
+    if not registros:
+        return None
+    return max(registros, key=lambda registro: (registro.data_hora, registro.hora_entrada or datetime.min.time(), registro.id))
+
+
+# Turnos em aberto compartilhados pelo processo
+open_shift_state = OpenShiftState()
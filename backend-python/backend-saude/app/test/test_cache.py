@@ -0,0 +1,54 @@
+from unittest.mock import patch
+
+from app.services.cache import TTLCache
+
+
+def test_hit_miss_e_none_nao_guardado():
+    cache = TTLCache("teste", ttl=60, max_entradas=10)
+    assert cache.obter(1, lambda: "a") == "a"
+    assert cache.obter(1, lambda: "b") == "a"
+    assert cache.obter(2, lambda: None) is None
+    assert cache.obter(2, lambda: "c") == "c"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 3)
+
+
+def test_ttl_vencido_recarrega():
+    cache = TTLCache("teste", ttl=60, max_entradas=10)
+    with patch("app.services.cache.time.monotonic", return_value=1000.0):
+        cache.obter(1, lambda: "a")
+    with patch("app.services.cache.time.monotonic", return_value=1061.0):
+        assert cache.obter(1, lambda: "b") == "b"
+
+
+def test_descarta_a_usada_ha_mais_tempo():
+    cache = TTLCache("teste", ttl=60, max_entradas=2)
+    cache.obter(1, lambda: "a")
+    cache.obter(2, lambda: "b")
+    cache.obter(1, lambda: "x")  # 1 passa a ser a usada mais recentemente
+    cache.obter(3, lambda: "c")
+    assert cache.obter(1, lambda: "x") == "a"
+    assert cache.obter(2, lambda: "novo") == "novo"
+    assert cache.stats()["total_descartes"] == 2
+
+
+def test_invalidacao_durante_a_carga_nao_guarda_valor_antigo():
+    cache = TTLCache("teste", ttl=60, max_entradas=10)
+
+    def carga_lenta():
+        # Cadastro alterado enquanto a consulta lia o banco
+        cache.invalidar(1)
+        return "antigo"
+    assert cache.obter(1, carga_lenta) == "antigo"
+    assert cache.obter(1, lambda: "novo") == "novo"
+
+
+def test_invalidar_sem_chaves_nao_descarta_carga_em_andamento():
+    cache = TTLCache("teste", ttl=60, max_entradas=10)
+
+    def carga():
+        # Sincronização sem cadastros alterados no meio da consulta
+        cache.invalidar()
+        return "a"
+    cache.obter(1, carga)
+    assert cache.obter(1, lambda: "b") == "a"
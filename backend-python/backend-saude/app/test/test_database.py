@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+from unittest.mock import MagicMock
+from psycopg2 import extensions
+
+from app.db.database import ConnectionPool, PoolTimeout
+
+
+def criar_pool(**kwargs):
+    pool = ConnectionPool(**{"minconn": 1, "maxconn": 2, "timeout": 0.2, "recycle": 1800, "ping_after": 30, **kwargs})
+    abertas = []
+
+    def abrir():
+        conn = MagicMock(closed=0)
+        conn.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_IDLE
+        abertas.append(conn)
+        return conn
+
+    pool._abrir = abrir
+    return pool, abertas
+
+
+def test_reutiliza_conexao_devolvida():
+    pool, abertas = criar_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert len(abertas) == 1
+    assert pool.stats()["em_uso"] == 1
+
+
+def test_limite_de_conexoes_e_espera():
+    pool, _ = criar_pool()
+    a = pool.getconn()
+    pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert pool.stats()["total_timeouts"] == 1
+
+    # Uma conexão devolvida por outra thread libera quem está aguardando
+    threading.Timer(0.05, pool.putconn, args=(a,)).start()
+    assert pool.getconn() is a
+
+
+def test_descarta_conexao_fechada_e_desfaz_transacao():
+    pool, abertas = criar_pool()
+    conn = pool.getconn()
+    conn.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+    conn.rollback.assert_called_once()
+
+    conn.closed = 1
+    assert pool.getconn() is not conn
+    assert len(abertas) == 2
+    assert pool.stats()["total_descartes"] == 1
@@ -0,0 +1,63 @@
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+
+from app.services.ferias import VacationIndex
+
+
+def _banco(*resultados):
+    # db_connection() cujo cursor devolve, em ordem, os resultados de fetchone (tuplas) e fetchall (listas)
+    contexto = MagicMock()
+    cursor = contexto.__enter__.return_value.cursor.return_value
+    cursor.fetchone.side_effect = [r for r in resultados if isinstance(r, tuple)]
+    cursor.fetchall.side_effect = [r for r in resultados if isinstance(r, list)]
+    return contexto
+
+
+@patch('app.services.ferias.db_connection')
+def test_periodos_unidos_e_busca_por_dia(mock_db):
+    mock_db.return_value = _banco(
+        (datetime(2025, 7, 1),), (True,), (0,),
+        [
+            (1, date(2025, 7, 10), date(2025, 7, 20)),
+            (1, date(2025, 7, 15), date(2025, 7, 25)),  # sobreposto
+            (1, date(2025, 7, 26), date(2025, 7, 30)),  # contíguo
+            (1, date(2025, 1, 5), date(2025, 1, 9)),
+            (2, date(2025, 7, 1), date(2025, 7, 2)),
+        ]
+    )
+    indice = VacationIndex(intervalo=30)
+    indice.load()
+
+    assert indice.stats()["total_periodos"] == 3
+    assert indice.de_ferias(1, date(2025, 7, 28))
+    assert indice.de_ferias(1, date(2025, 1, 5))
+    assert not indice.de_ferias(1, date(2025, 7, 31))
+    assert not indice.de_ferias(1, date(2025, 3, 1))
+    assert not indice.de_ferias(3, date(2025, 7, 15))
+    assert indice.em_ferias([(1, date(2025, 7, 9)), (1, date(2025, 7, 10)), (2, date(2025, 7, 2))]) == {
+        (1, date(2025, 7, 10)), (2, date(2025, 7, 2))
+    }
+
+
+@patch('app.services.ferias.db_connection')
+def test_sincronizacao_substitui_funcionarios_alterados(mock_db):
+    mock_db.side_effect = [
+        _banco((datetime(2025, 7, 1),), (True,), (0,),
+               [(1, date(2025, 7, 10), date(2025, 7, 20)), (2, date(2025, 7, 1), date(2025, 7, 5))]),
+        # Funcionário 1 com o período alterado; férias do funcionário 2 excluídas
+        _banco((datetime(2025, 7, 2),), [(1,)], [(7, 2)], [(1, date(2025, 7, 12), date(2025, 7, 14))]),
+    ]
+    indice = VacationIndex(intervalo=30)
+    indice.load()
+
+    assert indice.refresh() == 2
+    assert not indice.de_ferias(1, date(2025, 7, 10))
+    assert indice.de_ferias(1, date(2025, 7, 13))
+    assert not indice.de_ferias(2, date(2025, 7, 3))
+    assert indice._ultima_remocao == 7
+
+
+def test_sem_carga_devolve_none():
+    indice = VacationIndex(intervalo=30)
+    assert indice.de_ferias(1, date(2025, 7, 10)) is None
+    assert indice.em_ferias([(1, date(2025, 7, 10))]) is None
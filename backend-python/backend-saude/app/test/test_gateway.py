@@ -0,0 +1,54 @@
+import pytest
+import requests
+from unittest.mock import MagicMock
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from app.services.gateway import CircuitBreaker, CircuitOpenError, GatewayClient, LatencyHistogram
+
+
+def criar_gateway(respostas, retries=2, falhas_para_abrir=5):
+    gateway = GatewayClient(base_url="http://node", retries=retries, breaker=CircuitBreaker(falhas_para_abrir, 60))
+    gateway._session = MagicMock()
+    gateway._session.post.side_effect = respostas
+    return gateway
+
+
+def erro_de_conexao():
+    motivo = NewConnectionError(None, "Connection refused")
+    return requests.ConnectionError(MaxRetryError(None, "/reg", motivo))
+
+
+def test_repete_quando_conexao_nao_foi_estabelecida():
+    resposta = MagicMock(status_code=201)
+    gateway = criar_gateway([erro_de_conexao(), resposta])
+    assert gateway.post("/reg/calcular-registro-ponto", json={}) is resposta
+    assert gateway.stats()["endpoints"]["/reg/calcular-registro-ponto"]["tentativas_extras"] == 1
+
+
+def test_nao_repete_timeout_de_leitura_em_chamada_nao_idempotente():
+    gateway = criar_gateway([requests.ReadTimeout("lento"), MagicMock(status_code=201)])
+    with pytest.raises(requests.ReadTimeout):
+        gateway.post("/reg/calcular-registro-ponto", json={})
+    assert gateway._session.post.call_count == 1
+
+
+def test_circuito_abre_e_falha_rapido():
+    gateway = criar_gateway([requests.ReadTimeout("lento")] * 2, retries=0, falhas_para_abrir=2)
+    for _ in range(2):
+        with pytest.raises(requests.ReadTimeout):
+            gateway.post("/reg/calcular-registro-ponto", json={})
+    with pytest.raises(CircuitOpenError):
+        gateway.post("/reg/calcular-registro-ponto", json={})
+    assert gateway._session.post.call_count == 2
+    assert gateway.stats()["circuito"]["estado"] == "aberto"
+
+
+def test_histograma_de_latencia():
+    histograma = LatencyHistogram()
+    for ms in (3, 8, 40, 40, 20000):
+        histograma.observe(ms)
+    snapshot = histograma.snapshot()
+    assert snapshot["total"] == 5
+    assert snapshot["p50_ms"] == 50
+    assert snapshot["p99_ms"] is None
+    assert snapshot["faixas_ms"][">10000"] == 1
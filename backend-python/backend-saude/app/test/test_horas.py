@@ -0,0 +1,217 @@
+import importlib.util
+from datetime import datetime, time
+from pathlib import Path
+
+import pytest
+
+from app.services.horas import calcular_horas, formatar_intervalo, hora_saida_automatica
+
+# Módulo equivalente do backend-assistencia (mesmas regras, intervalos com minutos)
+_spec = importlib.util.spec_from_file_location(
+    "horas_assistencia",
+    Path(__file__).resolve().parents[3] / "backend-assistencia" / "app" / "services" / "horas.py"
+)
+horas_assistencia = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(horas_assistencia)
+
+CAMPOS = ("horas_normais", "hora_extra", "hora_desconto", "total_trabalhado", "hora_saida_ajustada")
+
+# Saídas gravadas do backend Node.js: intervalos enviados no UPDATE de
+# registros_ponto por calcularERegistrarPonto (saúde) e
+# calcularERegistrarPontoAssistencia, para cada escala e
+# (entrada do registro, data/hora da saída enviada).
+NODE_SAUDE = [
+    ("8h", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("8:00:00", "0:00:00", "0:00:00", "8:00:00", "9:00:00")),
+    ("8h", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "7:30:00", "0:30:00", "0:30:00")),
+    ("8h", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("8:00:00", "3:32:31", "0:00:00", "11:32:31", "12:32:31")),
+    ("8h", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("7:00:00", "0:00:00", "1:00:00", "7:00:00", "8:00:00")),
+    ("8h", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("8:00:00", "14:50:00", "0:00:00", "22:50:00", "23:50:00")),
+    ("8h", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("8:00:00", "15:00:00", "0:00:00", "23:00:00", "24:00:00")),
+    ("8h", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("8:00:00", "15:03:30", "0:00:00", "23:03:30", "24:03:30")),
+    ("8h", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "7:10:00", "0:50:00", "0:50:00")),
+    ("8h", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("7:59:39", "0:00:00", "0:00:21", "7:59:39", "8:59:39")),
+    ("12h", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("8:00:00", "0:00:00", "4:00:00", "8:00:00", "9:00:00")),
+    ("12h", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "11:30:00", "0:30:00", "0:30:00")),
+    ("12h", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("11:32:31", "0:00:00", "0:27:29", "11:32:31", "12:32:31")),
+    ("12h", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("7:00:00", "0:00:00", "5:00:00", "7:00:00", "8:00:00")),
+    ("12h", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("12:00:00", "10:50:00", "0:00:00", "22:50:00", "23:50:00")),
+    ("12h", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("12:00:00", "11:00:00", "0:00:00", "23:00:00", "24:00:00")),
+    ("12h", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("12:00:00", "11:03:30", "0:00:00", "23:03:30", "24:03:30")),
+    ("12h", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "11:10:00", "0:50:00", "0:50:00")),
+    ("12h", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("7:59:39", "0:00:00", "4:00:21", "7:59:39", "8:59:39")),
+    ("16h", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("7:00:00", "0:00:00", "9:00:00", "7:00:00", "9:00:00")),
+    ("16h", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "15:30:00", "0:30:00", "0:30:00")),
+    ("16h", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("10:32:31", "0:00:00", "5:27:29", "10:32:31", "12:32:31")),
+    ("16h", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("6:00:00", "0:00:00", "10:00:00", "6:00:00", "8:00:00")),
+    ("16h", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("16:00:00", "5:50:00", "0:00:00", "21:50:00", "23:50:00")),
+    ("16h", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("16:00:00", "6:00:00", "0:00:00", "22:00:00", "24:00:00")),
+    ("16h", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("16:00:00", "6:03:30", "0:00:00", "22:03:30", "24:03:30")),
+    ("16h", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "15:10:00", "0:50:00", "0:50:00")),
+    ("16h", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("6:59:39", "0:00:00", "9:00:21", "6:59:39", "8:59:39")),
+    ("24h", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("7:00:00", "0:00:00", "15:00:00", "7:00:00", "9:00:00")),
+    ("24h", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "21:30:00", "0:30:00", "0:30:00")),
+    ("24h", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("10:32:31", "0:00:00", "11:27:29", "10:32:31", "12:32:31")),
+    ("24h", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("6:00:00", "0:00:00", "16:00:00", "6:00:00", "8:00:00")),
+    ("24h", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("21:50:00", "0:00:00", "0:10:00", "21:50:00", "23:50:00")),
+    ("24h", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("22:00:00", "0:00:00", "0:00:00", "22:00:00", "24:00:00")),
+    ("24h", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("22:00:00", "0:03:30", "0:00:00", "22:03:30", "24:03:30")),
+    ("24h", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "21:10:00", "0:50:00", "0:50:00")),
+    ("24h", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("6:59:39", "0:00:00", "15:00:21", "6:59:39", "8:59:39")),
+    ("12x36", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("9:00:00", "0:00:00", "3:00:00", "9:00:00", "9:00:00")),
+    ("12x36", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "11:30:00", "0:30:00", "0:30:00")),
+    ("12x36", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("12:00:00", "0:32:31", "0:00:00", "12:32:31", "12:32:31")),
+    ("12x36", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("8:00:00", "0:00:00", "4:00:00", "8:00:00", "8:00:00")),
+    ("12x36", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("12:00:00", "11:50:00", "0:00:00", "23:50:00", "23:50:00")),
+    ("12x36", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("12:00:00", "12:00:00", "0:00:00", "24:00:00", "24:00:00")),
+    ("12x36", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("12:00:00", "12:03:30", "0:00:00", "24:03:30", "24:03:30")),
+    ("12x36", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "11:10:00", "0:50:00", "0:50:00")),
+    ("12x36", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("8:59:39", "0:00:00", "3:00:21", "8:59:39", "8:59:39")),
+    ("24x72", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("7:00:00", "0:00:00", "15:00:00", "7:00:00", "9:00:00")),
+    ("24x72", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "21:30:00", "0:30:00", "0:30:00")),
+    ("24x72", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("10:32:31", "0:00:00", "11:27:29", "10:32:31", "12:32:31")),
+    ("24x72", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("6:00:00", "0:00:00", "16:00:00", "6:00:00", "8:00:00")),
+    ("24x72", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("21:50:00", "0:00:00", "0:10:00", "21:50:00", "23:50:00")),
+    ("24x72", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("22:00:00", "0:00:00", "0:00:00", "22:00:00", "24:00:00")),
+    ("24x72", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("22:00:00", "0:03:30", "0:00:00", "22:03:30", "24:03:30")),
+    ("24x72", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "21:10:00", "0:50:00", "0:50:00")),
+    ("24x72", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("6:59:39", "0:00:00", "15:00:21", "6:59:39", "8:59:39")),
+    ("32h", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("9:00:00", "0:00:00", "23:00:00", "9:00:00", "9:00:00")),
+    ("32h", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "31:30:00", "0:30:00", "0:30:00")),
+    ("32h", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("12:32:31", "0:00:00", "19:27:29", "12:32:31", "12:32:31")),
+    ("32h", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("8:00:00", "0:00:00", "24:00:00", "8:00:00", "8:00:00")),
+    ("32h", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("23:50:00", "0:00:00", "8:10:00", "23:50:00", "23:50:00")),
+    ("32h", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("24:00:00", "0:00:00", "8:00:00", "24:00:00", "24:00:00")),
+    ("32h", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("24:03:30", "0:00:00", "7:56:30", "24:03:30", "24:03:30")),
+    ("32h", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "31:10:00", "0:50:00", "0:50:00")),
+    ("32h", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("8:59:39", "0:00:00", "23:00:21", "8:59:39", "8:59:39")),
+    ("20h", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("9:00:00", "0:00:00", "11:00:00", "9:00:00", "9:00:00")),
+    ("20h", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "19:30:00", "0:30:00", "0:30:00")),
+    ("20h", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("12:32:31", "0:00:00", "7:27:29", "12:32:31", "12:32:31")),
+    ("20h", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("8:00:00", "0:00:00", "12:00:00", "8:00:00", "8:00:00")),
+    ("20h", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("20:00:00", "3:50:00", "0:00:00", "23:50:00", "23:50:00")),
+    ("20h", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("20:00:00", "4:00:00", "0:00:00", "24:00:00", "24:00:00")),
+    ("20h", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("20:00:00", "4:03:30", "0:00:00", "24:03:30", "24:03:30")),
+    ("20h", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "19:10:00", "0:50:00", "0:50:00")),
+    ("20h", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("8:59:39", "0:00:00", "11:00:21", "8:59:39", "8:59:39")),
+]
+NODE_ASSISTENCIA = [
+    ("8h", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("8:00:00", "0:00:00", "0:00:00", "8:00:00", "9:00:00")),
+    ("8h", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "7:30:00", "0:30:00", "0:30:00")),
+    ("8h", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("8:00:00", "3:33:00", "0:00:00", "11:33:00", "12:33:00")),
+    ("8h", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("7:00:00", "0:00:00", "1:00:00", "7:00:00", "8:00:00")),
+    ("8h", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("8:00:00", "14:50:00", "0:00:00", "22:50:00", "23:50:00")),
+    ("8h", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("8:00:00", "15:00:00", "0:00:00", "23:00:00", "24:00:00")),
+    ("8h", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("8:00:00", "15:04:00", "0:00:00", "23:04:00", "24:04:00")),
+    ("8h", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "7:10:00", "0:50:00", "0:50:00")),
+    ("8h", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("7:60:00", "0:00:00", "0:00:00", "7:60:00", "8:60:00")),
+    ("12h", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("8:00:00", "0:00:00", "4:00:00", "8:00:00", "9:00:00")),
+    ("12h", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "11:30:00", "0:30:00", "0:30:00")),
+    ("12h", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("11:33:00", "0:00:00", "0:27:00", "11:33:00", "12:33:00")),
+    ("12h", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("7:00:00", "0:00:00", "5:00:00", "7:00:00", "8:00:00")),
+    ("12h", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("12:00:00", "10:50:00", "0:00:00", "22:50:00", "23:50:00")),
+    ("12h", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("12:00:00", "11:00:00", "0:00:00", "23:00:00", "24:00:00")),
+    ("12h", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("12:00:00", "11:04:00", "0:00:00", "23:04:00", "24:04:00")),
+    ("12h", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "11:10:00", "0:50:00", "0:50:00")),
+    ("12h", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("7:60:00", "0:00:00", "4:00:00", "7:60:00", "8:60:00")),
+    ("16h", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("7:00:00", "0:00:00", "9:00:00", "7:00:00", "9:00:00")),
+    ("16h", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "15:30:00", "0:30:00", "0:30:00")),
+    ("16h", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("10:33:00", "0:00:00", "5:27:00", "10:33:00", "12:33:00")),
+    ("16h", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("6:00:00", "0:00:00", "10:00:00", "6:00:00", "8:00:00")),
+    ("16h", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("16:00:00", "5:50:00", "0:00:00", "21:50:00", "23:50:00")),
+    ("16h", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("16:00:00", "6:00:00", "0:00:00", "22:00:00", "24:00:00")),
+    ("16h", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("16:00:00", "6:04:00", "0:00:00", "22:04:00", "24:04:00")),
+    ("16h", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "15:10:00", "0:50:00", "0:50:00")),
+    ("16h", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("6:60:00", "0:00:00", "9:00:00", "6:60:00", "8:60:00")),
+    ("24h", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("7:00:00", "0:00:00", "15:00:00", "7:00:00", "9:00:00")),
+    ("24h", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "21:30:00", "0:30:00", "0:30:00")),
+    ("24h", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("10:33:00", "0:00:00", "11:27:00", "10:33:00", "12:33:00")),
+    ("24h", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("6:00:00", "0:00:00", "16:00:00", "6:00:00", "8:00:00")),
+    ("24h", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("21:50:00", "0:00:00", "0:10:00", "21:50:00", "23:50:00")),
+    ("24h", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("22:00:00", "0:00:00", "0:00:00", "22:00:00", "24:00:00")),
+    ("24h", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("22:00:00", "0:04:00", "0:00:00", "22:04:00", "24:04:00")),
+    ("24h", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "21:10:00", "0:50:00", "0:50:00")),
+    ("24h", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("6:60:00", "0:00:00", "15:00:00", "6:60:00", "8:60:00")),
+    ("12x36", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("9:00:00", "0:00:00", "3:00:00", "9:00:00", "9:00:00")),
+    ("12x36", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "11:30:00", "0:30:00", "0:30:00")),
+    ("12x36", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("12:00:00", "0:33:00", "0:00:00", "12:33:00", "12:33:00")),
+    ("12x36", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("8:00:00", "0:00:00", "4:00:00", "8:00:00", "8:00:00")),
+    ("12x36", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("12:00:00", "11:50:00", "0:00:00", "23:50:00", "23:50:00")),
+    ("12x36", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("12:00:00", "12:00:00", "0:00:00", "24:00:00", "24:00:00")),
+    ("12x36", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("12:00:00", "12:04:00", "0:00:00", "24:04:00", "24:04:00")),
+    ("12x36", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "11:10:00", "0:50:00", "0:50:00")),
+    ("12x36", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("8:60:00", "0:00:00", "3:00:00", "8:60:00", "8:60:00")),
+    ("24x72", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("7:00:00", "0:00:00", "15:00:00", "7:00:00", "9:00:00")),
+    ("24x72", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "21:30:00", "0:30:00", "0:30:00")),
+    ("24x72", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("10:33:00", "0:00:00", "11:27:00", "10:33:00", "12:33:00")),
+    ("24x72", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("6:00:00", "0:00:00", "16:00:00", "6:00:00", "8:00:00")),
+    ("24x72", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("21:50:00", "0:00:00", "0:10:00", "21:50:00", "23:50:00")),
+    ("24x72", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("22:00:00", "0:00:00", "0:00:00", "22:00:00", "24:00:00")),
+    ("24x72", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("22:00:00", "0:04:00", "0:00:00", "22:04:00", "24:04:00")),
+    ("24x72", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "21:10:00", "0:50:00", "0:50:00")),
+    ("24x72", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("6:60:00", "0:00:00", "15:00:00", "6:60:00", "8:60:00")),
+    ("32h", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("9:00:00", "0:00:00", "23:00:00", "9:00:00", "9:00:00")),
+    ("32h", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "31:30:00", "0:30:00", "0:30:00")),
+    ("32h", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("12:33:00", "0:00:00", "19:27:00", "12:33:00", "12:33:00")),
+    ("32h", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("8:00:00", "0:00:00", "24:00:00", "8:00:00", "8:00:00")),
+    ("32h", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("23:50:00", "0:00:00", "8:10:00", "23:50:00", "23:50:00")),
+    ("32h", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("24:00:00", "0:00:00", "8:00:00", "24:00:00", "24:00:00")),
+    ("32h", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("24:04:00", "0:00:00", "7:56:00", "24:04:00", "24:04:00")),
+    ("32h", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "31:10:00", "0:50:00", "0:50:00")),
+    ("32h", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("8:60:00", "0:00:00", "23:00:00", "8:60:00", "8:60:00")),
+    ("20h", "2025-06-18 08:00:00", "2025-06-18 17:00:00", ("9:00:00", "0:00:00", "11:00:00", "9:00:00", "9:00:00")),
+    ("20h", "2025-06-18 08:00:00", "2025-06-18 08:30:00", ("0:30:00", "0:00:00", "19:30:00", "0:30:00", "0:30:00")),
+    ("20h", "2025-06-18 07:12:31", "2025-06-18 19:45:02", ("12:33:00", "0:00:00", "7:27:00", "12:33:00", "12:33:00")),
+    ("20h", "2025-06-18 22:00:00", "2025-06-18 06:00:00", ("8:00:00", "0:00:00", "12:00:00", "8:00:00", "8:00:00")),
+    ("20h", "2025-06-18 08:10:00", "2025-06-19 08:00:00", ("20:00:00", "3:50:00", "0:00:00", "23:50:00", "23:50:00")),
+    ("20h", "2025-06-18 08:00:00", "2025-06-18 08:00:00", ("20:00:00", "4:00:00", "0:00:00", "24:00:00", "24:00:00")),
+    ("20h", "2025-06-18 06:59:45", "2025-06-19 07:03:15", ("20:00:00", "4:04:00", "0:00:00", "24:04:00", "24:04:00")),
+    ("20h", "2025-06-18 08:00:00", "2025-06-18 08:50:00", ("0:50:00", "0:00:00", "19:10:00", "0:50:00", "0:50:00")),
+    ("20h", "2025-06-18 13:00:20", "2025-06-18 21:59:59", ("8:60:00", "0:00:00", "11:00:00", "8:60:00", "8:60:00")),
+]
+
+
+def _datetime(texto):
+    return datetime.strptime(texto, "%Y-%m-%d %H:%M:%S")
+
+
+def _sem_minuto_60(intervalo):
+    # O Node.js gerava 'H:60:00' (rejeitado pelo PostgreSQL); o cálculo em
+    # Python passa o minuto para a hora seguinte
+    h, m, s = intervalo.split(":")
+    return f"{int(h) + 1}:00:{s}" if m == "60" else intervalo
+
+
+@pytest.mark.parametrize("escala,entrada,saida,esperado", NODE_SAUDE)
+def test_paridade_node_saude(escala, entrada, saida, esperado):
+    horas = calcular_horas(escala, _datetime(entrada), _datetime(saida))
+    assert tuple(horas[campo] for campo in CAMPOS) == esperado
+
+
+@pytest.mark.parametrize("escala,entrada,saida,esperado", NODE_ASSISTENCIA)
+def test_paridade_node_assistencia(escala, entrada, saida, esperado):
+    horas = horas_assistencia.calcular_horas(escala, _datetime(entrada), _datetime(saida))
+    assert tuple(horas[campo] for campo in CAMPOS) == tuple(_sem_minuto_60(valor) for valor in esperado)
+
+
+def test_todas_as_escalas_cobertas():
+    escalas = {'8h', '12h', '16h', '24h', '12x36', '24x72', '32h', '20h'}
+    assert {caso[0] for caso in NODE_SAUDE} == escalas
+    assert {caso[0] for caso in NODE_ASSISTENCIA} == escalas
+
+
+def test_formatar_intervalo():
+    assert formatar_intervalo(0) == "0:00:00"
+    assert formatar_intervalo(24 * 3600 + 61) == "24:01:01"
+    assert horas_assistencia.formatar_intervalo(7 + 59.5 / 60) == "8:00:00"
+
+
+@pytest.mark.parametrize("hora_entrada,esperado", [
+    # Saídas atribuídas pelo Node.js a entradas esquecidas
+    (time(8, 7, 42), "08:17:00"),
+    (time(23, 55), "00:05:00"),
+    (time(23, 50), "00:00:00"),
+    (time(12, 59, 59), "13:09:00"),
+    (time(0, 0), "00:10:00"),
+])
+def test_hora_saida_automatica(hora_entrada, esperado):
+    assert hora_saida_automatica(hora_entrada) == esperado
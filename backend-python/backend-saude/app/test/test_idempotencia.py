@@ -0,0 +1,60 @@
+import threading
+import time
+
+from app.services.idempotencia import IdempotencyStore
+
+
+def test_repeticao_recebe_resposta_guardada():
+    store = IdempotencyStore(ttl=60)
+    assert store.reservar("k1", (5, None, None)) == ("executar", None)
+    store.concluir("k1", {"tipo": "entrada"}, 200)
+
+    assert store.reservar("k1", (5, None, None)) == ("repetida", ({"tipo": "entrada"}, 200))
+    # Mesma chave com outros dados não reaproveita a resposta
+    assert store.reservar("k1", (6, None, None)) == ("conflito", None)
+    assert store.stats()["total_repetidas"] == 1
+
+
+def test_erro_libera_a_chave():
+    store = IdempotencyStore(ttl=60)
+    store.reservar("k1", (5,))
+    store.concluir("k1", {"message": "Nenhuma impressão digital capturada."}, 400)
+    assert store.reservar("k1", (5,)) == ("executar", None)
+
+
+def test_resposta_expira():
+    store = IdempotencyStore(ttl=0.01)
+    store.reservar("k1", (5,))
+    store.concluir("k1", {}, 200)
+    time.sleep(0.02)
+    assert store.reservar("k1", (5,)) == ("executar", None)
+
+
+def test_repeticao_espera_a_original_em_andamento():
+    store = IdempotencyStore(ttl=60, espera=2)
+    store.reservar("k1", (5,))
+    resultado = {}
+
+    def repetir():
+        resultado["repeticao"] = store.reservar("k1", (5,))
+
+    thread = threading.Thread(target=repetir)
+    thread.start()
+    time.sleep(0.05)
+    store.concluir("k1", {"tipo": "saida"}, 200)
+    thread.join(1)
+    assert resultado["repeticao"] == ("repetida", ({"tipo": "saida"}, 200))
+
+    store_lento = IdempotencyStore(ttl=60, espera=0.01)
+    store_lento.reservar("k2", (5,))
+    assert store_lento.reservar("k2", (5,)) == ("em_andamento", None)
+
+
+def test_limite_de_chaves_descarta_as_mais_antigas():
+    store = IdempotencyStore(ttl=60, max_keys=2)
+    for chave in ("a", "b", "c"):
+        store.reservar(chave, ())
+        store.concluir(chave, {}, 200)
+    store.reservar("d", ())
+    assert store.stats()["chaves"] == 3
+    assert store.reservar("a", ()) == ("executar", None)
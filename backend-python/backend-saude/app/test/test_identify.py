@@ -0,0 +1,54 @@
+from unittest.mock import patch, MagicMock
+
+from flask import Flask
+
+from app.controller.identifyController import identify_batch_route, identify_template_route
+from app.services.matcher import encode_fir
+
+FIR_A = encode_fir(b"A" * 64)
+FIR_B = encode_fir(b"B" * 64)
+
+
+@patch('app.controller.identifyController.db_connection')
+@patch('app.controller.identifyController.biometric_index')
+def test_identificacao_em_lote(mock_biometric_index, mock_get_db):
+    mock_biometric_index.identify_many.return_value = [7, 0]
+    mock_cursor = MagicMock()
+    mock_get_db.return_value.__enter__.return_value.cursor.return_value = mock_cursor
+    mock_cursor.fetchall.return_value = [(7, "Fulano", "123", 5)]
+
+    app = Flask(__name__)
+    with app.test_request_context(json={"firs": [FIR_A, "", FIR_B, "FIR-CORROMPIDA"], "unidade_id": 5}):
+        response, status = identify_batch_route()
+
+    assert status == 200
+    # Só as digitais válidas vão para o índice, todas em uma chamada
+    mock_biometric_index.identify_many.assert_called_once_with([FIR_A, FIR_B], 5)
+    # Uma consulta para todos os identificados
+    mock_cursor.execute.assert_called_once()
+    assert mock_cursor.execute.call_args.args[1] == ([7],)
+    assert response.json["identificados"] == 1
+    assert response.json["resultados"] == [
+        {"indice": 0, "identificado": True, "tipo": "funcionario", "funcionario_id": 7, "nome": "Fulano", "matricula": "123", "unidade_id": 5},
+        {"indice": 1, "identificado": False, "erro": "Digital inválida"},
+        {"indice": 2, "identificado": False},
+        {"indice": 3, "identificado": False, "erro": "Digital inválida"},
+    ]
+
+
+@patch('app.controller.identifyController.biometric_index')
+def test_digital_que_nao_decodifica_rejeitada(mock_biometric_index):
+    app = Flask(__name__)
+    # Caracteres fora do base64 e FIR truncada (só parte do cabeçalho)
+    for fir in ("FIR-CORROMPIDA", FIR_A[:20]):
+        with app.test_request_context(json={"fir": fir}):
+            response, status = identify_template_route()
+        assert status == 400
+    mock_biometric_index.identify.assert_not_called()
+
+
+def test_lote_vazio_rejeitado():
+    app = Flask(__name__)
+    with app.test_request_context(json={"firs": []}):
+        response, status = identify_batch_route()
+    assert status == 400
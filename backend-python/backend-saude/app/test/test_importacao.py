@@ -0,0 +1,43 @@
+from datetime import date
+from unittest.mock import MagicMock
+
+from app.services.importacao import importar_funcionarios, ler_csv
+
+CSV = """UserID,UserName,FIR,Timestamp,cpf,cargo,data_admissao,tipo_escala,telefone,email
+101,Ana,FIR-ANA,2025-03-10 14:28:46,111.111.111-11,,2025-01-02,8h,2199,ana@x.com
+102,Bruno,FIR-BRUNO,2025-03-10 14:28:46,222.222.222-22,Enfermeiro,02/01/2025,12x36,2198,bruno@x.com
+103,Carla,None,2025-03-10 14:28:46,333.333.333-33,,2025-01-02,8h,2197,carla@x.com
+104,Ana,FIR-ANA2,2025-03-10 14:28:46,444.444.444-44,,2025-01-02,8h,2196,ana2@x.com
+105,Davi,FIR-DAVI,2025-03-10 14:28:46,555.555.555-55,,2025-01-02,8h,2195,davi@x.com
+"""
+
+
+def test_importacao_verifica_conflitos_do_lote_e_grava_com_copy():
+    cursor = MagicMock()
+    cursor.fetchall.side_effect = [
+        [("cpf", "555.555.555-55")],  # já cadastrado
+        [(7,)],  # unidades existentes
+        [(101, 1), (102, 2)],  # ids gerados pelo COPY
+    ]
+    copiado = {}
+    cursor.copy_expert.side_effect = lambda sql, buffer: copiado.update(sql=sql, dados=buffer.read())
+    conn = MagicMock()
+    conn.cursor.return_value = cursor
+
+    resultados, importados = importar_funcionarios(conn, ler_csv(CSV, unidade_id=7))
+
+    assert [resultado["situacao"] for resultado in resultados] == ["importado", "importado", "rejeitado", "rejeitado", "rejeitado"]
+    assert resultados[2]["motivo"] == "Digital (FIR) ausente."
+    assert resultados[3]["motivo"] == "Nome repetido em linha anterior do arquivo"
+    assert resultados[4]["motivo"] == "CPF já existe"
+    assert importados == [(1, "FIR-ANA", 7), (2, "FIR-BRUNO", 7)]
+
+    # Conflitos e unidades em duas consultas, um COPY e a leitura dos ids gerados
+    assert cursor.execute.call_count == 3
+    assert cursor.copy_expert.call_count == 1
+    assert copiado["sql"].startswith("COPY funcionarios (nome, cpf, cargo, id_biometrico")
+    assert copiado["dados"].splitlines() == [
+        '"Ana","111.111.111-11","","FIR-ANA","7","101","8h","2199","ana@x.com","2025-01-02"',
+        '"Bruno","222.222.222-22","Enfermeiro","FIR-BRUNO","7","102","12x36","2198","bruno@x.com","2025-01-02"',
+    ]
+    conn.commit.assert_not_called()
@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from app.services import leitor
+from app.services.leitor import DeviceUnavailableError, DeviceWorker
+from app.services.matcher import Matcher
+
+
+class LeitorFalso(Matcher):
+    def __init__(self, falhas=0, liberar=None):
+        self.falhas = falhas
+        self.liberar = liberar
+        self.aberturas = 0
+        self.fechamentos = 0
+        self.operacoes = []
+
+    def open_device(self):
+        self.aberturas += 1
+
+    def close_device(self):
+        self.fechamentos += 1
+
+    def capture(self):
+        if self.liberar is not None:
+            self.liberar.wait(2)
+        if self.falhas:
+            self.falhas -= 1
+            raise OSError("leitor desconectado")
+        self.operacoes.append("capture")
+        return "FIR"
+
+    def enroll(self, id_biometrico):
+        self.operacoes.append(f"enroll:{id_biometrico}")
+        return f"FIR-{id_biometrico}"
+
+
+@pytest.fixture(autouse=True)
+def sem_espera_para_reabrir(monkeypatch):
+    monkeypatch.setattr(leitor, "DEVICE_REOPEN_BACKOFF_SECONDS", 0)
+
+
+def test_leitor_aberto_uma_vez_entre_capturas():
+    falso = LeitorFalso()
+    worker = DeviceWorker(lambda: falso)
+
+    assert [worker.capture(timeout=2) for _ in range(3)] == ["FIR", "FIR", "FIR"]
+    assert worker.enroll("123", timeout=2) == "FIR-123"
+    assert falso.aberturas == 1
+    assert falso.fechamentos == 0
+
+    stats = worker.stats()
+    assert stats["aberto"] is True
+    assert stats["captura"]["execucao"]["total"] == 3
+    assert stats["cadastro"]["execucao"]["total"] == 1
+
+
+def test_leitor_reaberto_apos_erro():
+    falso = LeitorFalso(falhas=1)
+    worker = DeviceWorker(lambda: falso)
+
+    with pytest.raises(OSError):
+        worker.capture(timeout=2)
+    assert worker.capture(timeout=2) == "FIR"
+    assert falso.fechamentos == 1
+    assert falso.aberturas == 2
+
+    stats = worker.stats()
+    assert stats["total_erros"] == 1
+    assert stats["falhas_seguidas"] == 0
+    assert "leitor desconectado" in stats["ultimo_erro"]
+
+
+def test_identificacao_antes_de_cadastro():
+    liberar = threading.Event()
+    falso = LeitorFalso(liberar=liberar)
+    worker = DeviceWorker(lambda: falso)
+
+    # A primeira captura segura o leitor enquanto um cadastro e outra captura entram na fila
+    threads = [threading.Thread(target=worker.capture, kwargs={"timeout": 5})]
+    threads[0].start()
+    while not worker.stats()["aberto"]:
+        time.sleep(0.005)
+    for alvo, args in ((worker.enroll, ("123",)), (worker.capture, ())):
+        threads.append(threading.Thread(target=alvo, args=args, kwargs={"timeout": 5}))
+        threads[-1].start()
+    while worker.stats()["profundidade_fila"] < 2:
+        time.sleep(0.005)
+    assert worker.stats()["profundidade_fila"] == 2
+
+    liberar.set()
+    for thread in threads:
+        thread.join(5)
+    assert falso.operacoes == ["capture", "capture", "enroll:123"]
+
+
+def test_prazo_esgotado_descarta_a_tarefa():
+    liberar = threading.Event()
+    falso = LeitorFalso(liberar=liberar)
+    worker = DeviceWorker(lambda: falso)
+
+    ocupado = threading.Thread(target=worker.capture, kwargs={"timeout": 5})
+    ocupado.start()
+    while not worker.stats()["aberto"]:
+        time.sleep(0.005)
+
+    with pytest.raises(DeviceUnavailableError):
+        worker.enroll("123", timeout=0.05)
+    liberar.set()
+    ocupado.join(5)
+    # O cadastro abandonado não chega a usar o leitor
+    assert worker.capture(timeout=2) == "FIR"
+    assert falso.operacoes == ["capture", "capture"]
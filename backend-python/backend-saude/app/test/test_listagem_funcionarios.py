@@ -0,0 +1,104 @@
+import gzip
+from unittest.mock import patch, MagicMock
+
+from flask import Flask
+
+from app.controller.registerController import list_funcionarios_for_biometric, _gerar_cursor, _ler_cursor
+
+
+def _listar(mock_get_db, linhas, query_string=None, headers=None):
+    mock_cursor = MagicMock()
+    mock_get_db.return_value.__enter__.return_value.cursor.return_value = mock_cursor
+    mock_cursor.fetchall.return_value = linhas
+
+    app = Flask(__name__)
+    with app.test_request_context(query_string=query_string, headers=headers):
+        response = list_funcionarios_for_biometric()
+    return response, mock_cursor
+
+
+@patch('app.controller.registerController.db_connection')
+def test_pagina_sem_digital_e_cursor_da_proxima(mock_get_db):
+    # nome e id (posição do cursor) e os campos padrão; 3 linhas para limite 2
+    linhas = [
+        ("ANA", 4, 4, "ANA", 10, "ENFERMEIRA", "UPA"),
+        ("BRUNO", 9, 9, "BRUNO", 11, "MEDICO", "UPA"),
+        ("CARLA", 2, 2, "CARLA", 12, "TECNICA", "UBS"),
+    ]
+    response, mock_cursor = _listar(mock_get_db, linhas, {"limite": "2", "busca": "12"})
+
+    assert response.status_code == 200
+    sql, parametros = mock_cursor.execute.call_args.args
+    assert "id_biometrico" not in sql
+    # Busca pelo nome ou pela matrícula exata, uma linha a mais que o limite
+    assert parametros == ["%12%", 12, 3]
+    corpo = response.get_json()
+    assert [func["nome"] for func in corpo["funcionarios"]] == ["ANA", "BRUNO"]
+    assert set(corpo["funcionarios"][0]) == {"id", "nome", "matricula", "cargo", "unidade"}
+    assert _ler_cursor(corpo["proximo"]) == ("BRUNO", 9)
+
+
+@patch('app.controller.registerController.db_connection')
+def test_keyset_e_campos_pedidos(mock_get_db):
+    response, mock_cursor = _listar(mock_get_db, [("CARLA", 2, 2, "FIR")],
+                                    {"apos": _gerar_cursor("BRUNO", 9), "campos": "id,id_biometrico"})
+
+    sql, parametros = mock_cursor.execute.call_args.args
+    assert "(f.nome, f.id) > (%s, %s)" in sql
+    assert parametros == ["BRUNO", 9, 101]
+    assert response.get_json() == {"funcionarios": [{"id": 2, "id_biometrico": "FIR"}], "proximo": None}
+
+
+@patch('app.controller.registerController.db_connection')
+def test_parametros_invalidos(mock_get_db):
+    for query_string in ({"campos": "senha"}, {"limite": "0"}, {"apos": "xyz"}):
+        response, status = _listar(mock_get_db, [], query_string)[0]
+        assert status == 400
+    mock_get_db.assert_not_called()
+
+
+@patch('app.controller.registerController.db_connection')
+@patch('app.services.respostas.GZIP_MIN_BYTES', 100)
+def test_etag_304_e_gzip(mock_get_db):
+    linhas = [(f"FUNCIONARIO {i:03}", i, i, f"FUNCIONARIO {i:03}", i, "CARGO", "UNIDADE") for i in range(20)]
+    response, _ = _listar(mock_get_db, linhas, headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len(gzip.decompress(response.get_data())) > len(response.get_data())
+    etag = response.headers["ETag"]
+
+    # Mesma página: 304 (o corpo é descartado pelo Werkzeug)
+    response, _ = _listar(mock_get_db, linhas, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert "Content-Encoding" not in response.headers
+
+
+@patch('app.services.respostas.STREAM_ITERSIZE', 2)
+@patch('app.services.respostas.db_connection')
+def test_exportacao_em_streaming(mock_get_db):
+    mock_cursor = MagicMock()
+    mock_get_db.return_value.__enter__.return_value.cursor.return_value = mock_cursor
+
+    app = Flask(__name__)
+    for formato, esperado in (
+        ("ndjson", ['{"id":4,"nome":"ANA"}\n{"id":9,"nome":"BRUNO"}\n', '{"id":2,"nome":"CARLA"}\n']),
+        ("json", ['{"funcionarios":[', '{"id":4,"nome":"ANA"},{"id":9,"nome":"BRUNO"}', ',{"id":2,"nome":"CARLA"}', ']}']),
+    ):
+        # Lotes lidos do cursor nomeado, um pedaço da resposta por lote
+        mock_cursor.fetchmany.side_effect = [
+            [("ANA", 4, 4, "ANA"), ("BRUNO", 9, 9, "BRUNO")],
+            [("CARLA", 2, 2, "CARLA")],
+            [],
+        ]
+        mock_get_db.return_value.__exit__.reset_mock()
+        with app.test_request_context(query_string={"exportar": formato, "campos": "id,nome"}):
+            response = list_funcionarios_for_biometric()
+            assert [pedaco.decode() for pedaco in response.iter_encoded()] == esperado
+
+        # Sem LIMIT: todas as linhas, lidas por um cursor do lado do servidor
+        assert mock_get_db.return_value.__enter__.return_value.cursor.call_args.kwargs == {"name": "streaming"}
+        assert "LIMIT" not in mock_cursor.execute.call_args.args[0]
+        # A conexão volta ao pool quando o servidor encerra a resposta
+        mock_get_db.return_value.__exit__.assert_not_called()
+        response.close()
+        mock_get_db.return_value.__exit__.assert_called_once()
@@ -0,0 +1,253 @@
+import pytest
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+from app.services.matcher import NumpyMatcher, ReplayCaptureSource, decode_fir, encode_fir, create_matcher, max_replicas, NBIOBSP_MAX_REPLICAS
+from app.services.biometric import BiometricIndex, LOAD_ITERSIZE
+from app.services.matcher_pool import MatcherPool
+from app.services.snapshot import read_snapshot
+
+FIR_CSV = os.path.join(os.path.dirname(__file__), '..', '..', 'fir.csv')
+
+
+def carregar_matcher():
+    source = ReplayCaptureSource(FIR_CSV)
+    matcher = NumpyMatcher(source)
+    for user_id, fir in source._registros:
+        matcher.add_template(fir, int(user_id))
+    return matcher, source
+
+
+def test_identifica_digitais_do_fir_csv():
+    matcher, source = carregar_matcher()
+    for user_id, fir in source._registros:
+        assert matcher.identify(fir, 5) == int(user_id)
+
+
+def test_digital_desconhecida_nao_identificada():
+    matcher, _ = carregar_matcher()
+    desconhecida = matcher.enroll(99999)
+    assert matcher.identify(desconhecida, 5) == 0
+
+
+def test_remove_template():
+    matcher, source = carregar_matcher()
+    user_id, fir = source._registros[0]
+    matcher.remove_template(int(user_id))
+    assert matcher.identify(fir, 5) == 0
+    # As demais digitais continuam identificáveis após a remoção
+    for outro_id, outra_fir in source._registros[1:]:
+        assert matcher.identify(outra_fir, 5) == int(outro_id)
+
+
+def test_captura_reproduz_fir_csv():
+    matcher, source = carregar_matcher()
+    capturas = [matcher.capture() for _ in range(len(source._registros))]
+    assert capturas == [fir for _, fir in source._registros]
+
+
+def test_codificacao_texto_fir():
+    _, source = carregar_matcher()
+    fir = source._registros[0][1]
+    assert encode_fir(decode_fir(fir)) == fir
+    # Texto corrompido ou truncado não vira bytes quaisquer
+    for invalida in (fir[:-40] + "-" + fir[-39:], fir[:21], "A" * 5):
+        with pytest.raises(ValueError):
+            decode_fir(invalida)
+
+
+def test_indice_ignora_digital_invalida():
+    _, source = carregar_matcher()
+    (id_a, fir_a), (id_b, fir_b) = source._registros[:2]
+    index = BiometricIndex(lambda: create_matcher("numpy"), tamanho_pool=1)
+    index.carregado = True
+    index.upsert(int(id_a), fir_a, 1)
+    index.upsert(int(id_b), fir_b, 1)
+
+    # Recadastro com FIR corrompida: a digital anterior deixa de valer e nada é adicionado
+    assert index.upsert(int(id_a), "FIR-CORROMPIDA", 1)
+    assert index.identify(fir_a, unidade_id=1) == 0
+    assert index.identify(fir_b, unidade_id=1) == int(id_b)
+
+
+def test_indice_busca_unidade_do_terminal_primeiro():
+    _, source = carregar_matcher()
+    index = BiometricIndex(lambda: create_matcher("numpy"))
+    index.carregado = True
+    (id_a, fir_a), (id_b, fir_b) = source._registros[:2]
+    index.upsert(int(id_a), fir_a, 1)
+    index.upsert(int(id_b), fir_b, 2)
+
+    assert index.identify(fir_a, unidade_id=1) == int(id_a)
+    assert index.buscas_globais == 0
+
+    # Digital de outra unidade: encontrada apenas pela busca global
+    assert index.identify(fir_b, unidade_id=1) == int(id_b)
+    assert index.buscas_globais == 1
+
+    # Transferência de unidade move a digital de partição
+    index.upsert(int(id_b), fir_b, 1)
+    assert index.identify(fir_b, unidade_id=1) == int(id_b)
+    assert index.buscas_globais == 1
+    assert index.stats()["total_templates"] == 2
+
+
+
+def test_indice_identifica_em_lote():
+    _, source = carregar_matcher()
+    index = BiometricIndex(lambda: create_matcher("numpy"), tamanho_pool=2)
+    index.carregado = True
+    for user_id, fir in source._registros:
+        index.upsert(int(user_id), fir, 1)
+    desconhecida = create_matcher("numpy").enroll(99999)
+
+    firs = [fir for _, fir in source._registros] + [desconhecida]
+    assert index.identify_many(firs, unidade_id=1) == [int(user_id) for user_id, _ in source._registros] + [0]
+    assert index.buscas_unidade == len(firs)
+    assert index.buscas_globais == 1
+
+def test_snapshot_restaura_indice(tmp_path):
+    _, source = carregar_matcher()
+    index = BiometricIndex(lambda: create_matcher("numpy"))
+    index.carregado = True
+    index._watermark = datetime(2024, 1, 1, 8, 30)
+    (id_a, fir_a), (id_b, fir_b) = source._registros[:2]
+    index.upsert(int(id_a), fir_a, 1)
+    index.upsert(int(id_b), fir_b, None)
+    index.save_snapshot(str(tmp_path / "indice.snap"))
+
+    watermark, ultima_remocao, entries = read_snapshot(str(tmp_path / "indice.snap"))
+    assert watermark == datetime(2024, 1, 1, 8, 30)
+    assert ultima_remocao == 0
+    assert sorted((user_id, unidade_id, template) for user_id, unidade_id, _, template in entries) == sorted([
+        (int(id_a), 1, decode_fir(fir_a)),
+        (int(id_b), None, decode_fir(fir_b)),
+    ])
+
+
+def test_carga_completa_usa_cursor_do_servidor():
+    _, source = carregar_matcher()
+    user_id, fir = source._registros[0]
+    index = BiometricIndex(lambda: create_matcher("numpy"))
+
+    cursor = MagicMock()
+    cursor.fetchone.side_effect = [(datetime(2024, 1, 1),), (False,)]  # marca d'água, tabela de remoções
+    cursor_servidor = MagicMock()
+    cursor_servidor.__iter__.return_value = iter([(decode_fir(fir), None, int(user_id), 1)])
+    conn = MagicMock()
+    conn.cursor.side_effect = lambda name=None: cursor_servidor if name else cursor
+
+    with patch('app.services.biometric.db_connection') as db_connection, patch.object(index, 'save_snapshot'):
+        db_connection.return_value.__enter__.return_value = conn
+        index.load()
+
+    assert cursor_servidor.itersize == LOAD_ITERSIZE
+    cursor_servidor.fetchall.assert_not_called()
+    assert index.identify(fir, unidade_id=1) == int(user_id)
+
+
+def test_carga_completa_nao_bloqueia_o_indice():
+    _, source = carregar_matcher()
+    (id_a, fir_a), (id_b, fir_b), (id_c, fir_c) = source._registros[:3]
+    index = BiometricIndex(lambda: create_matcher("numpy"))
+    index.carregado = True
+    index.upsert(int(id_a), fir_a, 1)
+    index.upsert(int(id_c), fir_c, 1)
+
+    def linhas():
+        # Outra thread identifica e cadastra enquanto a carga lê o banco (travaria com o lock preso)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            assert executor.submit(index.identify, fir_c, 1).result(timeout=5) == int(id_c)
+            executor.submit(index.upsert, int(id_b), fir_b, 2).result(timeout=5)
+            executor.submit(index.remove, int(id_a)).result(timeout=5)
+        yield (decode_fir(fir_a), None, int(id_a), 1)
+        yield (decode_fir(fir_c), None, int(id_c), 1)
+
+    cursor = MagicMock()
+    cursor.fetchone.side_effect = [(datetime(2024, 1, 1),), (False,)]  # marca d'água, tabela de remoções
+    cursor_servidor = MagicMock()
+    cursor_servidor.__iter__.return_value = linhas()
+    conn = MagicMock()
+    conn.cursor.side_effect = lambda name=None: cursor_servidor if name else cursor
+
+    with patch('app.services.biometric.db_connection') as db_connection, patch.object(index, 'save_snapshot'):
+        db_connection.return_value.__enter__.return_value = conn
+        index.load()
+
+    # O cadastro e a remoção feitos durante a carga são reaplicados sobre o índice novo
+    assert index.identify(fir_b, unidade_id=2) == int(id_b)
+    assert index.identify(fir_a, unidade_id=1) == 0
+    assert index.identify(fir_c, unidade_id=1) == int(id_c)
+    assert index.stats()["total_templates"] == 2
+
+
+def test_pool_identificacoes_simultaneas():
+    _, source = carregar_matcher()
+    pool = MatcherPool(lambda: create_matcher("numpy"), tamanho=3)
+    for user_id, fir in source._registros:
+        pool.add_template(int(user_id) % 2, fir, int(user_id))
+
+    # Cada chamada recebe o seu próprio resultado, mesmo com as réplicas ocupadas ao mesmo tempo
+    pedidos = source._registros * 5
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        resultados = list(executor.map(lambda registro: pool.identify(registro[1], 0, 5)[0], pedidos))
+    assert resultados == [int(user_id) for user_id, _ in pedidos]
+
+    stats = pool.stats()
+    assert sum(replica["total_identificacoes"] for replica in stats["replicas"]) == len(pedidos)
+    assert all(replica["pendentes"] == 0 for replica in stats["replicas"])
+
+
+def test_pool_alteracoes_chegam_a_todas_as_replicas():
+    _, source = carregar_matcher()
+    (id_a, fir_a), (id_b, fir_b) = source._registros[:2]
+    pool = MatcherPool(lambda: create_matcher("numpy"), tamanho=2)
+    pool.add_template(1, fir_a, int(id_a))
+    pool.add_template(2, fir_b, int(id_b))
+    pool.remove_template(2, int(id_b))
+
+    # Qualquer réplica que atender a identificação já enxerga as alterações anteriores
+    futuros = [pool.submit(fir_a, 2, 5), pool.submit(fir_b, 1, 5)]
+    assert [futuro.result(5) for futuro in futuros] == [(int(id_a), True, True), (0, True, True)]
+    assert sum(replica["total_identificacoes"] for replica in pool.stats()["replicas"]) == 2
+
+
+def test_pool_replica_divergente_fora_das_identificacoes():
+    _, source = carregar_matcher()
+    (id_a, fir_a), = source._registros[:1]
+    falhar = [True]
+
+    def fabrica():
+        # O SDK falha somente na réplica 1
+        if falhar[0] and threading.current_thread().name == "matcher-replica-1":
+            raise RuntimeError("falha no SDK")
+        return create_matcher("numpy")
+
+    pool = MatcherPool(fabrica, tamanho=2)
+    pool.add_template(1, fir_a, int(id_a))
+    pool.aguardar()
+    assert [replica["divergente"] for replica in pool.stats()["replicas"]] == [False, True]
+    # Todas as identificações vão para a réplica íntegra
+    assert [pool.identify(fir_a, 1, 5)[0] for _ in range(4)] == [int(id_a)] * 4
+    assert [replica["total_identificacoes"] for replica in pool.stats()["replicas"]] == [4, 0]
+
+    # A carga completa seguinte reconstrói a réplica
+    falhar[0] = False
+    pool.clear()
+    pool.add_template(1, fir_a, int(id_a))
+    pool.aguardar()
+    assert not any(replica["divergente"] for replica in pool.stats()["replicas"])
+
+
+def test_pool_limitado_pelo_backend():
+    # O NBioBSP cria um objeto COM por réplica e unidade: o pool respeita o limite do backend
+    assert max_replicas("nbiobsp") == NBIOBSP_MAX_REPLICAS
+    assert max_replicas("numpy") is None
+
+    pool = MatcherPool(lambda: create_matcher("numpy"), tamanho=4, max_replicas=2)
+    assert pool.tamanho == 2
+    assert len(pool.stats()["replicas"]) == 2
+    assert MatcherPool(lambda: create_matcher("numpy"), tamanho=3, max_replicas=None).tamanho == 3
@@ -0,0 +1,40 @@
+import requests
+from unittest.mock import MagicMock, patch
+
+from app.services.notificacoes import NotificationWorker, OUTBOX_MAX_TENTATIVAS, backoff_seconds
+
+
+def executar_lote(lote, post_side_effect):
+    worker = NotificationWorker(gateway=MagicMock())
+    worker._gateway.post.side_effect = post_side_effect
+
+    conn = MagicMock()
+    cursor = conn.cursor.return_value
+    cursor.fetchall.return_value = lote
+    with patch('app.services.notificacoes.db_connection') as db_connection:
+        db_connection.return_value.__enter__.return_value = conn
+        processadas = worker.processar_lote()
+    return worker, cursor, processadas
+
+
+def test_registra_envio_nova_tentativa_e_falha():
+    lote = [
+        (1, "Entrada", "a@email.com", "corpo", 1),
+        (2, "Entrada", "b@email.com", "corpo", 2),
+        (3, "Saída", "c@email.com", "corpo", OUTBOX_MAX_TENTATIVAS),
+    ]
+    erro = requests.ConnectionError("smtp fora do ar")
+    worker, cursor, processadas = executar_lote(lote, [MagicMock(), erro, erro])
+
+    assert processadas == 3
+    enviados, novas_tentativas, falhas = [chamada.args[1] for chamada in cursor.executemany.call_args_list]
+    assert enviados == [(1,)]
+    assert novas_tentativas == [(backoff_seconds(2), "smtp fora do ar", 2)]
+    assert falhas == [("smtp fora do ar", 3)]
+    assert worker.stats()["total_enviados"] == 1
+    assert worker.stats()["total_falhas"] == 1
+
+
+def test_backoff_exponencial_limitado():
+    assert backoff_seconds(1) < backoff_seconds(2) < backoff_seconds(3)
+    assert backoff_seconds(50) == backoff_seconds(60)
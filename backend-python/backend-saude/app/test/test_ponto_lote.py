@@ -0,0 +1,76 @@
+from datetime import date, datetime, time
+from unittest.mock import patch, MagicMock
+
+from app.services.ponto_lote import registrar_lote
+
+
+def conexao(funcionarios, ferias=(), abertos=(), gravados=()):
+    cursor = MagicMock()
+    cursor.fetchall.side_effect = [list(funcionarios), list(ferias), list(abertos), list(gravados)]
+    conn = MagicMock()
+    conn.cursor.return_value = cursor
+    return conn, cursor
+
+
+@patch('app.services.ponto_lote.execute_values')
+def test_lote_validado_e_gravado_em_conjunto(mock_execute_values):
+    mock_execute_values.return_value = [(99,)]
+    conn, cursor = conexao(
+        funcionarios=[(1, 5, "8h", 1, None), (2, 5, "8h", 1, None), (3, 5, "8h", 1, None), (4, 5, "8h", 0, None)],
+        ferias=[(2, date(2025, 6, 18))],
+        abertos=[(3, 5, 99, datetime(2025, 6, 18), time(8, 0))],
+        gravados=[(1, 5, datetime(2025, 6, 17), time(8, 0), time(17, 0))],
+    )
+    resultados = registrar_lote(conn, [
+        {"funcionario_id": 1, "unidade_id": 5, "data_hora": "2025-06-18 17:00:00", "tipo": "saida"},
+        {"funcionario_id": 1, "unidade_id": 5, "data_hora": "2025-06-18 08:00:00", "tipo": "entrada"},
+        {"funcionario_id": 2, "unidade_id": 5, "data_hora": "2025-06-18 08:00:00", "tipo": "entrada"},
+        {"funcionario_id": 3, "unidade_id": 5, "data_hora": "2025-06-18 17:00:00", "tipo": "saída"},
+        {"funcionario_id": 1, "unidade_id": 5, "data_hora": "2025-06-17 08:00:00", "tipo": "entrada"},
+        {"funcionario_id": 4, "unidade_id": 5, "data_hora": "2025-06-18 08:00:00", "tipo": "entrada"},
+        {"funcionario_id": 1, "unidade_id": 6, "data_hora": "2025-06-18 08:00:00", "tipo": "entrada"},
+        {"funcionario_id": 1, "unidade_id": 5, "data_hora": "18/06/2025", "tipo": "entrada"},
+    ])
+
+    assert [resultado["situacao"] for resultado in resultados] == [
+        "aceito", "aceito", "rejeitado", "aceito", "duplicado", "rejeitado", "rejeitado", "rejeitado"
+    ]
+    assert resultados[2]["motivo"] == "Funcionário de férias, você não pode registrar o ponto!"
+    assert resultados[5]["motivo"] == "Funcionário inativo não pode bater ponto."
+    assert resultados[6]["motivo"] == "Funcionário não pertence a esta unidade."
+
+    # Lock dos funcionários do lote e número fixo de consultas, e uma gravação por tipo de comando
+    assert cursor.execute.call_count == 5
+    sql, parametros = cursor.execute.call_args_list[0].args
+    assert "pg_advisory_xact_lock" in sql and parametros[1] == [1, 2, 3, 4]
+    assert mock_execute_values.call_count == 2
+    inserts = mock_execute_values.call_args_list[0].args[2]
+    # Entrada e saída do mesmo lote viram um único registro já com as horas calculadas
+    assert inserts == [(1, 5, date(2025, 6, 18), time(8, 0), None, "registrado", time(17, 0),
+                        "8:00:00", "0:00:00", "0:00:00", "8:00:00", "9:00:00")]
+    updates = mock_execute_values.call_args_list[1].args[2]
+    assert [linha[:2] for linha in updates] == [(99, "17:00:00")]
+    assert "r.hora_saida IS NULL" in mock_execute_values.call_args_list[1].args[1]
+
+
+@patch('app.services.ponto_lote.execute_values')
+def test_saida_de_entrada_fechada_por_outra_transacao(mock_execute_values):
+    # O UPDATE não devolve o registro: a entrada ganhou saída depois da leitura
+    mock_execute_values.return_value = []
+    conn, _ = conexao(funcionarios=[(1, 5, "8h", 1, None)], abertos=[(1, 5, 99, datetime(2025, 6, 18), time(8, 0))])
+    resultados = registrar_lote(conn, [
+        {"funcionario_id": 1, "unidade_id": 5, "data_hora": "2025-06-18 17:00:00", "tipo": "saida"},
+    ])
+    assert resultados == [{"indice": 0, "situacao": "rejeitado", "tipo": "saida",
+                           "motivo": "Saída já registrada para esta entrada."}]
+
+
+@patch('app.services.ponto_lote.execute_values')
+def test_saida_sem_entrada_rejeitada(mock_execute_values):
+    conn, _ = conexao(funcionarios=[(1, 5, "8h", 1, None)])
+    resultados = registrar_lote(conn, [
+        {"funcionario_id": 1, "unidade_id": 5, "data_hora": "2025-06-18 17:00:00", "tipo": "saida"},
+    ])
+    assert resultados == [{"indice": 0, "situacao": "rejeitado", "tipo": "saida",
+                           "motivo": "Registro de entrada não encontrado para a saída."}]
+    mock_execute_values.assert_not_called()
@@ -1,7 +1,11 @@
 import pytest
+import psycopg2
 from unittest.mock import patch, MagicMock
 from flask import Flask
-from app.controller.pontoController import register_ponto
+from app.controller.pontoController import register_ponto, register_ponto_template
+from app.services.idempotencia import IdempotencyStore
+from app.services.cache import TTLCache
+from app.services.matcher import encode_fir
 
 @pytest.fixture
 def app():
@@ -13,231 +17,404 @@ def app():
 def client(app):
     return app.test_client()
 
-@patch('app.controller.pontoController.get_db_connection')
-@patch('app.controller.pontoController.IndexSearch')
+def linha_decisao(unidade_id=5, escala="8h", status=1, nomes_unidades=(None, None), de_ferias=False, pendente=None, hoje=None, aberto=None):
+    # Linha da consulta única de decisão do ponto (DECISAO_PONTO_SQL)
+    return (
+        (1, "Fulano", "123.456.789-00", unidade_id, "123", "Cargo", 1, "fulano@email.com", escala, status)
+        + tuple(nomes_unidades)
+        + (de_ferias,)
+        + (pendente or (None,) * 4)
+        + (hoje or (None,) * 4)
+        + (aberto or (None,) * 3)
+    )
+
+@patch('app.controller.pontoController.db_connection')
+@patch('app.controller.pontoController.biometric_index')
 @patch('app.controller.pontoController.identify_user')
-@patch('app.controller.pontoController.requests.post')
-def test_entrada_sucesso(mock_requests_post, mock_identify_user, mock_IndexSearch, mock_get_db):
+@patch('app.controller.pontoController.notification_worker')
+@patch('app.controller.pontoController.enfileirar_email')
+def test_entrada_sucesso(mock_enfileirar_email, mock_notification_worker, mock_identify_user, mock_biometric_index, mock_get_db, app):
     # Mock biometria identificada
     mock_identify_user.return_value = b'fake_fir'
-    mock_IndexSearch.UserID = 1
-    mock_IndexSearch.ClearDB.return_value = None
-    mock_IndexSearch.IdentifyUser.return_value = None
-    mock_IndexSearch.AddFIR.return_value = None
+    mock_biometric_index.identify.return_value = 1
 
     # Mock banco de dados
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
-    mock_get_db.return_value = mock_conn
+    mock_get_db.return_value.__enter__.return_value = mock_conn
     mock_conn.cursor.return_value = mock_cursor
-    # AddFIR
-    mock_cursor.fetchall.side_effect = [
-        [(b'biometria', 1)],
-    ]
-    # user_data, unidade_funcionario_nome, unidade_terminal_nome, ferias_data, ultimo_ponto
+    # decisão do ponto, id do registro de entrada inserido
     mock_cursor.fetchone.side_effect = [
-        (1, "Fulano", "123.456.789-00", 5, "123", "Cargo", 1, "fulano@email.com"),
-        ("Unidade Teste",),
-        ("Unidade Teste",),
-        None,  # ferias_data
-        None,  # ultimo_ponto
+        linha_decisao(),
+        (42,),
     ]
 
-    # Mock requests.post para Node.js
-    mock_response = MagicMock()
-    mock_response.status_code = 201
-    mock_response.text = "OK"
-    mock_response.raise_for_status.return_value = None
-    mock_requests_post.return_value = mock_response
-
     # Mock request context
-    with patch('app.controller.pontoController.request') as mock_request:
-        mock_request.json = {"unidade_id": 5}
+    with app.test_request_context(json={"unidade_id": 5, "data": "2025-06-18", "hora_entrada": "08:00:00"}):
         response, status = register_ponto()
         assert status == 200
-        assert "Entrada registrada com sucesso" in response.json["message"]
+        assert "Registro de entrada realizado com sucesso" in response.json["message"]
+    # Decisão de entrada/saída em uma consulta e a entrada gravada direto no banco,
+    # com as gravações do funcionário serializadas
+    assert mock_cursor.execute.call_count == 3
+    assert "pg_advisory_xact_lock" in mock_cursor.execute.call_args_list[1].args[0]
+    sql, params = mock_cursor.execute.call_args_list[2].args
+    assert "INSERT INTO registros_ponto" in sql and "NOT EXISTS" in sql
+    assert (params["funcionario_id"], params["unidade_id"], params["data"], params["hora_entrada"]) == (1, 5, "2025-06-18", "08:00:00")
+    assert str(params["pendente_desde"]) == "2025-06-18"
+    # O comprovante vai para a fila na transação da batida; o e-mail não é enviado na requisição
+    assert mock_enfileirar_email.call_args.kwargs["recipient"] == "fulano@email.com"
+    mock_conn.commit.assert_called_once()
+    mock_notification_worker.notificar.assert_called_once()
 
-@patch('app.controller.pontoController.get_db_connection')
-@patch('app.controller.pontoController.IndexSearch')
+@patch('app.controller.pontoController.db_connection')
+@patch('app.controller.pontoController.biometric_index')
 @patch('app.controller.pontoController.identify_user')
-def test_unidade_errada(mock_identify_user, mock_IndexSearch, mock_get_db):
+@patch('app.controller.pontoController.notification_worker')
+@patch('app.controller.pontoController.enfileirar_email')
+def test_entrada_fecha_entrada_anterior_sem_saida(mock_enfileirar_email, mock_notification_worker, mock_identify_user, mock_biometric_index, mock_get_db, app):
     mock_identify_user.return_value = b'fake_fir'
-    mock_IndexSearch.UserID = 1
-    mock_IndexSearch.ClearDB.return_value = None
-    mock_IndexSearch.IdentifyUser.return_value = None
-    mock_IndexSearch.AddFIR.return_value = None
+    mock_biometric_index.identify.return_value = 1
 
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
-    mock_get_db.return_value = mock_conn
+    mock_get_db.return_value.__enter__.return_value = mock_conn
     mock_conn.cursor.return_value = mock_cursor
-    mock_cursor.fetchall.side_effect = [
-        [(b'biometria', 1)],
+    from datetime import datetime, time
+    mock_cursor.fetchone.side_effect = [
+        linha_decisao(aberto=(7, time(23, 55, 12), datetime(2025, 6, 17))),
+        (42,),
     ]
+
+    with app.test_request_context(json={"unidade_id": 5, "data": "2025-06-18"}):
+        response, status = register_ponto()
+        assert status == 200
+    sql, params = mock_cursor.execute.call_args_list[1].args
+    assert "UPDATE registros_ponto" in sql and params == ("00:05:00", "não registrado a saída", 7)
+    assert "INSERT INTO registros_ponto" in mock_cursor.execute.call_args_list[3].args[0]
+
+
+@patch('app.controller.pontoController.open_shift_state')
+@patch('app.controller.pontoController.db_connection')
+@patch('app.controller.pontoController.biometric_index')
+@patch('app.controller.pontoController.identify_user')
+@patch('app.controller.pontoController.enfileirar_email')
+def test_entrada_ja_gravada_por_outra_instancia(mock_enfileirar_email, mock_identify_user, mock_biometric_index, mock_get_db, mock_estado, app):
+    mock_identify_user.return_value = b'fake_fir'
+    mock_biometric_index.identify.return_value = 1
+    mock_estado.consultar.return_value = None
+
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_get_db.return_value.__enter__.return_value = mock_conn
+    mock_conn.cursor.return_value = mock_cursor
+    # A decisão (de estado desatualizado) é de entrada, mas o INSERT não encontra as condições no banco
+    mock_cursor.fetchone.side_effect = [linha_decisao(), None]
+
+    with app.test_request_context(json={"unidade_id": 5, "data": "2025-06-18"}):
+        response, status = register_ponto()
+    assert status == 409
+    mock_conn.rollback.assert_called_once()
+    mock_conn.commit.assert_not_called()
+    mock_enfileirar_email.assert_not_called()
+    mock_estado.recarregar.assert_called_once_with(mock_conn, [1])
+
+@patch('app.controller.pontoController.db_connection')
+@patch('app.controller.pontoController.biometric_index')
+@patch('app.controller.pontoController.identify_user')
+def test_funcionario_inativo(mock_identify_user, mock_biometric_index, mock_get_db, app):
+    mock_identify_user.return_value = b'fake_fir'
+    mock_biometric_index.identify.return_value = 1
+
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_get_db.return_value.__enter__.return_value = mock_conn
+    mock_conn.cursor.return_value = mock_cursor
     mock_cursor.fetchone.side_effect = [
-        (1, "Fulano", "123.456.789-00", 99, "123", "Cargo", 1, "fulano@email.com"),
-        ("Unidade Funcionario",),
-        ("Unidade Terminal",),
+        linha_decisao(status=0),
     ]
 
-    with patch('app.controller.pontoController.request') as mock_request:
-        mock_request.json = {"unidade_id": 5}
+    with app.test_request_context(json={"unidade_id": 5}):
         response, status = register_ponto()
         assert status == 403
-        assert "não pertence a esta unidade" in response.json["message"]
+        assert "inativo" in response.json["error"]
+    mock_conn.commit.assert_not_called()
 
-@patch('app.controller.pontoController.get_db_connection')
-@patch('app.controller.pontoController.IndexSearch')
+@patch('app.controller.pontoController.db_connection')
+@patch('app.controller.pontoController.biometric_index')
 @patch('app.controller.pontoController.identify_user')
-def test_saida_antes_5_min(mock_identify_user, mock_IndexSearch, mock_get_db):
+def test_unidade_errada(mock_identify_user, mock_biometric_index, mock_get_db, app):
     mock_identify_user.return_value = b'fake_fir'
-    mock_IndexSearch.UserID = 1
-    mock_IndexSearch.ClearDB.return_value = None
-    mock_IndexSearch.IdentifyUser.return_value = None
-    mock_IndexSearch.AddFIR.return_value = None
+    mock_biometric_index.identify.return_value = 1
 
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
-    mock_get_db.return_value = mock_conn
+    mock_get_db.return_value.__enter__.return_value = mock_conn
     mock_conn.cursor.return_value = mock_cursor
-    mock_cursor.fetchall.side_effect = [
-        [(b'biometria', 1)],
+    mock_cursor.fetchone.side_effect = [
+        linha_decisao(unidade_id=99, nomes_unidades=("Unidade Funcionario", "Unidade Terminal")),
     ]
+
+    with app.test_request_context(json={"unidade_id": 5}):
+        response, status = register_ponto()
+        assert status == 403
+        assert "não pertence a esta unidade" in response.json["message"]
+    # A conexão volta ao pool mesmo no retorno antecipado
+    mock_get_db.return_value.__exit__.assert_called_once()
+
+@patch('app.controller.pontoController.db_connection')
+@patch('app.controller.pontoController.biometric_index')
+@patch('app.controller.pontoController.identify_user')
+def test_saida_antes_5_min(mock_identify_user, mock_biometric_index, mock_get_db, app):
+    mock_identify_user.return_value = b'fake_fir'
+    mock_biometric_index.identify.return_value = 1
+
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_get_db.return_value.__enter__.return_value = mock_conn
+    mock_conn.cursor.return_value = mock_cursor
     from datetime import datetime, timedelta
     agora = datetime.now()
     mock_cursor.fetchone.side_effect = [
-        (1, "Fulano", "123.456.789-00", 5, "123", "Cargo", 1, "fulano@email.com"),
-        ("Unidade Teste",),
-        ("Unidade Teste",),
-        None,  # ferias_data
-        (1, agora.time(), None, agora),  # ultimo_ponto: entrada agora, sem saída
+        linha_decisao(hoje=(1, agora.time(), None, agora)),  # entrada agora, sem saída
     ]
 
-    with patch('app.controller.pontoController.request') as mock_request:
-        mock_request.json = {"unidade_id": 5}
+    with app.test_request_context(json={"unidade_id": 5}):
         response, status = register_ponto()
         assert status == 400
         assert "aguardar pelo menos 5 minutos" in response.json["message"]
 
-@patch('app.controller.pontoController.get_db_connection')
-@patch('app.controller.pontoController.IndexSearch')
+@patch('app.controller.pontoController.db_connection')
+@patch('app.controller.pontoController.biometric_index')
 @patch('app.controller.pontoController.identify_user')
-def test_ferias(mock_identify_user, mock_IndexSearch, mock_get_db):
+@patch('app.controller.pontoController.notification_worker')
+@patch('app.controller.pontoController.enfileirar_email')
+def test_saida_escala_24h_entrada_dia_anterior(mock_enfileirar_email, mock_notification_worker, mock_identify_user, mock_biometric_index, mock_get_db, app):
     mock_identify_user.return_value = b'fake_fir'
-    mock_IndexSearch.UserID = 1
-    mock_IndexSearch.ClearDB.return_value = None
-    mock_IndexSearch.IdentifyUser.return_value = None
-    mock_IndexSearch.AddFIR.return_value = None
+    mock_biometric_index.identify.return_value = 1
 
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
-    mock_get_db.return_value = mock_conn
+    mock_get_db.return_value.__enter__.return_value = mock_conn
     mock_conn.cursor.return_value = mock_cursor
-    mock_cursor.fetchall.side_effect = [
-        [(b'biometria', 1)],
+    from datetime import datetime, timedelta
+    entrada = (datetime.now() - timedelta(hours=20)).replace(microsecond=0)
+    mock_cursor.fetchone.side_effect = [
+        linha_decisao(escala="24h", pendente=(1, entrada.time(), None, entrada), aberto=(1, entrada.time(), entrada)),
     ]
+
+    with app.test_request_context(json={"unidade_id": 5}):
+        response, status = register_ponto()
+        assert status == 200
+        assert response.json["tipo"] == "saida"
+    # A saída (no dia seguinte ao da entrada) é calculada e gravada no próprio registro de entrada
+    sql, params = mock_cursor.execute.call_args_list[1].args
+    assert "UPDATE registros_ponto" in sql and params["id"] == 1
+    assert params["hora_saida_ajustada"].split(":")[0] in ("19", "20")
+    mock_conn.commit.assert_called_once()
+
+@patch('app.controller.pontoController.db_connection')
+@patch('app.controller.pontoController.biometric_index')
+@patch('app.controller.pontoController.identify_user')
+def test_ferias(mock_identify_user, mock_biometric_index, mock_get_db, app):
+    mock_identify_user.return_value = b'fake_fir'
+    mock_biometric_index.identify.return_value = 1
+
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_get_db.return_value.__enter__.return_value = mock_conn
+    mock_conn.cursor.return_value = mock_cursor
     from datetime import datetime
     mock_cursor.fetchone.side_effect = [
-        (1, "Fulano", "123.456.789-00", 5, "123", "Cargo", 1, "fulano@email.com"),
-        ("Unidade Teste",),
-        ("Unidade Teste",),
-        ("2025-07-01", "2025-07-31"),  # ferias_data
+        linha_decisao(de_ferias=True),
     ]
 
-    with patch('app.controller.pontoController.request') as mock_request:
-        mock_request.json = {"unidade_id": 5}
+    with app.test_request_context(json={"unidade_id": 5}):
         response, status = register_ponto()
         assert status == 400
         assert "férias" in response.json["message"]
 
-@patch('app.controller.pontoController.get_db_connection')
-@patch('app.controller.pontoController.IndexSearch')
+@patch('app.controller.pontoController.db_connection')
+@patch('app.controller.pontoController.biometric_index')
 @patch('app.controller.pontoController.identify_user')
-def test_nao_identificado(mock_identify_user, mock_IndexSearch, mock_get_db):
+def test_nao_identificado(mock_identify_user, mock_biometric_index, mock_get_db, app):
     mock_identify_user.return_value = b'fake_fir'
-    mock_IndexSearch.UserID = 0  # Não identificado
-    mock_IndexSearch.ClearDB.return_value = None
-    mock_IndexSearch.IdentifyUser.return_value = None
-    mock_IndexSearch.AddFIR.return_value = None
+    mock_biometric_index.identify.return_value = 0  # Não identificado
 
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
-    mock_get_db.return_value = mock_conn
+    mock_get_db.return_value.__enter__.return_value = mock_conn
     mock_conn.cursor.return_value = mock_cursor
-    mock_cursor.fetchall.side_effect = [
-        [(b'biometria', 1)],
-    ]
 
-    with patch('app.controller.pontoController.request') as mock_request:
-        mock_request.json = {"unidade_id": 5}
+    with app.test_request_context(json={"unidade_id": 5}):
         response, status = register_ponto()
         assert status == 401
         assert "não identificado" in response.json["message"].lower()
 
-@patch('app.controller.pontoController.get_db_connection')
-@patch('app.controller.pontoController.IndexSearch')
+@patch('app.controller.pontoController.db_connection')
+@patch('app.controller.pontoController.biometric_index')
 @patch('app.controller.pontoController.identify_user')
-def test_saida_ja_bateu(mock_identify_user, mock_IndexSearch, mock_get_db):
+def test_saida_ja_bateu(mock_identify_user, mock_biometric_index, mock_get_db, app):
     mock_identify_user.return_value = b'fake_fir'
-    mock_IndexSearch.UserID = 1
-    mock_IndexSearch.ClearDB.return_value = None
-    mock_IndexSearch.IdentifyUser.return_value = None
-    mock_IndexSearch.AddFIR.return_value = None
+    mock_biometric_index.identify.return_value = 1
 
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
-    mock_get_db.return_value = mock_conn
+    mock_get_db.return_value.__enter__.return_value = mock_conn
     mock_conn.cursor.return_value = mock_cursor
-    mock_cursor.fetchall.side_effect = [
-        [(b'biometria', 1)],
-    ]
     from datetime import datetime, timedelta
     agora = datetime.now()
     mock_cursor.fetchone.side_effect = [
-        (1, "Fulano", "123.456.789-00", 5, "123", "Cargo", 1, "fulano@email.com"),
-        ("Unidade Teste",),
-        ("Unidade Teste",),
-        None,  # ferias_data
-        (1, agora.time(), agora.time(), agora),  # ultimo_ponto: já tem entrada e saída
+        linha_decisao(hoje=(1, agora.time(), agora.time(), agora)),  # já tem entrada e saída
     ]
 
-    with patch('app.controller.pontoController.request') as mock_request:
-        mock_request.json = {"unidade_id": 5}
+    with app.test_request_context(json={"unidade_id": 5}):
         response, status = register_ponto()
         assert status == 400
-        assert "já bateu seu ponto de saída" in response.json["message"]
+        assert "já bateu sua saída" in response.json["message"]
 
-@patch('app.controller.pontoController.get_db_connection')
-@patch('app.controller.pontoController.IndexSearch')
+@patch('app.controller.pontoController.db_connection')
+@patch('app.controller.pontoController.biometric_index')
 @patch('app.controller.pontoController.identify_user')
-@patch('app.controller.pontoController.requests.post')
-def test_erro_nodejs(mock_requests_post, mock_identify_user, mock_IndexSearch, mock_get_db):
+def test_erro_ao_gravar_registro(mock_identify_user, mock_biometric_index, mock_get_db, app):
     mock_identify_user.return_value = b'fake_fir'
-    mock_IndexSearch.UserID = 1
-    mock_IndexSearch.ClearDB.return_value = None
-    mock_IndexSearch.IdentifyUser.return_value = None
-    mock_IndexSearch.AddFIR.return_value = None
+    mock_biometric_index.identify.return_value = 1
 
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
-    mock_get_db.return_value = mock_conn
+    mock_get_db.return_value.__enter__.return_value = mock_conn
     mock_conn.cursor.return_value = mock_cursor
-    mock_cursor.fetchall.side_effect = [
-        [(b'biometria', 1)],
-    ]
     mock_cursor.fetchone.side_effect = [
-        (1, "Fulano", "123.456.789-00", 5, "123", "Cargo", 1, "fulano@email.com"),
-        ("Unidade Teste",),
-        ("Unidade Teste",),
-        None,  # ferias_data
-        None,  # ultimo_ponto
+        linha_decisao(),
     ]
 
-    # Simula erro no Node.js
-    mock_requests_post.side_effect = Exception("Node.js offline")
+    # Simula falha do banco ao inserir a entrada
+    mock_cursor.execute.side_effect = [None, psycopg2.OperationalError("conexão perdida")]
 
-    with patch('app.controller.pontoController.request') as mock_request:
-        mock_request.json = {"unidade_id": 5}
+    with app.test_request_context(json={"unidade_id": 5}):
         response, status = register_ponto()
         assert status == 500
-        assert "Erro ao registrar ponto" in response.json["message"]
\ No newline at end of file
+        assert "Erro ao registrar ponto" in response.json["message"]
+    mock_conn.rollback.assert_called_once()
+    mock_conn.commit.assert_not_called()
+
+@patch('app.controller.pontoController.idempotency_store', new_callable=lambda: IdempotencyStore(ttl=60))
+@patch('app.controller.pontoController.db_connection')
+@patch('app.controller.pontoController.biometric_index')
+@patch('app.controller.pontoController.identify_user')
+@patch('app.controller.pontoController.notification_worker')
+@patch('app.controller.pontoController.enfileirar_email')
+def test_repeticao_com_idempotency_key(mock_enfileirar_email, mock_notification_worker, mock_identify_user, mock_biometric_index, mock_get_db, mock_store, app):
+    mock_identify_user.return_value = b'fake_fir'
+    mock_biometric_index.identify.return_value = 1
+
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_get_db.return_value.__enter__.return_value = mock_conn
+    mock_conn.cursor.return_value = mock_cursor
+    mock_cursor.fetchone.side_effect = [
+        linha_decisao(),
+        (42,),
+    ]
+
+    corpo = {"unidade_id": 5, "data": "2025-06-18", "hora_entrada": "08:00:00"}
+    with app.test_request_context(json=corpo, headers={"Idempotency-Key": "terminal-5-0001"}):
+        original, status = register_ponto()
+        assert status == 200
+    # Repetição após timeout do terminal: mesma resposta, sem leitor, índice ou banco
+    with app.test_request_context(json=corpo, headers={"Idempotency-Key": "terminal-5-0001"}):
+        repetida, status = register_ponto()
+        assert status == 200
+        assert repetida.json == original.json
+        assert repetida.headers["Idempotent-Replayed"] == "true"
+    mock_identify_user.assert_called_once()
+    mock_biometric_index.identify.assert_called_once()
+    mock_get_db.assert_called_once()
+
+@patch('app.controller.pontoController.db_connection')
+@patch('app.controller.pontoController.biometric_index')
+@patch('app.controller.pontoController.identify_user')
+@patch('app.controller.pontoController.notification_worker')
+@patch('app.controller.pontoController.enfileirar_email')
+def test_registro_com_digital_enviada_pelo_terminal(mock_enfileirar_email, mock_notification_worker, mock_identify_user, mock_biometric_index, mock_get_db, app):
+    mock_biometric_index.identify.return_value = 1
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_get_db.return_value.__enter__.return_value = mock_conn
+    mock_conn.cursor.return_value = mock_cursor
+    mock_cursor.fetchone.side_effect = [linha_decisao(), (42,)]
+
+    fir = encode_fir(bytes(range(64)))
+    with app.test_request_context(json={"unidade_id": 5, "fir": fir, "data": "2025-06-18", "hora_entrada": "08:00:00"}):
+        response, status = register_ponto_template()
+        assert status == 200
+    # A digital do corpo vai direto para o índice, sem usar o leitor do servidor
+    mock_identify_user.assert_not_called()
+    mock_biometric_index.identify.assert_called_once_with(fir, 5)
+
+    for corpo in ({"unidade_id": 5}, {"unidade_id": 5, "fir": "AQAAABQAAAA"}):
+        with app.test_request_context(json=corpo):
+            response, status = register_ponto_template()
+            assert status == 400
+
+def _turnos(registros):
+    # Turnos em memória já carregados: (funcionario_id, id, unidade_id, data_hora, hora_entrada, hora_saida)
+    from app.services.turnos import OpenShiftState
+    estado = OpenShiftState(intervalo=30)
+    conn = MagicMock()
+    conn.cursor.return_value.fetchall.return_value = registros
+    estado._carregar(conn)
+    return estado
+
+@patch('app.controller.pontoController.db_connection')
+@patch('app.controller.pontoController.biometric_index')
+@patch('app.controller.pontoController.identify_user')
+def test_batida_repetida_respondida_sem_banco(mock_identify_user, mock_biometric_index, mock_get_db, app):
+    from datetime import datetime, time
+    mock_identify_user.return_value = b'fake_fir'
+    mock_biometric_index.identify.return_value = 1
+    hoje = datetime.now().date()
+    agora = datetime.now().replace(microsecond=0).time()
+
+    with patch('app.controller.pontoController.open_shift_state', _turnos([(1, 7, 5, datetime.combine(hoje, time()), agora, None)])):
+        with app.test_request_context(json={"unidade_id": 5}):
+            response, status = register_ponto()
+            assert status == 400
+            assert "aguardar pelo menos 5 minutos" in response.json["message"]
+
+    with patch('app.controller.pontoController.open_shift_state', _turnos([(1, 7, 5, datetime.combine(hoje, time()), time(0, 0), time(0, 1))])):
+        with app.test_request_context(json={"unidade_id": 5}):
+            response, status = register_ponto()
+            assert status == 400
+            assert "já bateu sua saída hoje" in response.json["message"]
+    mock_get_db.assert_not_called()
+
+@patch('app.controller.pontoController.db_connection')
+@patch('app.controller.pontoController.biometric_index')
+@patch('app.controller.pontoController.identify_user')
+@patch('app.controller.pontoController.notification_worker')
+@patch('app.controller.pontoController.enfileirar_email')
+def test_saida_decidida_pelos_turnos_em_memoria(mock_enfileirar_email, mock_notification_worker, mock_identify_user, mock_biometric_index, mock_get_db, app):
+    from datetime import datetime, time, timedelta
+    mock_identify_user.return_value = b'fake_fir'
+    mock_biometric_index.identify.return_value = 1
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_get_db.return_value.__enter__.return_value = mock_conn
+    mock_conn.cursor.return_value = mock_cursor
+    # Perfil do funcionário e férias; escala de 24h para a entrada valer também se ficou no dia anterior
+    mock_cursor.fetchone.side_effect = [linha_decisao(escala="24h")[:10] + (None,), (False,)]
+    entrada = (datetime.now() - timedelta(hours=2)).replace(microsecond=0)
+    turnos = _turnos([(1, 7, 5, datetime.combine(entrada.date(), time()), entrada.time(), None)])
+
+    with patch('app.controller.pontoController.open_shift_state', turnos), \
+            patch('app.services.perfis.funcionario_cache', TTLCache("funcionarios", 60, 100)) as cache:
+        with app.test_request_context(json={"unidade_id": 5}):
+            response, status = register_ponto()
+            assert status == 200
+            assert response.json["tipo"] == "saida"
+        assert cache.stats()["misses"] == 1
+    assert not any("registros_ponto" in chamada.args[0] for chamada in mock_cursor.execute.call_args_list[:2])
+    assert "UPDATE registros_ponto" in mock_cursor.execute.call_args_list[2].args[0]
+    # A saída gravada fecha o turno em memória
+    assert turnos.consultar(1, datetime.now().date()).ultimo_aberto() is None
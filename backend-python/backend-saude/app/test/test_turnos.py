@@ -0,0 +1,93 @@
+from datetime import date, datetime, time, timedelta
+from unittest.mock import MagicMock
+
+from app.services.turnos import OpenShiftState
+
+
+def _conexao(linhas):
+    conn = MagicMock()
+    conn.cursor.return_value.fetchall.return_value = linhas
+    return conn
+
+
+def _estado(linhas):
+    estado = OpenShiftState(intervalo=30)
+    estado._carregar(_conexao(linhas))
+    return estado
+
+
+def test_carga_separa_entradas_abertas_e_registros_do_dia():
+    hoje = date.today()
+    ontem = datetime.combine(hoje - timedelta(days=1), time())
+    estado = _estado([
+        # funcionario_id, id, unidade_id, data_hora, hora_entrada, hora_saida
+        (1, 10, 5, ontem, time(19, 0), None),
+        (1, 11, 5, datetime.combine(hoje, time()), time(7, 0), time(12, 0)),
+        (2, 20, 6, datetime.combine(hoje, time()), time(8, 0), None),
+    ])
+
+    turno = estado.consultar(1, hoje)
+    assert turno.ultimo_aberto().id == 10
+    assert turno.ultimo_do_dia().id == 11
+    assert turno.completo_no_dia(5) and not turno.completo_no_dia(6)
+    assert estado.consultar(2, hoje).ultimo_aberto(6).id == 20
+    assert estado.consultar(3, hoje).ultimo_aberto() is None
+    # Outro dia fica com o banco
+    assert estado.consultar(1, hoje - timedelta(days=1)) is None
+    assert estado.stats()["entradas_abertas"] == 2
+
+
+def test_write_through_de_entrada_e_saida():
+    hoje = date.today()
+    estado = _estado([])
+
+    estado.abrir(1, 30, 5, datetime.combine(hoje, time()), time(8, 0))
+    assert estado.consultar(1, hoje).ultimo_do_dia().hora_saida is None
+
+    estado.fechar(1, 30, time(17, 0))
+    turno = estado.consultar(1, hoje)
+    assert turno.ultimo_aberto() is None
+    assert turno.ultimo_do_dia().hora_saida == time(17, 0)
+    assert estado.stats()["total_gravacoes"] == 2
+
+
+def test_batida_gravada_durante_a_carga_e_reaplicada():
+    hoje = date.today()
+    estado = OpenShiftState(intervalo=30)
+    conn = _conexao([])
+
+    def consulta_lenta(*args):
+        # Entrada confirmada depois que a consulta da carga leu o banco
+        estado.abrir(1, 40, 5, datetime.combine(hoje, time()), time(8, 0))
+    conn.cursor.return_value.execute.side_effect = consulta_lenta
+    estado._carregar(conn)
+
+    assert estado.consultar(1, hoje).ultimo_aberto().id == 40
+
+
+def test_recarga_parcial_substitui_o_estado_do_funcionario():
+    hoje = date.today()
+    estado = _estado([(1, 10, 5, datetime.combine(hoje, time()), time(7, 0), None)])
+
+    # A entrada foi fechada por outra instância
+    estado.recarregar(_conexao([(1, 10, 5, datetime.combine(hoje, time()), time(7, 0), time(16, 0))]), [1])
+    turno = estado.consultar(1, hoje)
+    assert turno.ultimo_aberto() is None
+    assert turno.completo_no_dia(5)
+
+
+def test_recarga_parcial_durante_a_carga_e_reaplicada():
+    hoje = date.today()
+    estado = _estado([])
+    aberto = (1, 10, 5, datetime.combine(hoje, time()), time(7, 0), None)
+    conn = _conexao([aberto])
+
+    def consulta_lenta(*args):
+        # Saída gravada pelo lote (e relida) depois que a consulta da carga leu o banco
+        estado.recarregar(_conexao([aberto[:5] + (time(16, 0),)]), [1])
+    conn.cursor.return_value.execute.side_effect = consulta_lenta
+    estado._carregar(conn)
+
+    turno = estado.consultar(1, hoje)
+    assert turno.ultimo_aberto() is None
+    assert turno.completo_no_dia(5)
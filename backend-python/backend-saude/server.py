@@ -1,5 +1,10 @@
 from app.routes import create_app
-from app.db.database import get_db_connection  
+from app.db.database import db_pool
+from app.services.biometric import biometric_index
+from app.services.leitor import device_worker
+from app.services.notificacoes import notification_worker
+from app.services.turnos import open_shift_state
+from app.services.ferias import vacation_index
 from app.services.mail import mail, init_mail
 from flask_cors import CORS
 import os
@@ -15,13 +20,54 @@ CORS(
     origins=["https://prefeitura.itaguai.rj.gov.br"]
 )
 
-# Teste de conexão com o banco de dados
-conn = get_db_connection()
-if conn:
-    print("Conectado ao banco de dados com sucesso!")
-    conn.close()
-else:
-    print("Falha ao conectar ao banco de dados.")
+# Modo de depuração do servidor de desenvolvimento (com recarga automática)
+DEBUG = True
+
+
+def iniciar_servicos():
+    # Abre as conexões mínimas do pool (e testa a conexão com o banco de dados)
+    try:
+        db_pool.prefill()
+        print("Conectado ao banco de dados com sucesso!")
+    except Exception as e:
+        print(f"Falha ao conectar ao banco de dados: {e}")
+
+    # Carrega o índice biométrico uma única vez, antes da primeira batida de ponto
+    try:
+        biometric_index.warm_start()
+    except Exception as e:
+        print(f"Erro ao carregar o índice biométrico (será carregado na primeira identificação): {e}")
+
+    # Sincroniza cadastros, recadastros e vínculos alterados sem recarregar o índice inteiro
+    biometric_index.start_refresher()
+
+    # Carrega as entradas sem saída e os registros do dia usados na decisão entre entrada e saída
+    try:
+        open_shift_state.load()
+    except Exception as e:
+        print(f"Erro ao carregar os turnos em aberto (a decisão do ponto consultará o banco): {e}")
+    open_shift_state.start_refresher()
+
+    # Carrega os períodos de férias consultados na batida de ponto e os sincroniza com o banco
+    try:
+        vacation_index.load()
+    except Exception as e:
+        print(f"Erro ao carregar as férias (a verificação de férias consultará o banco): {e}")
+    vacation_index.start_refresher()
+
+    # Abre o leitor biométrico na thread que o mantém aberto entre as capturas
+    device_worker.start()
+
+    # Entrega em segundo plano os e-mails de comprovante gravados em notificacoes_outbox
+    notification_worker.start()
+
+
+# Com a recarga automática o Werkzeug executa este módulo em dois processos: o
+# que observa os arquivos e o que atende as requisições (WERKZEUG_RUN_MAIN=true).
+# Leitor, índice biométrico e threads de sincronização só sobem no segundo, para
+# que os dois não disputem o leitor USB. Importado por outro servidor WSGI, sempre.
+if __name__ != '__main__' or not DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+    iniciar_servicos()
 
 if __name__ == '__main__':
     # Caminhos dos certificados SSL
@@ -34,7 +80,7 @@ if __name__ == '__main__':
 
     # Executando a aplicação com SSL
     app.run(
-        debug=True,
+        debug=DEBUG,
         host='0.0.0.0',
         port=5000,
         ssl_context=(cert_path, key_path)
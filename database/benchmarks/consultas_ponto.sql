@@ -0,0 +1,141 @@
+-- Benchmark das consultas da batida de ponto antes e depois da migração
+-- 005_indices_consultas_ponto.sql e da troca de DATE(data_hora) por
+-- intervalo semiaberto nos backends Python.
+--
+-- Cria um esquema temporário (bench_ponto) com 2.000 funcionários em 30
+-- unidades e um ano de batidas (uma por funcionário por dia, ~1% sem saída),
+-- roda EXPLAIN (ANALYZE, BUFFERS) das consultas só com o índice original de
+-- registros_ponto, cria os índices da migração 005 e repete. O esquema é
+-- removido ao final; as tabelas de public não são tocadas.
+--
+-- Uso: psql -d biometrico -f database/benchmarks/consultas_ponto.sql
+
+\set ON_ERROR_STOP on
+SET client_min_messages = warning;
+
+DROP SCHEMA IF EXISTS bench_ponto CASCADE;
+CREATE SCHEMA bench_ponto;
+SET search_path = bench_ponto;
+
+CREATE TABLE funcionarios (
+    id serial PRIMARY KEY,
+    nome varchar NOT NULL,
+    email varchar NOT NULL,
+    cpf varchar NOT NULL UNIQUE,
+    unidade_id integer NOT NULL,
+    updated_at timestamp DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE registros_ponto (
+    id serial PRIMARY KEY,
+    funcionario_id integer NOT NULL,
+    unidade_id integer NOT NULL,
+    data_hora timestamp NOT NULL,
+    hora_entrada time,
+    hora_saida time
+);
+
+CREATE TABLE ferias (
+    id serial PRIMARY KEY,
+    funcionario_id integer NOT NULL,
+    data_inicio date NOT NULL,
+    data_fim date NOT NULL
+);
+
+INSERT INTO funcionarios (nome, email, cpf, unidade_id)
+SELECT 'Funcionario ' || lpad(i::text, 5, '0'), 'funcionario' || i || '@exemplo.gov.br',
+       lpad(i::text, 11, '0'), 1 + i % 30
+FROM generate_series(1, 2000) AS i;
+
+INSERT INTO registros_ponto (funcionario_id, unidade_id, data_hora, hora_entrada, hora_saida)
+SELECT f.id, f.unidade_id, d + (f.id % 60) * INTERVAL '1 minute' + TIME '07:00',
+       TIME '07:00' + (f.id % 60) * INTERVAL '1 minute',
+       CASE WHEN (f.id + EXTRACT(doy FROM d)::int) % 100 = 0 THEN NULL
+            ELSE TIME '16:00' + (f.id % 60) * INTERVAL '1 minute' END
+FROM funcionarios f
+CROSS JOIN generate_series(DATE '2025-01-01', DATE '2025-12-31', INTERVAL '1 day') AS d;
+
+-- Cinco anos de histórico de férias: um período de 30 dias por ano
+INSERT INTO ferias (funcionario_id, data_inicio, data_fim)
+SELECT f.id, make_date(ano, 1 + f.id % 12, 1), make_date(ano, 1 + f.id % 12, 1) + 29
+FROM funcionarios f
+CROSS JOIN generate_series(2021, 2025) AS ano;
+
+-- Índice que já existe em public.registros_ponto
+CREATE INDEX idx_registros_ponto_funcionario_data ON registros_ponto (funcionario_id, data_hora);
+VACUUM ANALYZE funcionarios;
+VACUUM ANALYZE registros_ponto;
+VACUUM ANALYZE ferias;
+
+\echo '=================== ANTES: DATE(data_hora) e só o índice original ==================='
+
+\echo '--- registro do dia (DATE(data_hora) = dia)'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id, hora_entrada, hora_saida, data_hora FROM registros_ponto
+WHERE funcionario_id = 1234 AND DATE(data_hora) = DATE '2025-07-15'
+ORDER BY data_hora DESC LIMIT 1;
+
+\echo '--- entrada pendente das escalas de 24h (DATE(data_hora) entre ontem e hoje)'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id, hora_entrada, hora_saida, data_hora FROM registros_ponto
+WHERE funcionario_id = 1234
+AND DATE(data_hora) >= DATE '2025-07-15' - INTERVAL '1 day' AND DATE(data_hora) <= DATE '2025-07-15'
+AND hora_saida IS NULL
+ORDER BY data_hora DESC LIMIT 1;
+
+\echo '--- última entrada sem saída na unidade do terminal'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id, hora_entrada, data_hora FROM registros_ponto
+WHERE funcionario_id = 1234 AND unidade_id = 5 AND hora_saida IS NULL
+ORDER BY data_hora DESC LIMIT 1;
+
+\echo '--- férias no dia'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT EXISTS (SELECT 1 FROM ferias WHERE funcionario_id = 1234 AND data_inicio <= DATE '2025-07-15' AND data_fim >= DATE '2025-07-15');
+
+\echo '--- duplicidade de e-mail e nome no cadastro'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id FROM funcionarios WHERE email = 'funcionario1234@exemplo.gov.br' OR nome = 'Funcionario 01234';
+
+-- Índices da migração 005 (sem CONCURRENTLY: as tabelas do benchmark não têm gravação concorrente)
+CREATE INDEX idx_registros_ponto_abertos ON registros_ponto (funcionario_id, unidade_id, data_hora DESC)
+    WHERE hora_saida IS NULL;
+CREATE INDEX idx_funcionarios_email ON funcionarios (email);
+CREATE INDEX idx_funcionarios_nome ON funcionarios (nome);
+CREATE INDEX idx_ferias_funcionario_periodo ON ferias (funcionario_id, data_inicio, data_fim);
+ANALYZE registros_ponto;
+ANALYZE funcionarios;
+ANALYZE ferias;
+
+\echo '=================== DEPOIS: intervalo semiaberto e índices da migração 005 ==================='
+
+\echo '--- registro do dia (data_hora >= dia AND data_hora < dia + 1)'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id, hora_entrada, hora_saida, data_hora FROM registros_ponto
+WHERE funcionario_id = 1234 AND data_hora >= DATE '2025-07-15' AND data_hora < DATE '2025-07-15' + INTERVAL '1 day'
+ORDER BY data_hora DESC LIMIT 1;
+
+\echo '--- entrada pendente das escalas de 24h (data_hora entre ontem e o fim de hoje)'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id, hora_entrada, hora_saida, data_hora FROM registros_ponto
+WHERE funcionario_id = 1234
+AND data_hora >= DATE '2025-07-15' - INTERVAL '1 day' AND data_hora < DATE '2025-07-15' + INTERVAL '1 day'
+AND hora_saida IS NULL
+ORDER BY data_hora DESC LIMIT 1;
+
+\echo '--- última entrada sem saída na unidade do terminal'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id, hora_entrada, data_hora FROM registros_ponto
+WHERE funcionario_id = 1234 AND unidade_id = 5 AND hora_saida IS NULL
+ORDER BY data_hora DESC LIMIT 1;
+
+\echo '--- férias no dia'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT EXISTS (SELECT 1 FROM ferias WHERE funcionario_id = 1234 AND data_inicio <= DATE '2025-07-15' AND data_fim >= DATE '2025-07-15');
+
+\echo '--- duplicidade de e-mail e nome no cadastro'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id FROM funcionarios WHERE email = 'funcionario1234@exemplo.gov.br' OR nome = 'Funcionario 01234';
+
+RESET search_path;
+DROP SCHEMA bench_ponto CASCADE;
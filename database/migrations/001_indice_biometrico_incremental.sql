@@ -0,0 +1,55 @@
+-- Sincronização incremental do índice biométrico dos backends Python.
+--
+-- 1. updated_at passa a ser atualizado em todo UPDATE (inclusive mudanças de
+--    status feitas diretamente no banco), servindo de marca d'água.
+-- 2. Exclusões ficam registradas em biometria_remocoes, já que uma linha
+--    apagada não aparece mais em consultas por updated_at.
+
+CREATE OR REPLACE FUNCTION public.atualizar_updated_at() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    NEW.updated_at := CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS public.biometria_remocoes (
+    id bigserial PRIMARY KEY,
+    origem character varying(20) NOT NULL,  -- 'funcionario' ou 'vinculo'
+    registro_id integer NOT NULL,
+    removido_em timestamp without time zone DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION public.registrar_remocao_biometria() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    INSERT INTO public.biometria_remocoes (origem, registro_id) VALUES (TG_ARGV[0], OLD.id);
+    RETURN OLD;
+END;
+$$;
+
+-- funcionarios
+DROP TRIGGER IF EXISTS trg_funcionarios_updated_at ON public.funcionarios;
+CREATE TRIGGER trg_funcionarios_updated_at BEFORE UPDATE ON public.funcionarios FOR EACH ROW EXECUTE FUNCTION public.atualizar_updated_at();
+
+DROP TRIGGER IF EXISTS trg_funcionarios_remocao_biometria ON public.funcionarios;
+CREATE TRIGGER trg_funcionarios_remocao_biometria AFTER DELETE ON public.funcionarios FOR EACH ROW EXECUTE FUNCTION public.registrar_remocao_biometria('funcionario');
+
+CREATE INDEX IF NOT EXISTS idx_funcionarios_updated_at ON public.funcionarios USING btree (updated_at);
+
+-- funcionarios_unidades_adicionais (existe apenas no banco da assistência)
+DO $$
+BEGIN
+    IF to_regclass('public.funcionarios_unidades_adicionais') IS NOT NULL THEN
+        DROP TRIGGER IF EXISTS trg_fua_updated_at ON public.funcionarios_unidades_adicionais;
+        CREATE TRIGGER trg_fua_updated_at BEFORE UPDATE ON public.funcionarios_unidades_adicionais FOR EACH ROW EXECUTE FUNCTION public.atualizar_updated_at();
+
+        DROP TRIGGER IF EXISTS trg_fua_remocao_biometria ON public.funcionarios_unidades_adicionais;
+        CREATE TRIGGER trg_fua_remocao_biometria AFTER DELETE ON public.funcionarios_unidades_adicionais FOR EACH ROW EXECUTE FUNCTION public.registrar_remocao_biometria('vinculo');
+
+        CREATE INDEX IF NOT EXISTS idx_fua_updated_at ON public.funcionarios_unidades_adicionais USING btree (updated_at);
+    END IF;
+END;
+$$;
@@ -0,0 +1,65 @@
+-- Armazena a digital também em formato binário (bytea) ao lado da FIR em texto.
+--
+-- O texto gerado pelo TextEncodeFIR do NBioBSP é base64 sem preenchimento,
+-- com '*' no lugar de '+'. A coluna binária é mantida por trigger, então os
+-- sistemas que gravam apenas id_biometrico (Node e Python) continuam funcionando.
+-- Os backends Python carregam o índice biométrico a partir de id_biometrico_bin,
+-- trafegando e mantendo em memória ~25% menos dados, sem decodificar texto.
+
+CREATE OR REPLACE FUNCTION public.fir_texto_para_binario(fir text) RETURNS bytea
+    LANGUAGE plpgsql IMMUTABLE
+    AS $$
+DECLARE
+    base64 text;
+BEGIN
+    IF fir IS NULL OR fir = '' THEN
+        RETURN NULL;
+    END IF;
+    base64 := translate(fir, '*', '+');
+    base64 := rpad(base64, ((length(base64) + 3) / 4) * 4, '=');
+    RETURN decode(base64, 'base64');
+EXCEPTION WHEN OTHERS THEN
+    -- Digital em formato desconhecido: o backend usa a FIR em texto
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.sincronizar_id_biometrico_bin() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    NEW.id_biometrico_bin := public.fir_texto_para_binario(NEW.id_biometrico::text);
+    RETURN NEW;
+END;
+$$;
+
+-- funcionarios
+ALTER TABLE public.funcionarios ADD COLUMN IF NOT EXISTS id_biometrico_bin bytea;
+
+DROP TRIGGER IF EXISTS trg_funcionarios_id_biometrico_bin ON public.funcionarios;
+CREATE TRIGGER trg_funcionarios_id_biometrico_bin BEFORE INSERT OR UPDATE OF id_biometrico ON public.funcionarios FOR EACH ROW EXECUTE FUNCTION public.sincronizar_id_biometrico_bin();
+
+-- Preenche as linhas existentes (sem disparar a trigger de updated_at da migração 001)
+ALTER TABLE public.funcionarios DISABLE TRIGGER trg_funcionarios_updated_at;
+UPDATE public.funcionarios
+   SET id_biometrico_bin = public.fir_texto_para_binario(id_biometrico)
+ WHERE id_biometrico_bin IS NULL;
+ALTER TABLE public.funcionarios ENABLE TRIGGER trg_funcionarios_updated_at;
+
+-- funcionarios_unidades_adicionais (existe apenas no banco da assistência)
+DO $$
+BEGIN
+    IF to_regclass('public.funcionarios_unidades_adicionais') IS NOT NULL THEN
+        ALTER TABLE public.funcionarios_unidades_adicionais ADD COLUMN IF NOT EXISTS id_biometrico_bin bytea;
+
+        DROP TRIGGER IF EXISTS trg_fua_id_biometrico_bin ON public.funcionarios_unidades_adicionais;
+        CREATE TRIGGER trg_fua_id_biometrico_bin BEFORE INSERT OR UPDATE OF id_biometrico ON public.funcionarios_unidades_adicionais FOR EACH ROW EXECUTE FUNCTION public.sincronizar_id_biometrico_bin();
+
+        ALTER TABLE public.funcionarios_unidades_adicionais DISABLE TRIGGER trg_fua_updated_at;
+        UPDATE public.funcionarios_unidades_adicionais
+           SET id_biometrico_bin = public.fir_texto_para_binario(id_biometrico::text)
+         WHERE id_biometrico_bin IS NULL;
+        ALTER TABLE public.funcionarios_unidades_adicionais ENABLE TRIGGER trg_fua_updated_at;
+    END IF;
+END;
+$$;
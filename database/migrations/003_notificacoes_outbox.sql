@@ -0,0 +1,28 @@
+-- Fila (outbox) de e-mails de comprovante de ponto dos backends Python.
+--
+-- O comprovante é gravado aqui pelo registro de ponto e entregue por uma
+-- thread em segundo plano, de modo que a resposta ao terminal não espera
+-- pelo envio do e-mail.
+--
+-- status: 'pendente' (aguardando envio ou nova tentativa), 'enviando'
+-- (reservado por um worker até proxima_tentativa), 'enviado' ou 'falha'
+-- (tentativas esgotadas).
+
+CREATE TABLE IF NOT EXISTS public.notificacoes_outbox (
+    id bigserial PRIMARY KEY,
+    assunto character varying(255) NOT NULL,
+    destinatario character varying(255) NOT NULL,
+    corpo text NOT NULL,
+    status character varying(20) DEFAULT 'pendente' NOT NULL,
+    tentativas integer DEFAULT 0 NOT NULL,
+    proxima_tentativa timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    ultimo_erro text,
+    criado_em timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    enviado_em timestamp without time zone,
+    CONSTRAINT notificacoes_outbox_status_check CHECK (status IN ('pendente', 'enviando', 'enviado', 'falha'))
+);
+
+-- Somente as notificações ainda não entregues são consultadas pelo worker
+CREATE INDEX IF NOT EXISTS idx_notificacoes_outbox_a_enviar
+    ON public.notificacoes_outbox (proxima_tentativa, id)
+    WHERE status IN ('pendente', 'enviando');
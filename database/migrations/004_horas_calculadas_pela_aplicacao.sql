@@ -0,0 +1,106 @@
+-- As horas do registro de ponto (horas_normais, hora_extra, hora_desconto,
+-- total_trabalhado e hora_saida_ajustada) passam a ser gravadas já
+-- calculadas pela aplicação: pelos backends Python na batida de ponto e pelo
+-- backend Node.js nas rotas de cálculo.
+--
+-- Os triggers trigger_calcular_horas_desconto e trigger_calcular_horas_normais
+-- recalculavam esses campos a cada INSERT/UPDATE de registros_ponto (com uma
+-- consulta a funcionarios por linha), sobrescrevendo o cálculo da aplicação
+-- sem considerar saída no dia seguinte. Eles são substituídos por um único
+-- trigger que faz o mesmo cálculo, na mesma ordem, somente quando o comando
+-- não informou as horas: gravações que só preenchem hora_saida (o fechamento
+-- automático do Node.js, por exemplo) continuam com as horas calculadas pelo
+-- banco. Em UPDATE o cálculo só é refeito quando entrada, saída ou
+-- funcionário mudam, e registros sem entrada ou sem saída não consultam
+-- funcionarios.
+--
+-- O AFTER trigger de convert_to_time_format (trigger_name) é removido: não
+-- tinha efeito, pois alterações em NEW são ignoradas depois da gravação.
+--
+-- As funções antigas são mantidas; para voltar ao comportamento anterior
+-- basta recriar os triggers como em full-schema.sql.
+
+CREATE OR REPLACE FUNCTION public.calcular_horas_registro_ponto() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    jornada_esperada INTERVAL;
+    pausa_almoco INTERVAL := INTERVAL '0 minutes'; -- Padrão sem almoço
+    horas_trabalhadas INTERVAL;
+    saldo_faltante INTERVAL;
+BEGIN
+    -- Horas informadas pela aplicação no próprio comando são mantidas
+    IF TG_OP = 'INSERT' THEN
+        IF NEW.horas_normais IS NOT NULL OR NEW.total_trabalhado IS NOT NULL THEN
+            RETURN NEW;
+        END IF;
+    ELSIF (NEW.horas_normais, NEW.hora_extra, NEW.hora_desconto, NEW.total_trabalhado, NEW.hora_saida_ajustada)
+              IS DISTINCT FROM (OLD.horas_normais, OLD.hora_extra, OLD.hora_desconto, OLD.total_trabalhado, OLD.hora_saida_ajustada)
+          OR (NEW.hora_entrada, NEW.hora_saida, NEW.funcionario_id)
+              IS NOT DISTINCT FROM (OLD.hora_entrada, OLD.hora_saida, OLD.funcionario_id) THEN
+        RETURN NEW;
+    END IF;
+
+    -- Sem entrada ou sem saída: mesmo resultado dos triggers antigos, sem consultar a escala
+    IF NEW.hora_entrada IS NULL OR NEW.hora_saida IS NULL THEN
+        NEW.hora_desconto := INTERVAL '0 minutes';
+        NEW.hora_extra := NULL;
+        NEW.horas_normais := '00:00:00'::time;
+        NEW.total_trabalhado := NULL;
+        NEW.hora_saida_ajustada := NEW.hora_saida;
+        RETURN NEW;
+    END IF;
+
+    -- Obtém a jornada esperada do funcionário com base no tipo de escala
+    SELECT
+        CASE f.tipo_escala
+            WHEN '8h' THEN INTERVAL '8 hours'
+            WHEN '12h' THEN INTERVAL '12 hours'
+            WHEN '16h' THEN INTERVAL '16 hours'
+            WHEN '24h' THEN INTERVAL '24 hours'
+            WHEN '12x36' THEN INTERVAL '12 hours'
+            WHEN '24x72' THEN INTERVAL '24 hours'
+            WHEN '32h' THEN INTERVAL '32 hours'
+            WHEN '20h' THEN INTERVAL '20 hours'
+            ELSE INTERVAL '8 hours'
+        END
+    INTO jornada_esperada
+    FROM funcionarios f
+    WHERE f.id = NEW.funcionario_id;
+
+    -- Define pausa para almoço APENAS para escalas de 8h e 12h
+    IF jornada_esperada = INTERVAL '8 hours' OR jornada_esperada = INTERVAL '12 hours' THEN
+        pausa_almoco := INTERVAL '1 hour';
+    END IF;
+
+    -- Calcula o tempo total trabalhado
+    horas_trabalhadas := (NEW.hora_saida - NEW.hora_entrada - pausa_almoco)::INTERVAL;
+
+    -- Se trabalhou menos que a jornada esperada, calcula saldo faltante
+    saldo_faltante := jornada_esperada - horas_trabalhadas;
+
+    -- Se faltou horas, registra como desconto, senão é hora extra
+    IF saldo_faltante > INTERVAL '0 minutes' THEN
+        NEW.hora_desconto := saldo_faltante;
+        NEW.hora_extra := INTERVAL '0 minutes';
+    ELSE
+        NEW.hora_desconto := INTERVAL '0 minutes';
+        NEW.hora_extra := saldo_faltante * -1;
+    END IF;
+
+    NEW.total_trabalhado := horas_trabalhadas;
+    NEW.hora_saida_ajustada := NEW.hora_saida;
+
+    -- Como em calcular_horas_normais, que rodava depois: diferença entre saída e entrada
+    NEW.horas_normais := (NEW.hora_saida - NEW.hora_entrada);
+
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trigger_calcular_horas_desconto ON public.registros_ponto;
+DROP TRIGGER IF EXISTS trigger_calcular_horas_normais ON public.registros_ponto;
+DROP TRIGGER IF EXISTS trigger_name ON public.registros_ponto;
+
+DROP TRIGGER IF EXISTS trigger_calcular_horas_registro_ponto ON public.registros_ponto;
+CREATE TRIGGER trigger_calcular_horas_registro_ponto BEFORE INSERT OR UPDATE ON public.registros_ponto FOR EACH ROW EXECUTE FUNCTION public.calcular_horas_registro_ponto();
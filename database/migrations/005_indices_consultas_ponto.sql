@@ -0,0 +1,34 @@
+-- Índices das consultas quentes da batida de ponto e do cadastro.
+--
+-- 1. registros_ponto: índice parcial das entradas sem saída (hora_saida IS NULL),
+--    usado pelas buscas do "ponto em aberto" por funcionário e unidade. As
+--    buscas por dia usam o idx_registros_ponto_funcionario_data já existente,
+--    agora que os backends Python filtram data_hora por intervalo semiaberto
+--    (data_hora >= dia AND data_hora < dia + 1) em vez de DATE(data_hora).
+-- 2. funcionarios: cpf, matricula e id_biometrico já têm índice pelas
+--    constraints UNIQUE e updated_at pela migração 001; faltavam email e nome,
+--    usados na verificação de duplicidade do cadastro e da importação.
+-- 3. ferias: busca das férias do funcionário no dia da batida.
+--
+-- Os índices são criados com CONCURRENTLY para não bloquear as gravações:
+-- execute com psql sem -1/--single-transaction.
+--
+-- O email não ganha índice UNIQUE porque bases existentes podem ter e-mails
+-- repetidos; a unicidade continua verificada pela aplicação.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_registros_ponto_abertos
+    ON public.registros_ponto USING btree (funcionario_id, unidade_id, data_hora DESC)
+    WHERE hora_saida IS NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_funcionarios_email
+    ON public.funcionarios USING btree (email);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_funcionarios_nome
+    ON public.funcionarios USING btree (nome);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ferias_funcionario_periodo
+    ON public.ferias USING btree (funcionario_id, data_inicio, data_fim);
+
+ANALYZE public.registros_ponto;
+ANALYZE public.funcionarios;
+ANALYZE public.ferias;
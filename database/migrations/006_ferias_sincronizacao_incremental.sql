@@ -0,0 +1,32 @@
+-- Sincronização incremental do índice de férias dos backends Python.
+--
+-- 1. updated_at de ferias passa a ser atualizado em todo UPDATE, servindo de
+--    marca d'água (função criada pela migração 001).
+-- 2. Exclusões (e trocas de funcionário) ficam registradas em
+--    ferias_remocoes, já que o período antigo não aparece mais em consultas
+--    por updated_at.
+
+CREATE TABLE IF NOT EXISTS public.ferias_remocoes (
+    id bigserial PRIMARY KEY,
+    funcionario_id integer NOT NULL,
+    removido_em timestamp without time zone DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION public.registrar_remocao_ferias() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF TG_OP = 'DELETE' OR OLD.funcionario_id <> NEW.funcionario_id THEN
+        INSERT INTO public.ferias_remocoes (funcionario_id) VALUES (OLD.funcionario_id);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_ferias_updated_at ON public.ferias;
+CREATE TRIGGER trg_ferias_updated_at BEFORE UPDATE ON public.ferias FOR EACH ROW EXECUTE FUNCTION public.atualizar_updated_at();
+
+DROP TRIGGER IF EXISTS trg_ferias_remocao ON public.ferias;
+CREATE TRIGGER trg_ferias_remocao AFTER DELETE OR UPDATE OF funcionario_id ON public.ferias FOR EACH ROW EXECUTE FUNCTION public.registrar_remocao_ferias();
+
+CREATE INDEX IF NOT EXISTS idx_ferias_updated_at ON public.ferias USING btree (updated_at);
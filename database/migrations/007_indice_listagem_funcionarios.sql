@@ -0,0 +1,16 @@
+-- Índice da listagem paginada de funcionários dos backends Python
+-- (GET /funcionarios-biometric), ordenada por (nome, id) e paginada por
+-- keyset: WHERE (nome, id) > (último nome, último id) ORDER BY nome, id.
+--
+-- O índice composto substitui o idx_funcionarios_nome da migração 005, que
+-- continua atendido (verificação de duplicidade por nome) pela primeira
+-- coluna.
+--
+-- Usa CONCURRENTLY: execute com psql sem -1/--single-transaction.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_funcionarios_nome_id
+    ON public.funcionarios USING btree (nome, id);
+
+DROP INDEX CONCURRENTLY IF EXISTS public.idx_funcionarios_nome;
+
+ANALYZE public.funcionarios;